@@ -0,0 +1,165 @@
+# SPDX-License-Identifier: MIT
+"""Local stand-in for the OpenRouter chat completions API, for tests and benchmarks.
+
+Kept out of the ``gemini_vision`` package so it is not installed with the
+server. ``benchmarks/run.py`` imports it from its own directory, and
+pytest puts this directory on ``sys.path`` (``pythonpath`` in
+pyproject.toml) for the tests.
+"""
+
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+class FakeOpenRouter:
+    """A small aiohttp server that answers ``POST /chat/completions`` like OpenRouter.
+
+    Behaviour is controlled through attributes that may be changed while
+    the server runs:
+
+    - ``latency``: seconds to wait before answering
+    - ``model_latency`` / ``model_replies``: per-model overrides of ``latency`` and
+      ``reply``, keyed on the request's ``model``
+    - ``failures``: list of statuses to return for the next requests, in order
+    - ``model_status``: status returned for every request to a model, keyed on ``model``
+    - ``error_rate`` / ``error_status``: random failures after ``failures`` is used up
+    - ``retry_after``: Retry-After header value sent with error responses
+    - ``reply``: completion text; streamed in ``chunk_size`` pieces when the
+      request sets ``stream: true``, ``chunk_delay`` seconds apart
+
+    Every request body is recorded in ``requests``; ``bytes_received``
+    counts request body bytes.
+    """
+
+    def __init__(
+        self,
+        reply: str = "This is a test image analysis.",
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.reply = reply
+        self.latency = latency
+        self.model_latency: Dict[str, float] = {}
+        self.model_replies: Dict[str, str] = {}
+        self.failures: List[int] = []
+        self.model_status: Dict[str, int] = {}
+        self.error_rate = 0.0
+        self.error_status = 503
+        self.retry_after: Optional[str] = None
+        self.chunk_size = 16
+        self.chunk_delay = 0.0
+        self.requests: List[Dict[str, Any]] = []
+        self.bytes_received = 0
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to use in place of OPENROUTER_BASE_URL."""
+        return f"http://{self._host}:{self._port}"
+
+    async def start(self) -> "FakeOpenRouter":
+        """Start listening; with port 0 a free port is picked."""
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self._handle)
+        app.router.add_route("HEAD", "/", self._handle_head)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        self._port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        return self
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeOpenRouter":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    async def _handle_head(self, request: web.Request) -> web.Response:
+        return web.Response(status=404)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.read()
+        self.bytes_received += len(raw)
+        body = json.loads(raw)
+        self.requests.append(body)
+
+        model = body.get("model", "")
+        latency = self.model_latency.get(model, self.latency)
+        if latency:
+            await asyncio.sleep(latency)
+
+        status = self.model_status.get(model)
+        if status is None and self.failures:
+            status = self.failures.pop(0)
+        elif status is None and self.error_rate and random.random() < self.error_rate:
+            status = self.error_status
+        if status is not None and status != 200:
+            headers = {"Retry-After": self.retry_after} if self.retry_after else {}
+            return web.json_response(
+                {"error": {"code": status, "message": f"Fake upstream error {status}"}},
+                status=status,
+                headers=headers,
+            )
+
+        reply = self.model_replies.get(model, self.reply)
+        usage = {
+            "prompt_tokens": 100,
+            "completion_tokens": max(1, len(reply) // 4),
+            "total_tokens": 100 + max(1, len(reply) // 4),
+        }
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": "fake",
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        pieces = [
+            reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)
+        ]
+        for index, piece in enumerate(pieces):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            chunk: Dict[str, Any] = {
+                "id": "fake",
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": piece},
+                        "finish_reason": "stop" if index == len(pieces) - 1 else None,
+                    }
+                ],
+            }
+            if index == len(pieces) - 1:
+                chunk["usage"] = usage
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: MIT
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Gemini Vision MCP server.
+
+Drives ``GeminiVisionServer.call_tool`` against a local fake OpenRouter
+server at several concurrency levels and image sizes, and writes
+throughput, latency percentiles, peak RSS and bytes sent to a JSON file.
+Pass ``--compare`` with an earlier results file to flag regressions.
+
+    python benchmarks/run.py --concurrency 1,4,16 --requests 32
+    python benchmarks/run.py --compare benchmarks/baseline.json --fail-on-regression 10
+    python benchmarks/run.py --synthetic 4096 --concurrency 8 --cpu-workers 0,1,2,4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from unittest.mock import patch
+
+from fake_openrouter import FakeOpenRouter
+from mcp.types import CallToolRequest, CallToolRequestParams
+from PIL import Image
+
+from gemini_vision.metrics import LatencyHistogram
+from gemini_vision.server import GeminiVisionServer
+from gemini_vision.workers import available_cpus
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_IMAGES = [
+    REPO_ROOT / "examples" / "test-photo.png",
+    REPO_ROOT / "examples" / "test-photo.avif",
+]
+DEFAULT_OUTPUT = REPO_ROOT / "benchmarks" / "results.json"
+
+# Metrics compared by --compare; True means higher is better
+COMPARED = {
+    "throughput_rps": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "peak_rss_mb": False,
+    "bytes_sent": False,
+}
+
+
+class RssSampler:
+    """Samples resident set size in the background to find a scenario's peak.
+
+    Uses ``/proc/self/statm`` where available; elsewhere falls back to the
+    process-lifetime maximum from ``getrusage``.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def current(self) -> int:
+        """Current RSS in bytes."""
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except OSError:
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Kilobytes on Linux, bytes on macOS
+            return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    async def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, self.current())
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self.peak = self.current()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> int:
+        """Stop sampling and return the peak RSS in bytes."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.peak = max(self.peak, self.current())
+        return self.peak
+
+
+def synthetic_image(directory: Path, edge: int) -> Path:
+    """Write a ``edge`` x ``edge`` noise JPEG, which compresses poorly like a photo."""
+    path = directory / f"synthetic-{edge}.jpg"
+    if not path.exists():
+        Image.frombytes("RGB", (edge, edge), os.urandom(edge * edge * 3)).save(
+            path, "JPEG", quality=90
+        )
+    return path
+
+
+async def run_scenario(
+    upstream: FakeOpenRouter,
+    image: Path,
+    concurrency: int,
+    requests: int,
+    stream: bool,
+    reuse_prepared: bool,
+    cpu_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Send ``requests`` analyze_image calls, ``concurrency`` at a time, to a fresh server.
+
+    ``cpu_workers`` sizes the server's preprocessing process pool (0 runs
+    preprocessing on threads); None keeps the server's default.
+    """
+    env = {
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": upstream.base_url,
+        "GEMINI_VISION_CACHE": "false",
+        "GEMINI_VISION_RETRY_BASE_DELAY": "0.01",
+        "GEMINI_VISION_PREPARED_CACHE_MB": "64" if reuse_prepared else "0",
+        "GEMINI_VISION_WINDOW_INITIAL": str(max(8, concurrency)),
+    }
+    if cpu_workers is not None:
+        env["GEMINI_VISION_CPU_WORKERS"] = str(cpu_workers)
+    with patch.dict(os.environ, env):
+        server = GeminiVisionServer()
+
+    latencies = LatencyHistogram(reservoir=max(1, requests))
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    bytes_before = upstream.bytes_received
+    sampler = RssSampler()
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        # A distinct prompt per call keeps identical requests from coalescing
+        request = CallToolRequest(
+            method="tools/call",
+            params=CallToolRequestParams(
+                name="analyze_image",
+                arguments={
+                    "image_path": str(image),
+                    "prompt": f"Describe this image ({index})",
+                    "stream": stream,
+                },
+            ),
+        )
+        async with semaphore:
+            started = time.perf_counter()
+            result = await server.call_tool(request)
+            latencies.observe(time.perf_counter() - started)
+        if result.isError:
+            errors += 1
+
+    try:
+        await server.start()
+        sampler.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        duration = time.perf_counter() - started
+        peak_rss = await sampler.stop()
+        stats = server.stats()
+    finally:
+        await server.close()
+
+    latency = latencies.snapshot()
+    name = f"{image.name}/c{concurrency}"
+    if cpu_workers is not None:
+        name += f"/w{cpu_workers}"
+    return {
+        "name": name + ("/stream" if stream else ""),
+        "image": image.name,
+        "image_bytes": image.stat().st_size,
+        "concurrency": concurrency,
+        "cpu_workers": stats["components"]["cpu_pool"]["workers"],
+        "requests": requests,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(requests / duration, 3),
+        "latency_p50_ms": latency["p50_ms"],
+        "latency_p95_ms": latency["p95_ms"],
+        "latency_p99_ms": latency["p99_ms"],
+        "latency_max_ms": latency["max_ms"],
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 2),
+        "bytes_sent": upstream.bytes_received - bytes_before,
+        "stages": stats["metrics"]["stages"],
+        "retries": stats["components"]["retry"]["retries"],
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Current commit, if the harness runs from a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Print per-scenario changes against ``baseline``; return regressions over ``threshold`` %."""
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in current["scenarios"]:
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), scenario.get(metric)
+            if not old or new is None:
+                continue
+            change = 100.0 * (new - old) / old
+            changes.append(f"{metric} {change:+.1f}%")
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append(f"{scenario['name']}: {metric} {old} -> {new}")
+        print(f"  {scenario['name']}: " + ", ".join(changes))
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every image x concurrency scenario against one fake upstream."""
+    images = [Path(image) for image in args.images]
+    with tempfile.TemporaryDirectory(prefix="gemini-vision-bench-") as tmp:
+        images += [synthetic_image(Path(tmp), edge) for edge in args.synthetic]
+        async with FakeOpenRouter(latency=args.latency) as upstream:
+            upstream.error_rate = args.error_rate
+            upstream.chunk_delay = args.chunk_delay
+            scenarios = []
+            for image in images:
+                for concurrency in args.concurrency:
+                    for cpu_workers in args.cpu_workers or [None]:
+                        scenario = await run_scenario(
+                            upstream,
+                            image,
+                            concurrency,
+                            args.requests,
+                            args.stream,
+                            args.reuse_prepared,
+                            cpu_workers,
+                        )
+                        print(
+                            f"{scenario['name']:<40} {scenario['throughput_rps']:>8.2f} req/s  "
+                            f"p50 {scenario['latency_p50_ms']:>8.1f} ms  "
+                            f"p95 {scenario['latency_p95_ms']:>8.1f} ms  "
+                            f"rss {scenario['peak_rss_mb']:>7.1f} MB  "
+                            f"sent {scenario['bytes_sent']:>11} B  "
+                            f"errors {scenario['errors']}"
+                        )
+                        scenarios.append(scenario)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "available_cpus": available_cpus(),
+            "settings": {
+                "requests": args.requests,
+                "latency": args.latency,
+                "error_rate": args.error_rate,
+                "stream": args.stream,
+                "chunk_delay": args.chunk_delay,
+                "reuse_prepared": args.reuse_prepared,
+                "cpu_workers": args.cpu_workers,
+            },
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--images", nargs="+", default=[str(path) for path in DEFAULT_IMAGES],
+        help="Image files to analyze (default: the example photos)",
+    )
+    parser.add_argument(
+        "--synthetic", type=_int_list, default=[],
+        help="Also benchmark generated noise JPEGs with these edge sizes, e.g. 2048,4096",
+    )
+    parser.add_argument(
+        "--concurrency", type=_int_list, default=[1, 4, 16],
+        help="Comma-separated concurrency levels (default: 1,4,16)",
+    )
+    parser.add_argument(
+        "--cpu-workers", type=_int_list,
+        help="Comma-separated preprocessing pool sizes to compare, e.g. 0,1,2,4 "
+        "(0 preprocesses on threads; default: the server's default, one per core)",
+    )
+    parser.add_argument("--requests", type=int, default=32, help="Calls per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake upstream latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail with 503")
+    parser.add_argument("--stream", action="store_true", help="Request streamed responses")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument(
+        "--reuse-prepared", action="store_true",
+        help="Keep the prepared-image cache on, so only the first call per image preprocesses",
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Results JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    parser.add_argument(
+        "--fail-on-regression", type=float, metavar="PERCENT",
+        help="With --compare, exit non-zero if any metric is this much worse",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Keep server INFO logging")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.verbose:
+        for name in ("gemini-vision-mcp", "aiohttp.access"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        print(f"Compared with {args.compare}:")
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(baseline, results, args.fail_on_regression or 0.0)
+        if args.fail_on_regression is not None and regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
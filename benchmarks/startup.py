@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: MIT
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Gemini Vision MCP server.
+
+Measures what an MCP client waits for when it spawns ``gemini-vision-mcp``:
+the import time of ``gemini_vision.server`` (from ``python -X importtime``)
+and the time from process start until ``initialize`` is answered over stdio.
+With ``--budget`` the run fails if the median time to initialize exceeds it.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --budget 2.0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MODULE = "gemini_vision.server"
+
+# Median seconds from spawn to the initialize response that the test suite allows
+STARTUP_BUDGET_S = 2.0
+
+# Modules that must not be imported until a tool call needs them
+DEFERRED_MODULES = ("aiohttp", "PIL", "concurrent.futures.process")
+
+INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "startup-benchmark", "version": "1.0"},
+    },
+}
+
+
+def server_env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environment for a server that starts without touching the network or disk."""
+    env = dict(os.environ)
+    env.setdefault("OPENROUTER_API_KEY", "startup-benchmark")
+    env["OPENROUTER_BASE_URL"] = "http://127.0.0.1:9"
+    env["GEMINI_VISION_LOG_FILE"] = "none"
+    env["GEMINI_VISION_CACHE_PATH"] = "none"
+    env.update(extra or {})
+    return env
+
+
+def import_profile(module: str = MODULE, top: int = 10) -> Dict[str, object]:
+    """Import ``module`` in a fresh interpreter; total and slowest imports (self time), in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=server_env(),
+    )
+    entries: List[Tuple[str, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = next(cumulative for name, _, cumulative in entries if name == module)
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        "total_ms": round(total / 1000, 1),
+        "slowest_self_ms": {name: round(self_us / 1000, 1) for name, self_us, _ in slowest},
+    }
+
+
+def deferred_modules_loaded(module: str = MODULE) -> List[str]:
+    """Which of DEFERRED_MODULES a fresh ``import module`` pulls in."""
+    code = (
+        f"import sys, json, {module}; "
+        f"print(json.dumps([m for m in {list(DEFERRED_MODULES)!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=server_env()
+    )
+    return json.loads(result.stdout)
+
+
+def time_to_initialize(timeout: float = 30.0) -> float:
+    """Seconds from spawning the stdio server until its initialize response arrives."""
+    started = time.perf_counter()
+    # Leaving the with block closes both pipes and reaps the process
+    with subprocess.Popen(
+        [sys.executable, "-m", MODULE],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=server_env(),
+    ) as process:
+        try:
+            assert process.stdin is not None and process.stdout is not None
+            process.stdin.write(json.dumps(INITIALIZE).encode("utf-8") + b"\n")
+            process.stdin.flush()
+            line = process.stdout.readline()
+            elapsed = time.perf_counter() - started
+            response = json.loads(line)
+            if "result" not in response:
+                raise RuntimeError(f"initialize failed: {response}")
+            process.stdin.close()
+            process.wait(timeout=timeout)
+            return elapsed
+        finally:
+            if process.poll() is None:
+                process.kill()
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=5, help="Server spawns to time")
+    parser.add_argument(
+        "--budget", type=float, metavar="SECONDS",
+        help="Exit non-zero if the median time to initialize exceeds this",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    profile = import_profile()
+    print(f"import {MODULE}: {profile['total_ms']} ms")
+    for name, self_ms in profile["slowest_self_ms"].items():  # type: ignore[union-attr]
+        print(f"  {self_ms:>8.1f} ms  {name}")
+    loaded = deferred_modules_loaded()
+    print(f"deferred modules imported at startup: {', '.join(loaded) or 'none'}")
+
+    samples = [time_to_initialize() for _ in range(max(1, args.runs))]
+    median = statistics.median(samples)
+    print(
+        f"time to initialize: median {median * 1000:.0f} ms, "
+        f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms"
+    )
+    if args.budget is not None and median > args.budget:
+        print(f"Over the startup budget of {args.budget * 1000:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
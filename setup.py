@@ -22,9 +22,12 @@ setup(
     packages=find_packages(where="src"),
     python_requires=">=3.8",
     install_requires=[
-        "mcp>=1.0.0",
+        "mcp>=1.10.0",
         "aiohttp>=3.8.0",
-        "Pillow>=9.0.0",
+        "Pillow>=9.1.0",
+        # Streamable HTTP transport (gemini_vision.transport)
+        "starlette>=0.27",
+        "uvicorn>=0.23.1",
     ],
     extras_require={
         "dev": [
@@ -38,7 +41,9 @@ setup(
     },
     entry_points={
         "console_scripts": [
-            "gemini-vision-mcp=gemini_vision.server:main",
+            "gemini-vision-mcp=gemini_vision.server:cli",
+            "gemini-vision-analyze-dir=gemini_vision.cli:analyze_dir",
+            "gemini-vision-batch=gemini_vision.cli:batch",
         ],
     },
     classifiers=[
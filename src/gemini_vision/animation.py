@@ -0,0 +1,153 @@
+# SPDX-License-Identifier: MIT
+"""Sampling distinct keyframes from animated GIF, WebP and PNG files.
+
+Screen recordings and short clips repeat the same picture for many frames.
+Each frame is compared with the last kept one on a small grayscale
+thumbnail, as the fraction of thumbnail pixels that changed visibly; this
+catches new text spread over the screen, which barely moves a mean, and
+ignores a moving cursor. Frames that barely changed are dropped, and of
+the rest the ones that changed the most are kept, up to ``max_frames``.
+"""
+
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+from .config import env_float, env_int
+from .preprocess import PreprocessOptions, _encode_fitted, _flatten
+
+# Frames are compared as grayscale thumbnails of this size
+DIFF_SIZE = (64, 64)
+
+# A thumbnail pixel counts as changed when it differs by more than this (of 255)
+PIXEL_TOLERANCE = 8
+
+# Upper bound on max_frames; every keyframe is a separate image in one request
+MAX_KEYFRAMES = 32
+
+KEYFRAMES_PROMPT = (
+    "The following {count} images are keyframes from an animation of {total} frames "
+    "lasting {duration:.1f} seconds, in order. Frames that barely differ from the one "
+    "before were left out, so consecutive keyframes may be some time apart. Each image "
+    "is labelled with its frame number and the time it appears. Answer the question "
+    "about the animation as a whole, referring to timestamps where it helps.\n\n"
+    "Question: {prompt}"
+)
+
+
+class Keyframe(NamedTuple):
+    """A kept frame: its position in the animation and how much it changed."""
+
+    frame_index: int
+    # Seconds from the start of the animation
+    timestamp: float
+    # Fraction of the picture changed since the previous keyframe; 1 for the first
+    change: float
+
+
+@dataclass(frozen=True)
+class FrameOptions:
+    """How keyframes are sampled from an animation."""
+
+    max_frames: int = 8
+    # Frames with less of the picture changed since the last kept one are dropped
+    threshold: float = 0.01
+
+    @classmethod
+    def from_env(cls) -> "FrameOptions":
+        """Build options from ``GEMINI_VISION_MAX_KEYFRAMES`` and ``..._THRESHOLD``."""
+        return cls(
+            max_frames=env_int("GEMINI_VISION_MAX_KEYFRAMES", cls.max_frames),
+            threshold=env_float("GEMINI_VISION_KEYFRAME_THRESHOLD", cls.threshold),
+        ).validated()
+
+    def with_overrides(self, arguments: Dict[str, Any]) -> "FrameOptions":
+        """Return a copy with per-call tool arguments applied."""
+        overrides: Dict[str, Any] = {}
+        if arguments.get("max_frames") is not None:
+            overrides["max_frames"] = int(arguments["max_frames"])
+        if arguments.get("frame_threshold") is not None:
+            overrides["threshold"] = float(arguments["frame_threshold"])
+        if not overrides:
+            return self
+        return replace(self, **overrides).validated()
+
+    def validated(self) -> "FrameOptions":
+        """Check option values, raising ValueError on bad input."""
+        if not 1 <= self.max_frames <= MAX_KEYFRAMES:
+            raise ValueError(f"max_frames must be between 1 and {MAX_KEYFRAMES}")
+        if not 0 <= self.threshold < 1:
+            raise ValueError("frame_threshold must be between 0 and 1")
+        return self
+
+    def cache_token(self) -> Dict[str, Any]:
+        """Options that change the result, for use in cache keys."""
+        return asdict(self)
+
+
+def frame_difference(first: bytes, second: bytes) -> float:
+    """Fraction of thumbnail pixels that differ by more than PIXEL_TOLERANCE."""
+    changed = sum(abs(a - b) > PIXEL_TOLERANCE for a, b in zip(first, second))
+    return changed / len(first)
+
+
+def sample_frames(
+    source: Union[str, Path], frames: FrameOptions, options: PreprocessOptions
+) -> Tuple[int, float, List[Tuple[Keyframe, bytes]]]:
+    """Pick and encode the distinct keyframes of an animation.
+
+    Returns the frame count, the duration in seconds and the keyframes in
+    order, each downscaled and encoded with ``options`` (``max_bytes``
+    applies per frame). The first frame is always kept. Only the frames
+    that may be kept are held in memory.
+    """
+    from PIL import Image, ImageSequence
+
+    candidates: List[Tuple[Keyframe, Any]] = []
+    previous = None
+    elapsed = 0.0
+    total = 0
+    with Image.open(source) as opened:
+        for index, frame in enumerate(ImageSequence.Iterator(opened)):
+            total += 1
+            image = _flatten(frame.convert("RGBA"))
+            thumbnail = (
+                image.convert("L")
+                .resize(DIFF_SIZE, Image.Resampling.BILINEAR)
+                .tobytes()
+            )
+            change = 1.0 if previous is None else frame_difference(previous, thumbnail)
+            if previous is None or (change >= frames.threshold and change > 0):
+                previous = thumbnail
+                if options.max_edge:
+                    image.thumbnail(
+                        (options.max_edge, options.max_edge), Image.Resampling.LANCZOS
+                    )
+                candidates.append((Keyframe(index, elapsed, change), image))
+                if len(candidates) > frames.max_frames:
+                    # Drop the smallest change; never the first frame
+                    smallest = min(
+                        range(1, len(candidates)), key=lambda i: candidates[i][0].change
+                    )
+                    del candidates[smallest]
+            elapsed += frame.info.get("duration", 0) / 1000
+
+    encoded = []
+    for keyframe, image in candidates:
+        _, data, _ = _encode_fitted(image, options)
+        encoded.append((keyframe, data))
+    return total, elapsed, encoded
+
+
+def keyframes_prompt(
+    prompt: str, keyframes: Sequence[Keyframe], total: int, duration: float
+) -> str:
+    """Prompt introducing the keyframes of an animation."""
+    return KEYFRAMES_PROMPT.format(
+        count=len(keyframes), total=total, duration=duration, prompt=prompt
+    )
+
+
+def keyframe_label(keyframe: Keyframe) -> str:
+    """Label placed before a keyframe's image."""
+    return f"Frame {keyframe.frame_index + 1} at {keyframe.timestamp:.2f}s"
@@ -0,0 +1,484 @@
+# SPDX-License-Identifier: MIT
+"""Bulk analysis of directories, globs and JSONL job files with resumable JSONL output."""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .log import request_context
+from .metrics import USAGE_FIELDS, collect_usage
+
+if TYPE_CHECKING:
+    from .server import GeminiVisionServer
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+MANIFEST_NAME = "gemini-vision-manifest.jsonl"
+
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+# (image path, prompt, size, mtime_ns) of an image that was analyzed successfully
+ManifestKey = Tuple[str, str, int, int]
+
+
+def find_images(
+    source: Union[str, Path], formats: Iterable[str], recursive: bool = False
+) -> List[Path]:
+    """List image files in a directory or matching a glob, filtered by extension.
+
+    Globs support ``**`` for recursive matches. Paths are resolved and
+    sorted so reruns see files in the same order.
+    """
+    source = os.path.expanduser(str(source))
+    path = Path(source)
+    candidates: Iterable[Path]
+    if path.is_dir():
+        candidates = path.rglob("*") if recursive else path.iterdir()
+    elif _GLOB_MAGIC.search(source):
+        candidates = (Path(match) for match in glob.iglob(source, recursive=True))
+    elif path.is_file():
+        candidates = [path]
+    else:
+        raise ValueError(f"No such directory or file: {source}")
+
+    suffixes = {suffix.lower() for suffix in formats}
+    return sorted(
+        candidate.resolve()
+        for candidate in candidates
+        if candidate.suffix.lower() in suffixes and candidate.is_file()
+    )
+
+
+def default_manifest_path(source: Union[str, Path]) -> Path:
+    """Manifest location for a source: inside the directory, or the glob's base directory."""
+    path = Path(os.path.expanduser(str(source)))
+    if path.is_dir():
+        return path / MANIFEST_NAME
+    base: List[str] = []
+    for part in path.parts:
+        if _GLOB_MAGIC.search(part):
+            break
+        base.append(part)
+    directory = Path(*base) if base else Path.cwd()
+    if not directory.is_dir():
+        directory = directory.parent
+    return directory / MANIFEST_NAME
+
+
+class Manifest:
+    """Append-only JSONL record of finished images.
+
+    Each line is flushed as soon as its image finishes, so an interrupted
+    run loses at most the images in flight. A line cut short by a crash is
+    ignored when the manifest is read back. Async callers write through
+    write(), which appends on the manifest's own thread, one record at a
+    time and in call order.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).expanduser()
+        self._handle: Optional[IO[str]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Records written so far, skipping unreadable lines."""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+    def completed(self) -> Set[ManifestKey]:
+        """Keys of images recorded as successfully analyzed."""
+        return {
+            (record["image_path"], record["prompt"], record["size"], record["mtime_ns"])
+            for record in self.records()
+            if record.get("status") == "ok"
+            and all(
+                name in record for name in ("image_path", "prompt", "size", "mtime_ns")
+            )
+        }
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Write one record and flush it to the file."""
+        if self._handle is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            needs_newline = False
+            if self.path.exists() and self.path.stat().st_size:
+                with open(self.path, "rb") as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    needs_newline = existing.read(1) != b"\n"
+            self._handle = open(self.path, "a", encoding="utf-8")
+            if needs_newline:
+                # Terminate a line left incomplete by an interrupted run
+                self._handle.write("\n")
+        self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._handle.flush()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    async def write(self, record: Dict[str, Any]) -> None:
+        """Append and flush one record off the event loop."""
+        await self._run(self.append, record)
+
+    async def aclose(self) -> None:
+        """Close the file and the writer thread."""
+        if self._executor is None:
+            self.close()
+            return
+        await self._run(self.close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def _run(self, func: Callable[..., None], *args: Any) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="gemini-vision-manifest"
+            )
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, func, *args)
+
+
+@dataclass
+class RunSummary:
+    """Counts and throughput of a bulk run."""
+
+    found: int
+    skipped: int
+    queued: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    manifest: str = ""
+    tokens: Dict[str, int] = field(
+        default_factory=lambda: {name: 0 for name in USAGE_FIELDS}
+    )
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def add_tokens(self, tokens: Mapping[str, int]) -> None:
+        """Add one job's token usage, as totalled by collect_usage()."""
+        for name, count in tokens.items():
+            self.tokens[name] = self.tokens.get(name, 0) + count
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "found": self.found,
+            "skipped": self.skipped,
+            "queued": self.queued,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_s": round(self.elapsed, 3),
+            "images_per_s": round(self.processed / self.elapsed, 3) if self.elapsed else 0.0,
+            "manifest": self.manifest,
+            "tokens": dict(self.tokens),
+        }
+
+
+# Called after each image with its manifest record and the running summary
+ResultCallback = Callable[[Dict[str, Any], RunSummary], Awaitable[None]]
+
+
+def _plan(
+    source: str,
+    formats: Iterable[str],
+    recursive: bool,
+    manifest: Manifest,
+    prompt: str,
+    limit: Optional[int],
+) -> Tuple[List[Tuple[Path, os.stat_result]], int, int]:
+    """Find images and drop those already done; returns (pending, found, skipped)."""
+    images = find_images(source, formats, recursive)
+    done = manifest.completed()
+    pending = []
+    for image in images:
+        stat = image.stat()
+        if (str(image), prompt, stat.st_size, stat.st_mtime_ns) in done:
+            continue
+        pending.append((image, stat))
+    skipped = len(images) - len(pending)
+    if limit is not None:
+        pending = pending[:limit]
+    return pending, len(images), skipped
+
+
+async def analyze_directory(
+    server: "GeminiVisionServer",
+    source: str,
+    prompt: str,
+    formats: Iterable[str],
+    manifest_path: Optional[Union[str, Path]] = None,
+    recursive: bool = False,
+    concurrency: int = 4,
+    limit: Optional[int] = None,
+    on_result: Optional[ResultCallback] = None,
+    **options: Any,
+) -> RunSummary:
+    """Analyze every image in a directory or glob, appending results to a manifest.
+
+    Images already recorded as done for the same prompt, size and mtime are
+    skipped, so an interrupted run can simply be started again. Failed
+    images are recorded too and retried on the next run. ``limit`` caps the
+    number of images analyzed in this call.
+    """
+    manifest = Manifest(manifest_path or default_manifest_path(source))
+    pending, found, skipped = await server._run_blocking(
+        _plan, source, formats, recursive, manifest, prompt, limit
+    )
+    summary = RunSummary(
+        found=found, skipped=skipped, queued=len(pending), manifest=str(manifest.path)
+    )
+    logger.info(
+        f"Analyzing {len(pending)} of {found} images from {source} "
+        f"({skipped} already done) with concurrency {concurrency}"
+    )
+
+    queue = iter(pending)
+    started = time.monotonic()
+
+    async def worker() -> None:
+        # Workers share one iterator, so at most ``concurrency`` images are in flight
+        for image, stat in queue:
+            image_started = time.monotonic()
+            record: Dict[str, Any] = {
+                "image_path": str(image),
+                "prompt": prompt,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            try:
+                with request_context() as request_id, collect_usage() as tokens:
+                    record["request_id"] = request_id
+                    try:
+                        analysis = await server._analyze_image(
+                            str(image), prompt, **options
+                        )
+                    finally:
+                        summary.add_tokens(tokens)
+            except Exception as e:
+                logger.error(f"Failed to analyze {image}: {e}")
+                record.update(status="error", error=str(e))
+                summary.failed += 1
+            else:
+                record.update(status="ok", analysis=analysis)
+                summary.succeeded += 1
+            record["elapsed_s"] = round(time.monotonic() - image_started, 3)
+            record["finished_at"] = datetime.now(timezone.utc).isoformat()
+            await manifest.write(record)
+            summary.elapsed = time.monotonic() - started
+            if on_result is not None:
+                await on_result(record, summary)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(pending))))))
+    finally:
+        await manifest.aclose()
+        summary.elapsed = time.monotonic() - started
+
+    logger.info(f"Directory run finished: {summary.as_dict()}")
+    return summary
+
+
+def read_jobs(path: Union[str, Path]) -> Generator[Tuple[int, Any], None, None]:
+    """Yield ``(line number, job)`` for each non-blank line of a JSONL job file.
+
+    The file is read lazily. A line that is not valid JSON is yielded with
+    the ValueError as its job so it is reported like any other failure.
+    """
+    with open(Path(path).expanduser(), encoding="utf-8") as handle:
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ValueError(f"Invalid JSON: {e}")
+
+
+class _OrderedWriter:
+    """Writes records in submission order, holding back those that finish early."""
+
+    def __init__(self, manifest: Manifest, window: asyncio.Semaphore):
+        self._manifest = manifest
+        self._window = window
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._next = 0
+
+    async def write(self, sequence: int, record: Dict[str, Any]) -> None:
+        self._pending[sequence] = record
+        while self._next in self._pending:
+            ready = self._pending.pop(self._next)
+            self._next += 1
+            await self._manifest.write(ready)
+            self._window.release()
+
+
+async def run_jobs(
+    server: "GeminiVisionServer",
+    jobs_path: Union[str, Path],
+    output_path: Union[str, Path],
+    default_prompt: str,
+    concurrency: int = 4,
+    ordered: bool = True,
+    resume: bool = True,
+    on_result: Optional[ResultCallback] = None,
+) -> RunSummary:
+    """Run every job in a JSONL file, streaming one result record per job to ``output_path``.
+
+    A job is an object with ``image_path`` and optionally ``prompt``, ``id``
+    and the analysis tool options (``temperature``, ``use_cache``,
+    ``max_edge``, ...). Records carry the job's line number and ``id``.
+
+    With ``ordered``, records are written in job order; at most
+    ``4 * concurrency`` finished records are held back behind a slow job.
+    The output file doubles as the checkpoint: with ``resume``, lines that
+    already have an ``ok`` record are skipped, and failed ones run again.
+    """
+    jobs_path = Path(jobs_path).expanduser()
+    output = Manifest(output_path)
+    if not resume and output.path.exists():
+        await server._run_blocking(output.path.unlink)
+    done: Set[int] = set()
+    if resume:
+        done = await server._run_blocking(
+            lambda: {
+                record["line"]
+                for record in output.records()
+                if record.get("status") == "ok" and isinstance(record.get("line"), int)
+            }
+        )
+
+    summary = RunSummary(found=0, skipped=0, manifest=str(output.path))
+    started = time.monotonic()
+    window = asyncio.Semaphore(max(1, concurrency) * 4)
+    writer = _OrderedWriter(output, window) if ordered else None
+    # The job file is read on its own thread, by one worker at a time
+    reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini-vision-jobs")
+    reading = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+    sequence = 0
+    logger.info(f"Running jobs from {jobs_path} with concurrency {concurrency}")
+
+    def read_pending() -> Tuple[int, Optional[Tuple[int, Any]]]:
+        """The next job not done yet, and how many done ones were passed over."""
+        skipped = 0
+        for number, job in jobs:
+            if number not in done:
+                return skipped, (number, job)
+            skipped += 1
+        return skipped, None
+
+    async def next_job() -> Optional[Tuple[int, int, Any]]:
+        nonlocal sequence
+        async with reading:
+            skipped, picked = await loop.run_in_executor(reader, read_pending)
+            summary.found += skipped
+            summary.skipped += skipped
+            if picked is None:
+                return None
+            summary.found += 1
+            summary.queued += 1
+            sequence += 1
+            return sequence - 1, picked[0], picked[1]
+
+    async def run(number: int, job: Any) -> Dict[str, Any]:
+        job_started = time.monotonic()
+        record: Dict[str, Any] = {"line": number}
+        with request_context() as request_id, collect_usage() as tokens:
+            record["request_id"] = request_id
+            await run_job(number, job, record)
+        summary.add_tokens(tokens)
+        record["elapsed_s"] = round(time.monotonic() - job_started, 3)
+        record["finished_at"] = datetime.now(timezone.utc).isoformat()
+        return record
+
+    async def run_job(number: int, job: Any, record: Dict[str, Any]) -> None:
+        try:
+            if isinstance(job, Exception):
+                raise job
+            if not isinstance(job, dict):
+                raise ValueError("Job must be a JSON object")
+            if "id" in job:
+                record["id"] = job["id"]
+            image_path = job.get("image_path")
+            prompt = job.get("prompt") or default_prompt
+            record.update(image_path=image_path, prompt=prompt)
+            if not image_path:
+                raise ValueError("image_path is required")
+            analysis = await server._analyze_image(
+                image_path, prompt, **server._analysis_options({**job, "stream": False})
+            )
+        except Exception as e:
+            logger.error(f"Job on line {number} failed: {e}")
+            record.update(status="error", error=str(e))
+            summary.failed += 1
+        else:
+            record.update(status="ok", analysis=analysis)
+            summary.succeeded += 1
+
+    async def worker() -> None:
+        while True:
+            if writer is not None:
+                await window.acquire()
+            picked = await next_job()
+            if picked is None:
+                if writer is not None:
+                    window.release()
+                return
+            position, number, job = picked
+            record = await run(number, job)
+            if writer is not None:
+                await writer.write(position, record)
+            else:
+                await output.write(record)
+            summary.elapsed = time.monotonic() - started
+            if on_result is not None:
+                await on_result(record, summary)
+
+    jobs = read_jobs(jobs_path)
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        # On the reader thread, so a read still in progress finishes first
+        await loop.run_in_executor(reader, jobs.close)
+        reader.shutdown(wait=False)
+        await output.aclose()
+        summary.elapsed = time.monotonic() - started
+
+    logger.info(f"Job run finished: {summary.as_dict()}")
+    return summary
@@ -0,0 +1,405 @@
+# SPDX-License-Identifier: MIT
+"""Response cache (in-memory LRU + SQLite tier) and prepared-image cache."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, TypeVar, Union
+
+from .config import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+T = TypeVar("T")
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "gemini-vision" / "responses.sqlite3"
+
+
+def cache_key(
+    image_digest: str, prompt: str, model: str, params: Dict[str, Any]
+) -> str:
+    """Build a cache key from the image digest, prompt, model and sampling params."""
+    material = json.dumps(
+        {
+            "image": image_digest,
+            "prompt": prompt,
+            "model": model,
+            "params": params,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheConfig:
+    """Response cache settings."""
+
+    enabled: bool = True
+    memory_entries: int = 256
+    ttl: float = 7 * 24 * 3600.0
+    path: Optional[str] = str(DEFAULT_CACHE_PATH)
+    max_disk_bytes: int = 64 * 1024 * 1024
+    cache_nondeterministic: bool = False
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        """Build a config from ``GEMINI_VISION_CACHE_*`` environment variables.
+
+        Setting ``GEMINI_VISION_CACHE_PATH`` to ``none`` keeps the cache in memory.
+        """
+        path = env_str("GEMINI_VISION_CACHE_PATH", cls.path)
+        if path is not None and path.lower() == "none":
+            path = None
+        return cls(
+            enabled=env_bool("GEMINI_VISION_CACHE", cls.enabled),
+            memory_entries=env_int(
+                "GEMINI_VISION_CACHE_MEMORY_ENTRIES", cls.memory_entries
+            ),
+            ttl=env_float("GEMINI_VISION_CACHE_TTL", cls.ttl),
+            path=path,
+            max_disk_bytes=env_int(
+                "GEMINI_VISION_CACHE_MAX_DISK_MB", cls.max_disk_bytes // (1024 * 1024)
+            )
+            * 1024
+            * 1024,
+            cache_nondeterministic=env_bool(
+                "GEMINI_VISION_CACHE_NONDETERMINISTIC", cls.cache_nondeterministic
+            ),
+        )
+
+
+@dataclass
+class CachedResponse:
+    """A cached upstream answer."""
+
+    text: str
+    model: str
+    temperature: float
+    created_at: float
+
+    @property
+    def deterministic(self) -> bool:
+        """Whether the answer was produced with greedy (temperature 0) sampling."""
+        return self.temperature == 0
+
+
+class ResponseCache:
+    """Two-tier cache: bounded in-memory LRU in front of a persistent SQLite store.
+
+    SQLite work runs on a dedicated single worker thread so the event loop
+    never blocks on disk I/O.
+    """
+
+    def __init__(self, config: Optional[CacheConfig] = None):
+        self.config = config or CacheConfig()
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def should_cache(self, temperature: float) -> bool:
+        """Whether responses sampled at ``temperature`` may be cached."""
+        if not self.config.enabled:
+            return False
+        return temperature == 0 or self.config.cache_nondeterministic
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up a response, promoting disk hits into memory."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if self._expired(entry):
+                del self._memory[key]
+                self._counters["expired"] += 1
+            else:
+                self._memory.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["memory_hits"] += 1
+                return entry
+
+        if self.config.path:
+            try:
+                entry = await self._run(self._disk_get, key)
+            except sqlite3.Error as e:
+                # A broken cache file must not fail the request; treat it as a miss
+                logger.warning(f"Failed to read cached response: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+                self._counters["hits"] += 1
+                self._counters["disk_hits"] += 1
+                return entry
+
+        self._counters["misses"] += 1
+        return None
+
+    async def put(self, key: str, text: str, model: str, temperature: float) -> None:
+        """Store a response in both tiers."""
+        entry = CachedResponse(
+            text=text, model=model, temperature=temperature, created_at=time.time()
+        )
+        self._remember(key, entry)
+        self._counters["stores"] += 1
+        if self.config.path:
+            try:
+                await self._run(self._disk_put, key, entry)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist cached response: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current memory size."""
+        stats = dict(self._counters)
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+    async def close(self) -> None:
+        """Close the SQLite connection and its worker thread."""
+        if self._executor is not None:
+            if self._db is not None:
+                await self._run(self._db.close)
+                self._db = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _expired(self, entry: CachedResponse) -> bool:
+        return self.config.ttl > 0 and time.time() - entry.created_at > self.config.ttl
+
+    def _remember(self, key: str, entry: CachedResponse) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > max(self.config.memory_entries, 0):
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="gemini-vision-cache"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            assert self.config.path is not None
+            path = Path(self.config.path).expanduser()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " temperature REAL NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " size INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed"
+                " ON responses (accessed_at)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[CachedResponse]:
+        db = self._connect()
+        row = db.execute(
+            "SELECT text, model, temperature, created_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = CachedResponse(
+            text=row[0], model=row[1], temperature=row[2], created_at=row[3]
+        )
+        if self._expired(entry):
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            db.commit()
+            self._counters["expired"] += 1
+            return None
+        db.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+        )
+        db.commit()
+        return entry
+
+    def _disk_put(self, key: str, entry: CachedResponse) -> None:
+        db = self._connect()
+        size = len(entry.text.encode("utf-8")) + len(key)
+        db.execute(
+            "INSERT OR REPLACE INTO responses"
+            " (key, text, model, temperature, created_at, accessed_at, size)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                entry.text,
+                entry.model,
+                entry.temperature,
+                entry.created_at,
+                entry.created_at,
+                size,
+            ),
+        )
+        if self.config.ttl > 0:
+            cursor = db.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.config.ttl,),
+            )
+            self._counters["expired"] += max(cursor.rowcount, 0)
+        self._evict_disk(db)
+        db.commit()
+
+    def _evict_disk(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.config.max_disk_bytes:
+            return
+        rows = db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.config.max_disk_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self._counters["disk_evictions"] += 1
+
+
+class FileIdentity(NamedTuple):
+    """Identifies one version of a file; any change to it changes the identity."""
+
+    path: str
+    device: int
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "FileIdentity":
+        """Stat ``path`` and build its identity."""
+        st = os.stat(path)
+        return cls(str(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class PreparedUpload(NamedTuple):
+    """An upload-ready image: base64 data and its MIME type."""
+
+    data: Union[bytes, bytearray]
+    mime_type: str
+
+
+class PreparedImageCache:
+    """Bounded LRU of prepared uploads and content digests, keyed on file identity.
+
+    Entries are keyed on (FileIdentity, preprocessing options), so editing,
+    replacing or touching a file invalidates them. Uploads are evicted by
+    total byte size; when a path is seen with a new identity, entries for
+    its old version are dropped straight away. A path is forgotten once the
+    last entry for it is evicted, so memory stays bounded however many
+    files are seen.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_digests: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_digests = max_digests
+        self._uploads: "OrderedDict[Tuple[FileIdentity, str], PreparedUpload]" = (
+            OrderedDict()
+        )
+        self._digests: "OrderedDict[FileIdentity, str]" = OrderedDict()
+        self._current: Dict[str, FileIdentity] = {}
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether uploads are cached at all."""
+        return self.max_bytes > 0
+
+    def digest(self, identity: FileIdentity) -> Optional[str]:
+        """Return the cached content digest for this file version."""
+        digest = self._digests.get(identity)
+        if digest is not None:
+            self._digests.move_to_end(identity)
+        return digest
+
+    def set_digest(self, identity: FileIdentity, digest: str) -> None:
+        """Remember the content digest for this file version."""
+        self._track(identity)
+        self._digests[identity] = digest
+        self._digests.move_to_end(identity)
+        while len(self._digests) > self.max_digests:
+            evicted, _ = self._digests.popitem(last=False)
+            self._release(evicted)
+
+    def get(self, identity: FileIdentity, options: str) -> Optional[PreparedUpload]:
+        """Return the prepared upload for this file version and options."""
+        prepared = self._uploads.get((identity, options))
+        if prepared is None:
+            self._counters["misses"] += 1
+            return None
+        self._uploads.move_to_end((identity, options))
+        self._counters["hits"] += 1
+        return prepared
+
+    def put(self, identity: FileIdentity, options: str, prepared: PreparedUpload) -> None:
+        """Store a prepared upload, evicting least recently used entries."""
+        size = len(prepared.data)
+        if not self.enabled or size > self.max_bytes:
+            return
+        self._track(identity)
+        key = (identity, options)
+        previous = self._uploads.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous.data)
+        self._uploads[key] = prepared
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            (evicted, _), upload = self._uploads.popitem(last=False)
+            self._bytes -= len(upload.data)
+            self._counters["evictions"] += 1
+            self._release(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and current size."""
+        stats = dict(self._counters)
+        stats["entries"] = len(self._uploads)
+        stats["bytes"] = self._bytes
+        return stats
+
+    def _track(self, identity: FileIdentity) -> None:
+        """Drop entries belonging to an older version of the same path."""
+        previous = self._current.get(identity.path)
+        self._current[identity.path] = identity
+        if previous is None or previous == identity:
+            return
+        self._digests.pop(previous, None)
+        for key in [key for key in self._uploads if key[0] == previous]:
+            self._bytes -= len(self._uploads.pop(key).data)
+            self._counters["invalidations"] += 1
+
+    def _release(self, identity: FileIdentity) -> None:
+        """Forget a path once no entries remain for its current version."""
+        if self._current.get(identity.path) != identity or identity in self._digests:
+            return
+        if any(key[0] == identity for key in self._uploads):
+            return
+        del self._current[identity.path]
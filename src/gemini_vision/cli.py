@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: MIT
+"""Command-line entry points for bulk analysis without an MCP client."""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from dataclasses import replace
+from typing import Any, Dict, Optional, Sequence
+
+from .batch import MANIFEST_NAME, RunSummary, analyze_directory, run_jobs
+from .log import LogConfig, configure_logging, shutdown_logging
+from .server import DEFAULT_PROMPT, SUPPORTED_FORMATS, GeminiVisionServer
+
+
+def _add_analysis_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared with the analysis tools."""
+    parser.add_argument("--temperature", type=float, help="Sampling temperature")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Bypass the response cache"
+    )
+    parser.add_argument("--max-edge", type=int, help="Longest edge after downscaling")
+    parser.add_argument("--quality", type=int, help="Re-encode quality (1-100)")
+    parser.add_argument(
+        "--no-preprocess", action="store_true", help="Send original files"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Log server activity to stderr"
+    )
+
+
+def _analysis_arguments(args: argparse.Namespace) -> Dict[str, Any]:
+    """Translate command-line options into analysis tool arguments."""
+    arguments: Dict[str, Any] = {
+        "use_cache": not args.no_cache,
+        "max_edge": args.max_edge,
+        "quality": args.quality,
+    }
+    if args.temperature is not None:
+        arguments["temperature"] = args.temperature
+    if args.no_preprocess:
+        arguments["preprocess"] = False
+    return arguments
+
+
+def _quiet_logging(verbose: bool) -> None:
+    """Keep stdout for results; server logs also go to stderr, and only warnings unless verbose."""
+    configure_logging(replace(LogConfig.from_env(), stderr=True))
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    logging.getLogger("gemini-vision-mcp").setLevel(logging.INFO if verbose else logging.WARNING)
+
+
+async def _report(record: Dict[str, Any], summary: RunSummary) -> None:
+    """Print one progress line per finished image to stderr."""
+    rate = summary.processed / summary.elapsed if summary.elapsed else 0.0
+    print(
+        f"[{summary.processed}/{summary.queued}] {record['status']} "
+        f"{record.get('image_path')} ({rate:.2f} images/s)",
+        file=sys.stderr,
+    )
+
+
+def _finish(run: Any) -> int:
+    """Run a bulk job, print its summary and map the outcome to an exit status."""
+    try:
+        summary = asyncio.run(run)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    finally:
+        shutdown_logging()
+
+    print(json.dumps(summary.as_dict(), indent=2))
+    return 1 if summary.failed else 0
+
+
+async def _run_directory(args: argparse.Namespace) -> RunSummary:
+    server = GeminiVisionServer()
+    await server.start()
+
+    try:
+        return await analyze_directory(
+            server,
+            args.source,
+            args.prompt or DEFAULT_PROMPT,
+            SUPPORTED_FORMATS,
+            manifest_path=args.manifest,
+            recursive=args.recursive,
+            concurrency=args.concurrency or server.batch_concurrency,
+            limit=args.limit,
+            on_result=_report,
+            **server._analysis_options(_analysis_arguments(args)),
+        )
+    finally:
+        await server.close()
+
+
+def analyze_dir(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point of ``gemini-vision-analyze-dir``."""
+    parser = argparse.ArgumentParser(
+        prog="gemini-vision-analyze-dir",
+        description=(
+            "Analyze every supported image in a directory or glob, appending "
+            "results to a JSONL manifest. Rerun the same command to resume."
+        ),
+    )
+    parser.add_argument("source", help="Directory or glob, e.g. 'photos/**/*.jpg'")
+    parser.add_argument("--prompt", help="Prompt used for every image")
+    parser.add_argument(
+        "--manifest", help=f"JSONL results file (default: {MANIFEST_NAME} in the directory)"
+    )
+    parser.add_argument(
+        "--recursive", action="store_true", help="Include subdirectories"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Images analyzed at once (default: GEMINI_VISION_BATCH_CONCURRENCY)",
+    )
+    parser.add_argument("--limit", type=int, help="Analyze at most this many images")
+    _add_analysis_arguments(parser)
+    args = parser.parse_args(argv)
+
+    _quiet_logging(args.verbose)
+    return _finish(_run_directory(args))
+
+
+async def _run_jobs(args: argparse.Namespace) -> RunSummary:
+    server = GeminiVisionServer()
+    await server.start()
+    try:
+        return await run_jobs(
+            server,
+            args.jobs,
+            args.output,
+            args.prompt or DEFAULT_PROMPT,
+            concurrency=args.concurrency or server.batch_concurrency,
+            ordered=not args.unordered,
+            resume=not args.restart,
+            on_result=None if args.quiet else _report,
+        )
+    finally:
+        await server.close()
+
+
+def batch(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point of ``gemini-vision-batch``."""
+    parser = argparse.ArgumentParser(
+        prog="gemini-vision-batch",
+        description=(
+            "Run a JSONL file of analysis jobs, one object per line with "
+            "image_path and optional prompt, id and analysis options, writing "
+            "one JSONL result record per job. Rerun the same command to resume."
+        ),
+    )
+    parser.add_argument("jobs", help="JSONL job file")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file")
+    parser.add_argument("--prompt", help="Prompt for jobs that do not set one")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Jobs run at once (default: GEMINI_VISION_BATCH_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write results as they finish instead of in job order",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the existing results file instead of resuming from it",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="No per-job progress lines"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Log server activity to stderr"
+    )
+    args = parser.parse_args(argv)
+
+    _quiet_logging(args.verbose)
+    return _finish(_run_jobs(args))
@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: MIT
+"""Single-flight coalescing of identical in-flight requests."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from .streaming import DeltaCallback
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+T = TypeVar("T")
+
+
+class _Call:
+    """One shared upstream call, the callers waiting on it and their stream callbacks."""
+
+    def __init__(self, factory: Callable[[DeltaCallback], Awaitable[Any]]):
+        self.waiters = 0
+        self.listeners: List[DeltaCallback] = []
+        self.task: "asyncio.Task[Any]" = asyncio.ensure_future(factory(self.forward))
+
+    async def forward(self, delta: str) -> None:
+        """Pass streamed text to every caller still waiting."""
+        for listener in list(self.listeners):
+            await listener(delta)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result.
+
+    Each caller awaits the shared task through ``asyncio.shield``, so a
+    caller being cancelled never cancels the call for the others. The
+    shared task is only cancelled once every caller has gone away.
+
+    ``factory`` is given a callback that forwards streamed text to the
+    ``on_delta`` of every caller currently waiting, so callers that join
+    late still see the rest of the stream and a caller that has gone away
+    stops receiving it.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[DeltaCallback], Awaitable[T]],
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> T:
+        """Return the result of ``factory(forward)``, sharing it with concurrent callers of ``key``."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(factory)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self._counters["leaders"] += 1
+        else:
+            self._counters["coalesced"] += 1
+            logger.info(f"Coalescing with in-flight request {key[:12]}")
+
+        call.waiters += 1
+        if on_delta is not None:
+            call.listeners.append(on_delta)
+        try:
+            result: T = await asyncio.shield(call.task)
+            return result
+        finally:
+            call.waiters -= 1
+            if on_delta is not None:
+                call.listeners.remove(on_delta)
+            if call.waiters == 0 and not call.task.done():
+                # Nobody wants the result any more; later callers start afresh
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+                self._counters["abandoned"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return leader/coalesced counters and the number of calls in flight."""
+        stats = dict(self._counters)
+        stats["in_flight"] = len(self._calls)
+        return stats
+
+    def _finished(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Mark the exception as retrieved; waiters have already seen it
+            call.task.exception()
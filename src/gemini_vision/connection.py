@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: MIT
+"""Shared, pooled HTTP session for upstream API calls.
+
+aiohttp is imported when the session is first needed rather than with this
+module, so a freshly spawned server answers ``initialize`` sooner.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .config import env_float, env_int
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+
+@dataclass
+class ConnectionConfig:
+    """Connector settings for the shared upstream session."""
+
+    limit: int = 100
+    limit_per_host: int = 20
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30.0
+    request_timeout: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "ConnectionConfig":
+        """Build a config from ``GEMINI_VISION_*`` environment variables."""
+        return cls(
+            limit=env_int("GEMINI_VISION_POOL_LIMIT", cls.limit),
+            limit_per_host=env_int(
+                "GEMINI_VISION_POOL_LIMIT_PER_HOST", cls.limit_per_host
+            ),
+            dns_cache_ttl=env_int("GEMINI_VISION_DNS_CACHE_TTL", cls.dns_cache_ttl),
+            keepalive_timeout=env_float(
+                "GEMINI_VISION_KEEPALIVE_TIMEOUT", cls.keepalive_timeout
+            ),
+            request_timeout=env_float(
+                "GEMINI_VISION_REQUEST_TIMEOUT", cls.request_timeout
+            ),
+        )
+
+
+class ConnectionPool:
+    """Owns one long-lived ``aiohttp.ClientSession`` and its connection counters."""
+
+    def __init__(self, config: Optional[ConnectionConfig] = None):
+        self.config = config or ConnectionConfig()
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._counters = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+        }
+
+    @property
+    def timeout(self) -> "aiohttp.ClientTimeout":
+        """Default per-request timeout."""
+        import aiohttp
+
+        return aiohttp.ClientTimeout(total=self.config.request_timeout)
+
+    def _trace_config(self) -> "aiohttp.TraceConfig":
+        import aiohttp
+
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(*_: Any) -> None:
+            self._counters["requests"] += 1
+
+        async def on_connection_create_end(*_: Any) -> None:
+            self._counters["connections_created"] += 1
+
+        async def on_connection_reuseconn(*_: Any) -> None:
+            self._counters["connections_reused"] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    async def get_session(self) -> "aiohttp.ClientSession":
+        """Return the shared session, creating it on first use."""
+        if self._session is not None and not self._session.closed:
+            return self._session
+        import aiohttp
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.config.limit,
+                    limit_per_host=self.config.limit_per_host,
+                    ttl_dns_cache=self.config.dns_cache_ttl,
+                    keepalive_timeout=self.config.keepalive_timeout,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=self.timeout,
+                    trace_configs=[self._trace_config()],
+                )
+                logger.info(
+                    f"Opened upstream session (limit={self.config.limit}, "
+                    f"per_host={self.config.limit_per_host})"
+                )
+        return self._session
+
+    async def warm_up(self, url: str) -> bool:
+        """Open a connection to ``url`` so the first real call skips the handshake.
+
+        The response status is ignored; only the TCP/TLS connection matters.
+        Returns True if a connection was established.
+        """
+        import aiohttp
+
+        session = await self.get_session()
+        try:
+            async with session.head(
+                url, allow_redirects=False, timeout=self.timeout
+            ) as response:
+                await response.read()
+            logger.info(f"Warmed up upstream connection to {url}")
+            return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Connection warm-up to {url} failed: {e}")
+            return False
+
+    async def close(self) -> None:
+        """Close the shared session and release pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"Closed upstream session: {self.stats()}")
+        self._session = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return request and connection reuse counters."""
+        return dict(self._counters)
@@ -0,0 +1,258 @@
+# SPDX-License-Identifier: MIT
+"""Non-blocking structured logging: queue handler, background writer, JSON records.
+
+Callers only put records on an in-memory queue; a listener thread formats
+and writes them to a size-rotated file and, optionally, stderr. Nothing is
+ever written to stdout, which carries the MCP stdio transport.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import env_bool, env_float, env_int, env_str
+
+# Pass as ``extra=SAMPLED`` on high-volume lines to subject them to sampling
+SAMPLED = {"sampled": True}
+
+# Prompts and other free text are cut to this many characters in log lines
+MAX_LOGGED_TEXT = 200
+
+_request_id: ContextVar[Optional[str]] = ContextVar("gemini_vision_request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_STANDARD_ATTRIBUTES = set(
+    logging.LogRecord("", logging.INFO, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "sampled", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    """A short random identifier for correlating the log lines of one call."""
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Tag log records emitted in the enclosed block (and tasks it starts) with a request ID."""
+    value = request_id or new_request_id()
+    token = _request_id.set(value)
+    try:
+        yield value
+    finally:
+        _request_id.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    """The request ID of the enclosing request_context, if any."""
+    return _request_id.get()
+
+
+def clip(value: Any, limit: int = MAX_LOGGED_TEXT) -> str:
+    """Shorten free text for a log line."""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+@dataclass
+class LogConfig:
+    """Logging settings."""
+
+    level: str = "INFO"
+    file: Optional[str] = "gemini_vision.log"
+    format: str = "json"
+    max_bytes: int = 10 * 1024 * 1024
+    backups: int = 5
+    sample_rate: float = 1.0
+    stderr: bool = False
+
+    @classmethod
+    def from_env(cls) -> "LogConfig":
+        """Build a config from ``GEMINI_VISION_LOG_*`` environment variables.
+
+        Setting ``GEMINI_VISION_LOG_FILE`` to ``none`` disables the log file.
+        """
+        path = env_str("GEMINI_VISION_LOG_FILE", cls.file)
+        if path is not None and path.lower() == "none":
+            path = None
+        log_format = (env_str("GEMINI_VISION_LOG_FORMAT", cls.format) or cls.format).lower()
+        return cls(
+            level=(env_str("GEMINI_VISION_LOG_LEVEL", cls.level) or cls.level).upper(),
+            file=path,
+            format=log_format if log_format in ("json", "text") else cls.format,
+            max_bytes=env_int("GEMINI_VISION_LOG_MAX_MB", cls.max_bytes // (1024 * 1024))
+            * 1024
+            * 1024,
+            backups=max(0, env_int("GEMINI_VISION_LOG_BACKUPS", cls.backups)),
+            sample_rate=min(
+                1.0, max(0.0, env_float("GEMINI_VISION_LOG_SAMPLE_RATE", cls.sample_rate))
+            ),
+            stderr=env_bool("GEMINI_VISION_LOG_STDERR", cls.stderr),
+        )
+
+
+class ContextFilter(logging.Filter):
+    """Adds the current request ID and drops a share of sampled records.
+
+    Runs in the calling thread, before the record is queued, so the request
+    ID is read from the caller's context and dropped records cost nothing
+    further.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            getattr(record, "sampled", False)
+            and self.sample_rate < 1.0
+            and random.random() >= self.sample_rate
+        ):
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request ID and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for name, value in record.__dict__.items():
+            if name not in _STANDARD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic line format, with the request ID when there is one."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [request_id={request_id}]" if request_id else line
+
+
+class StderrHandler(logging.StreamHandler):
+    """Writes to whatever ``sys.stderr`` is at the time, so later redirection is honoured."""
+
+    def __init__(self) -> None:
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self) -> Any:  # type: ignore[override]
+        return sys.stderr
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues a copy of each record with its message rendered and extra fields intact."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(config: Optional[LogConfig] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread.
+
+    Removes root handlers that write to stdout; calling it again
+    reconfigures. The writer is flushed and stopped at interpreter exit, or
+    by ``shutdown_logging()``.
+    """
+    global _listener
+    config = config or LogConfig.from_env()
+    shutdown_logging()
+
+    formatter: logging.Formatter = JsonFormatter() if config.format == "json" else TextFormatter()
+    handlers: List[logging.Handler] = []
+    problem = None
+    if config.file:
+        try:
+            handlers.append(
+                logging.handlers.RotatingFileHandler(
+                    config.file,
+                    maxBytes=config.max_bytes,
+                    backupCount=config.backups,
+                    encoding="utf-8",
+                )
+            )
+        except OSError as e:
+            problem = f"Cannot open log file {config.file}, logging to stderr: {e}"
+    if config.stderr or not handlers:
+        handlers.append(StderrHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)  # type: ignore[arg-type]
+    queue_handler.addFilter(ContextFilter(config.sample_rate))
+
+    # Drop earlier configurations and anything else that would write to stdout
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler) or getattr(handler, "stream", None) is sys.stdout:
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.level)
+    logging.getLogger("gemini-vision-mcp").setLevel(config.level)
+
+    _listener = logging.handlers.QueueListener(records, *handlers)  # type: ignore[arg-type]
+    _listener.start()
+    if problem:
+        logging.getLogger("gemini-vision-mcp").warning(problem)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Write out queued records, stop the background writer and detach the queue."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,296 @@
+# SPDX-License-Identifier: MIT
+"""Per-stage latency histograms, byte and token counters, and Prometheus text export."""
+
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+# Stages of an analysis call, in pipeline order
+STAGES = (
+    "validate",
+    "hash",
+    "phash",
+    "read",
+    "preprocess",
+    "encode",
+    "queue",
+    "upstream_ttfb",
+    "upstream_total",
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage totals of the tool call in progress, for its log record; see collect_stages()
+_call_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "gemini_vision_call_stages", default=None
+)
+
+# Token usage of the job in progress; see collect_usage()
+_call_tokens: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "gemini_vision_call_tokens", default=None
+)
+
+# Characters not allowed in Prometheus metric names
+_METRIC_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_:]")
+
+# Token counts read from the OpenRouter ``usage`` field
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class LatencyHistogram:
+    """Latency distribution over a sliding reservoir of recent samples.
+
+    Count, sum and max cover every observation; quantiles are computed
+    from the most recent ``reservoir`` samples.
+    """
+
+    def __init__(self, reservoir: int = 2048):
+        self._samples: Deque[float] = deque(maxlen=reservoir)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one duration in seconds."""
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Return the ``q`` quantile (0-1) of recent samples, in seconds."""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return count and mean/p50/p95/p99/max in milliseconds."""
+        snapshot: Dict[str, float] = {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+        }
+        for q in QUANTILES:
+            snapshot[f"p{round(q * 100)}_ms"] = round(1000 * self.quantile(q), 3)
+        snapshot["max_ms"] = round(1000 * self.max, 3)
+        return snapshot
+
+
+class Metrics:
+    """Thread-safe registry of stage timings, byte/token counters and tool outcomes.
+
+    Stages are timed from worker threads as well as the event loop, so all
+    updates go through one lock.
+    """
+
+    def __init__(self, reservoir: int = 2048):
+        self._reservoir = reservoir
+        self._lock = threading.Lock()
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._tools: Dict[str, LatencyHistogram] = {}
+        self._tool_errors: Dict[str, int] = {}
+        self._bytes: Dict[str, int] = {}
+        self._tokens: Dict[str, int] = {field: 0 for field in USAGE_FIELDS}
+        self.started_at = time.time()
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as one observation of ``stage``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a duration for ``stage``, also adding it to the enclosing collect_stages()."""
+        stages = _call_stages.get()
+        if stages is not None:
+            with self._lock:
+                stages[stage] = stages.get(stage, 0.0) + seconds
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram(self._reservoir)
+            histogram.observe(seconds)
+
+    def add_bytes(self, kind: str, count: int) -> None:
+        """Add ``count`` bytes to the ``kind`` byte counter."""
+        with self._lock:
+            self._bytes[kind] = self._bytes.get(kind, 0) + count
+
+    def record_usage(self, usage: Optional[Mapping[str, Any]]) -> None:
+        """Add the token counts from an OpenRouter ``usage`` object.
+
+        They are also added to the enclosing collect_usage() block, if any.
+        """
+        if not usage:
+            return
+        tokens = _call_tokens.get()
+        with self._lock:
+            for field in USAGE_FIELDS:
+                value = usage.get(field)
+                if isinstance(value, (int, float)):
+                    self._tokens[field] += int(value)
+                    if tokens is not None:
+                        tokens[field] += int(value)
+
+    def record_call(self, tool: str, seconds: float, ok: bool) -> None:
+        """Record the end-to-end latency and outcome of one tool call."""
+        with self._lock:
+            histogram = self._tools.get(tool)
+            if histogram is None:
+                histogram = self._tools[tool] = LatencyHistogram(self._reservoir)
+            histogram.observe(seconds)
+            if not ok:
+                self._tool_errors[tool] = self._tool_errors.get(tool, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all metrics as plain data."""
+        with self._lock:
+            ordered = [stage for stage in STAGES if stage in self._stages]
+            ordered += sorted(stage for stage in self._stages if stage not in STAGES)
+            tools = {}
+            for tool, histogram in sorted(self._tools.items()):
+                tools[tool] = histogram.snapshot()
+                tools[tool]["errors"] = self._tool_errors.get(tool, 0)
+            return {
+                "uptime_s": round(time.time() - self.started_at, 3),
+                "stages": {stage: self._stages[stage].snapshot() for stage in ordered},
+                "tools": tools,
+                "bytes": dict(sorted(self._bytes.items())),
+                "tokens": dict(self._tokens),
+            }
+
+    def render_prometheus(
+        self, components: Optional[Mapping[str, Mapping[str, Any]]] = None
+    ) -> str:
+        """Render metrics in the Prometheus text exposition format.
+
+        Numeric values in ``components`` (e.g. cache or pool stats) are
+        exported as gauges named ``gemini_vision_<component>_<key>``.
+        """
+        lines: List[str] = []
+        with self._lock:
+            lines += _summary(
+                "gemini_vision_stage_seconds",
+                "Latency of each analysis stage",
+                "stage",
+                self._stages,
+            )
+            lines += _summary(
+                "gemini_vision_tool_seconds",
+                "End-to-end latency of tool calls",
+                "tool",
+                self._tools,
+            )
+            lines.append("# HELP gemini_vision_tool_errors_total Tool calls that failed")
+            lines.append("# TYPE gemini_vision_tool_errors_total counter")
+            for tool in sorted(self._tools):
+                errors = self._tool_errors.get(tool, 0)
+                lines.append(f'gemini_vision_tool_errors_total{{tool="{tool}"}} {errors}')
+            lines.append("# HELP gemini_vision_bytes_total Bytes processed, by kind")
+            lines.append("# TYPE gemini_vision_bytes_total counter")
+            for kind, count in sorted(self._bytes.items()):
+                lines.append(f'gemini_vision_bytes_total{{kind="{kind}"}} {count}')
+            lines.append("# HELP gemini_vision_tokens_total Upstream token usage, by kind")
+            lines.append("# TYPE gemini_vision_tokens_total counter")
+            for field, count in self._tokens.items():
+                kind = field[: -len("_tokens")]
+                lines.append(f'gemini_vision_tokens_total{{kind="{kind}"}} {count}')
+
+        for component, stats in sorted((components or {}).items()):
+            for key, value in _flatten(stats):
+                # Keys may be model names such as google/gemini-2.5-pro
+                name = _METRIC_NAME_INVALID.sub("_", f"gemini_vision_{component}_{key}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(
+        self,
+        path: Union[str, Path],
+        components: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    ) -> None:
+        """Atomically write the Prometheus text dump to ``path``."""
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = self.render_prometheus(components)
+        fd, tmp_name = tempfile.mkstemp(prefix=".metrics-", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                handle.write(text)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+
+@contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """Total the stage timings observed in the enclosed block, per stage, in seconds.
+
+    Covers tasks started inside the block and work handed to threads with
+    the caller's context (see GeminiVisionServer._run_blocking).
+    """
+    stages: Dict[str, float] = {}
+    token = _call_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _call_stages.reset(token)
+
+
+@contextmanager
+def collect_usage() -> Iterator[Dict[str, int]]:
+    """Total the upstream token usage of completions made in the enclosed block.
+
+    Unlike the global counters, this only covers calls made on behalf of
+    the block (and tasks it starts), not concurrent requests.
+    """
+    tokens = {field: 0 for field in USAGE_FIELDS}
+    token = _call_tokens.set(tokens)
+    try:
+        yield tokens
+    finally:
+        _call_tokens.reset(token)
+
+
+def _summary(
+    name: str, help_text: str, label: str, histograms: Mapping[str, LatencyHistogram]
+) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+    for key, histogram in histograms.items():
+        for q in QUANTILES:
+            value = histogram.quantile(q)
+            lines.append(f'{name}{{{label}="{key}",quantile="{q}"}} {value:.6f}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.total:.6f}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+    return lines
+
+
+def _flatten(stats: Mapping[str, Any], prefix: str = "") -> List[Tuple[str, Any]]:
+    """Numeric and boolean leaves of a nested stats dict, with ``_``-joined keys."""
+    items: List[Tuple[str, Any]] = []
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, Mapping):
+            items += _flatten(value, f"{name}_")
+        elif isinstance(value, (bool, int, float)):
+            items.append((name, value))
+    return items
+
+
+def _number(value: Union[bool, int, float]) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: MIT
+"""Perceptual-hash index for reusing analyses of visually identical images."""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Generic, List, Optional, Set, Tuple, TypeVar, Union
+
+from .config import env_bool, env_int
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+V = TypeVar("V")
+
+# Width of the grayscale thumbnail is HASH_SIZE + 1, giving HASH_SIZE**2 bits
+HASH_SIZE = 8
+
+
+def dhash(source: Union[str, Path], hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy.
+
+    Insensitive to re-encoding, format changes and resizing; a small crop or
+    edit flips a few bits.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as opened:
+        # Let JPEG decode at a reduced scale; the thumbnail is tiny anyway
+        opened.draft("L", (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(opened)
+        if image.mode in ("RGBA", "LA", "P"):
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image.convert("RGBA"))
+        pixels = (
+            image.convert("L")
+            .resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+            .tobytes()
+        )
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits."""
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash(Generic[V]):
+    """Hamming-distance range search over integer hashes by multi-index hashing.
+
+    Each hash is split into ``max_distance + 1`` chunks, each indexed in its
+    own exact-match table. Two hashes within ``max_distance`` bits agree on
+    at least one chunk, so a query only has to check the hashes sharing one
+    of its chunks. Several values may share one hash.
+    """
+
+    def __init__(self, max_distance: int, bits: int = HASH_SIZE * HASH_SIZE):
+        self.max_distance = max_distance
+        chunks = min(max_distance + 1, bits)
+        self._spans = [
+            (bits * i // chunks, (1 << (bits * (i + 1) // chunks - bits * i // chunks)) - 1)
+            for i in range(chunks)
+        ]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._spans]
+        self._values: Dict[int, List[V]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_value: int, value: V) -> None:
+        """Insert ``value`` under ``hash_value``."""
+        values = self._values.get(hash_value)
+        if values is None:
+            values = self._values[hash_value] = []
+            for (shift, mask), table in zip(self._spans, self._tables):
+                table.setdefault((hash_value >> shift) & mask, []).append(hash_value)
+        values.append(value)
+        self._size += 1
+
+    def discard(self, hash_value: int, value: V) -> None:
+        """Remove one value, if present."""
+        values = self._values.get(hash_value)
+        if values is None or value not in values:
+            return
+        values.remove(value)
+        self._size -= 1
+        if values:
+            return
+        del self._values[hash_value]
+        for (shift, mask), table in zip(self._spans, self._tables):
+            chunk = (hash_value >> shift) & mask
+            bucket = table[chunk]
+            bucket.remove(hash_value)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, hash_value: int) -> List[Tuple[int, V]]:
+        """All (distance, value) pairs within ``max_distance``, nearest first."""
+        candidates: Set[int] = set()
+        for (shift, mask), table in zip(self._spans, self._tables):
+            candidates.update(table.get((hash_value >> shift) & mask, ()))
+        found: List[Tuple[int, V]] = []
+        for candidate in candidates:
+            distance = hamming(hash_value, candidate)
+            if distance <= self.max_distance:
+                found.extend((distance, value) for value in self._values[candidate])
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+@dataclass
+class NearDuplicateConfig:
+    """Near-duplicate lookup settings."""
+
+    enabled: bool = False
+    max_distance: int = 4
+    # Most images indexed; the least recently used are dropped beyond it.
+    # Each entry takes about 0.6 KB of memory and 0.3 KB of the cache file
+    max_entries: int = 250_000
+
+    @classmethod
+    def from_env(cls) -> "NearDuplicateConfig":
+        """Build a config from ``GEMINI_VISION_NEAR_DUPLICATE*`` environment variables."""
+        return cls(
+            enabled=env_bool("GEMINI_VISION_NEAR_DUPLICATE", cls.enabled),
+            max_distance=max(
+                0, env_int("GEMINI_VISION_NEAR_DUPLICATE_DISTANCE", cls.max_distance)
+            ),
+            max_entries=max(
+                1, env_int("GEMINI_VISION_NEAR_DUPLICATE_MAX_ENTRIES", cls.max_entries)
+            ),
+        )
+
+
+class NearDuplicateIndex:
+    """Maps perceptual hashes of analyzed images to their response cache keys.
+
+    Entries are grouped by ``context``, a digest of everything in the cache
+    key except the image (prompt, model, sampling and preprocessing
+    options), so only analyses of the same request are reused. The index
+    lives in memory as a multi-index hash table and, when ``path`` is set, in a table of
+    the response cache's SQLite file, loaded on first use. Both hold at most
+    ``max_entries`` images, dropping the least recently used.
+    """
+
+    def __init__(
+        self,
+        config: Optional[NearDuplicateConfig] = None,
+        path: Optional[str] = None,
+        ttl: float = 0.0,
+    ):
+        self.config = config or NearDuplicateConfig()
+        self.path = path
+        self.ttl = ttl
+        self._index: MultiIndexHash[Tuple[str, str]] = MultiIndexHash(
+            self.config.max_distance
+        )
+        # In least recently used order
+        self._hashes: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._loaded = path is None
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """Whether near-duplicate lookups are made at all."""
+        return self.config.enabled
+
+    async def find(self, hash_value: int, context: str) -> List[Tuple[int, str]]:
+        """Cache keys of analyses with the same context, nearest first, as (distance, key)."""
+        await self._load()
+        self._counters["lookups"] += 1
+        found = [
+            (distance, key)
+            for distance, (entry_context, key) in self._index.search(hash_value)
+            if entry_context == context
+        ]
+        for _, key in found:
+            self._hashes.move_to_end((context, key))
+        return found
+
+    def record_hit(self, hit: bool) -> None:
+        """Count the outcome of a lookup once the cached response was fetched."""
+        self._counters["hits" if hit else "misses"] += 1
+
+    async def add(self, hash_value: int, context: str, key: str) -> None:
+        """Index a stored analysis."""
+        await self._load()
+        evicted = self._insert(hash_value, context, key)
+        self._counters["stores"] += 1
+        if self.path:
+            try:
+                await self._run(self._disk_put, hash_value, context, key, evicted)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist near-duplicate entry: {e}")
+
+    async def discard(self, context: str, key: str) -> None:
+        """Drop an entry whose response is no longer cached."""
+        hash_value = self._hashes.pop((context, key), None)
+        if hash_value is None:
+            return
+        self._index.discard(hash_value, (context, key))
+        self._counters["stale"] += 1
+        if self.path:
+            try:
+                await self._run(self._disk_delete, context, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to remove near-duplicate entry: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return lookup counters and the number of indexed images."""
+        stats = dict(self._counters)
+        stats["entries"] = len(self._index)
+        return stats
+
+    async def close(self) -> None:
+        """Close the SQLite connection and its worker thread."""
+        if self._executor is not None:
+            if self._db is not None:
+                await self._run(self._db.close)
+                self._db = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _insert(self, hash_value: int, context: str, key: str) -> List[Tuple[str, str]]:
+        """Index an entry, returning the (context, key) pairs evicted to make room."""
+        previous = self._hashes.get((context, key))
+        if previous != hash_value:
+            if previous is not None:
+                self._index.discard(previous, (context, key))
+            self._index.add(hash_value, (context, key))
+        self._hashes[(context, key)] = hash_value
+        self._hashes.move_to_end((context, key))
+
+        evicted = []
+        while len(self._hashes) > self.config.max_entries:
+            entry, old_hash = self._hashes.popitem(last=False)
+            self._index.discard(old_hash, entry)
+            evicted.append(entry)
+            self._counters["evictions"] += 1
+        return evicted
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                rows = await self._run(self._disk_load)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to load near-duplicate index: {e}")
+                rows = []
+            evicted = []
+            for hash_hex, context, key in rows:
+                evicted.extend(self._insert(int(hash_hex, 16), context, key))
+            if evicted:
+                try:
+                    await self._run(self._disk_delete_many, evicted)
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to trim near-duplicate index: {e}")
+            self._loaded = True
+            logger.info(f"Loaded {len(rows)} near-duplicate index entries")
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="gemini-vision-neardup"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            path = Path(self.path).expanduser()  # type: ignore[arg-type]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # Hashes are stored as hex: SQLite integers are signed 64-bit
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS perceptual_hashes ("
+                " context TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (context, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_load(self) -> List[Tuple[str, str, str]]:
+        db = self._connect()
+        if self.ttl > 0:
+            db.execute(
+                "DELETE FROM perceptual_hashes WHERE created_at < ?",
+                (time.time() - self.ttl,),
+            )
+            db.commit()
+        # Oldest first, so the newest survive the in-memory cap
+        return db.execute(
+            "SELECT hash, context, key FROM perceptual_hashes ORDER BY created_at"
+        ).fetchall()
+
+    def _disk_put(
+        self,
+        hash_value: int,
+        context: str,
+        key: str,
+        evicted: List[Tuple[str, str]],
+    ) -> None:
+        db = self._connect()
+        db.execute(
+            "INSERT OR REPLACE INTO perceptual_hashes (context, key, hash, created_at)"
+            " VALUES (?, ?, ?, ?)",
+            (context, key, f"{hash_value:x}", time.time()),
+        )
+        db.executemany(
+            "DELETE FROM perceptual_hashes WHERE context = ? AND key = ?", evicted
+        )
+        db.commit()
+
+    def _disk_delete(self, context: str, key: str) -> None:
+        db = self._connect()
+        db.execute(
+            "DELETE FROM perceptual_hashes WHERE context = ? AND key = ?", (context, key)
+        )
+        db.commit()
+
+    def _disk_delete_many(self, entries: List[Tuple[str, str]]) -> None:
+        db = self._connect()
+        db.executemany(
+            "DELETE FROM perceptual_hashes WHERE context = ? AND key = ?", entries
+        )
+        db.commit()
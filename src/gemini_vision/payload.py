@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: MIT
+"""Request body construction without extra copies of the image data."""
+
+import binascii
+import json
+import secrets
+from typing import Any, Dict, List, Sequence, Union
+
+# Stands in for base64 image data while the rest of the payload is serialized;
+# the random token keeps caller text, such as a prompt, from matching it
+_PLACEHOLDER = "@@gemini-vision-image-" + secrets.token_hex(16) + "-{}@@"
+
+# Input bytes per base64 chunk; must be a multiple of 3
+_BASE64_CHUNK = 3 * 64 * 1024
+
+
+def base64_size(size: int) -> int:
+    """Length of the base64 encoding of ``size`` bytes."""
+    return 4 * ((size + 2) // 3)
+
+
+def encode_base64(data: bytes) -> bytearray:
+    """Base64-encode ``data`` into an exactly sized buffer.
+
+    ``base64.b64encode`` briefly over-allocates its output to twice the
+    input size; encoding in chunks keeps the peak at input + output.
+    """
+    encoded = bytearray(base64_size(len(data)))
+    view = memoryview(data)
+    position = 0
+    for start in range(0, len(data), _BASE64_CHUNK):
+        chunk = binascii.b2a_base64(view[start:start + _BASE64_CHUNK], newline=False)
+        encoded[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    return encoded
+
+
+def image_part(mime_type: str, index: int = 0) -> Dict[str, Any]:
+    """Build an ``image_url`` content part whose data is filled in by encode_body."""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime_type};base64,{_PLACEHOLDER.format(index)}"
+        },
+    }
+
+
+def encode_body(
+    payload: Dict[str, Any], images: Sequence[Union[str, bytes, bytearray]]
+) -> bytes:
+    """Serialize ``payload`` to JSON bytes, splicing in base64 image data.
+
+    ``payload`` references images through image_part(mime_type, index). The
+    base64 data is copied exactly once, into the final body, instead of
+    passing through data-URL strings and a JSON string first. Base64 only
+    uses JSON-safe characters, so no escaping is needed.
+
+    Raises ValueError unless each image's placeholder occurs exactly once.
+    """
+    serialized = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    markers = [_PLACEHOLDER.format(index).encode("ascii") for index in range(len(images))]
+    for index, marker in enumerate(markers):
+        count = serialized.count(marker)
+        if count != 1:
+            problem = "no placeholder" if count == 0 else f"{count} placeholders"
+            raise ValueError(f"Payload has {problem} for image {index}")
+
+    pieces: List[Union[bytes, bytearray]] = []
+    for marker, image in zip(markers, images):
+        before, _, serialized = serialized.partition(marker)
+        pieces.append(before)
+        pieces.append(image.encode("ascii") if isinstance(image, str) else image)
+    pieces.append(serialized)
+    return b"".join(pieces)
@@ -0,0 +1,191 @@
+# SPDX-License-Identifier: MIT
+"""Pre-upload image downscaling and recompression."""
+
+import io
+import logging
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Union
+
+from .config import env_bool, env_int, env_str
+
+if TYPE_CHECKING:
+    from PIL.Image import Image as PILImage
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+OUTPUT_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+# Lowest quality tried before shrinking dimensions to meet a byte budget
+MIN_QUALITY = 40
+QUALITY_STEP = 10
+SCALE_STEP = 0.75
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """How images are prepared before upload."""
+
+    enabled: bool = True
+    max_edge: int = 2048
+    output_format: str = "webp"
+    quality: int = 85
+    max_bytes: int = 0
+
+    @classmethod
+    def from_env(cls) -> "PreprocessOptions":
+        """Build options from ``GEMINI_VISION_*`` environment variables."""
+        return cls(
+            enabled=env_bool("GEMINI_VISION_PREPROCESS", cls.enabled),
+            max_edge=env_int("GEMINI_VISION_MAX_EDGE", cls.max_edge),
+            output_format=(
+                env_str("GEMINI_VISION_OUTPUT_FORMAT", cls.output_format) or ""
+            ).lower(),
+            quality=env_int("GEMINI_VISION_QUALITY", cls.quality),
+            max_bytes=env_int("GEMINI_VISION_MAX_UPLOAD_BYTES", cls.max_bytes),
+        ).validated()
+
+    def with_overrides(self, arguments: Dict[str, Any]) -> "PreprocessOptions":
+        """Return a copy with per-call tool arguments applied."""
+        overrides: Dict[str, Any] = {}
+        if arguments.get("preprocess") is not None:
+            overrides["enabled"] = bool(arguments["preprocess"])
+        for name in ("max_edge", "quality", "max_bytes"):
+            if arguments.get(name) is not None:
+                overrides[name] = int(arguments[name])
+        if arguments.get("output_format") is not None:
+            overrides["output_format"] = str(arguments["output_format"]).lower()
+        if not overrides:
+            return self
+        return replace(self, **overrides).validated()
+
+    def validated(self) -> "PreprocessOptions":
+        """Check option values, raising ValueError on bad input."""
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unsupported output format: {self.output_format}. "
+                f"Supported formats: {', '.join(OUTPUT_FORMATS)}"
+            )
+        if self.max_edge < 0:
+            raise ValueError("max_edge must not be negative")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+        if self.max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        return self
+
+    def cache_token(self) -> Dict[str, Any]:
+        """Options that change what the model sees, for use in cache keys."""
+        return asdict(self) if self.enabled else {"enabled": False}
+
+
+@dataclass
+class PreparedImage:
+    """Image bytes ready to upload."""
+
+    data: bytes
+    mime_type: str
+    original_size: int
+    width: int
+    height: int
+
+
+def _flatten(image: "PILImage") -> "PILImage":
+    """Composite any transparency onto white and convert to RGB."""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    ):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _encode(image: "PILImage", output_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if output_format == "jpeg":
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    else:
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def _encode_fitted(
+    image: "PILImage", options: PreprocessOptions
+) -> Tuple["PILImage", bytes, bool]:
+    """Cap the longest edge at ``max_edge`` and encode, shrinking until within ``max_bytes``.
+
+    Returns the final image, its encoding and whether it was resized.
+    """
+    from PIL import Image
+
+    resized = False
+    if options.max_edge and max(image.size) > options.max_edge:
+        image.thumbnail((options.max_edge, options.max_edge), Image.Resampling.LANCZOS)
+        resized = True
+
+    quality = options.quality
+    data = _encode(image, options.output_format, quality)
+    while options.max_bytes and len(data) > options.max_bytes:
+        if quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+        else:
+            width, height = image.size
+            if max(width, height) <= 64:
+                break
+            image = image.resize(
+                (max(1, int(width * SCALE_STEP)), max(1, int(height * SCALE_STEP))),
+                Image.Resampling.LANCZOS,
+            )
+            resized = True
+        data = _encode(image, options.output_format, quality)
+    return image, data, resized
+
+
+def preprocess_image(
+    source: Union[str, Path, bytes], options: PreprocessOptions
+) -> Optional[PreparedImage]:
+    """Downscale and re-encode an image according to ``options``.
+
+    Applies EXIF orientation, drops all metadata, flattens alpha, caps the
+    longest edge at ``max_edge`` and re-encodes at ``quality``. When
+    ``max_bytes`` is set, quality and then dimensions are reduced until the
+    result fits. Returns None when the original bytes should be sent as-is:
+    preprocessing is disabled, the image is animated, or re-encoding would
+    not make an unresized image smaller.
+    """
+    if not options.enabled:
+        return None
+
+    # Pillow is imported on first use to keep it off the server's startup path
+    from PIL import Image, ImageOps
+
+    if isinstance(source, bytes):
+        original_size = len(source)
+        handle: Any = io.BytesIO(source)
+    else:
+        original_size = Path(source).stat().st_size
+        handle = str(source)
+
+    with Image.open(handle) as opened:
+        if getattr(opened, "n_frames", 1) > 1:
+            return None
+        image = ImageOps.exif_transpose(opened)
+        image = _flatten(image)
+
+    image, data, resized = _encode_fitted(image, options)
+    if not resized and len(data) >= original_size:
+        return None
+
+    return PreparedImage(
+        data=data,
+        mime_type=OUTPUT_FORMATS[options.output_format],
+        original_size=original_size,
+        width=image.size[0],
+        height=image.size[1],
+    )
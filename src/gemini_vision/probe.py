@@ -0,0 +1,256 @@
+# SPDX-License-Identifier: MIT
+"""Header-only image probing: the real format, dimensions and frame count from magic bytes.
+
+Only container headers are read (a few KB, plus seeks past segments and
+chunks), never pixel data, so a mislabeled, oversized or animated file is
+caught before it is read in full, decoded, encoded or uploaded.
+"""
+
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+# Bytes read up front; enough for every format's signature and for the
+# ISO-BMFF boxes that hold an AVIF's size
+PROBE_BYTES = 64 * 1024
+
+# Headers are walked chunk by chunk; give up on files with more than this many
+MAX_SEGMENTS = 4096
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+# JPEG start-of-frame markers (all but DHT, JPG and DAC in C0-CF)
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers without a length field
+_JPEG_STANDALONE = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """What an image's header says about it."""
+
+    format: str
+    # None when the header does not state them
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # None for an animation whose length is only known by reading it all (GIF, AVIF sequences)
+    frames: Optional[int] = 1
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    @property
+    def pixels(self) -> Optional[int]:
+        if self.width is None or self.height is None:
+            return None
+        return self.width * self.height
+
+    @property
+    def animated(self) -> bool:
+        return self.frames != 1
+
+
+def probe_image(source: Union[str, Path]) -> Optional[ImageInfo]:
+    """Identify an image from its header; None if it is not a PNG, JPEG, GIF, WebP or AVIF.
+
+    A truncated or unusual header leaves the dimensions unset rather than
+    failing; decoding is left to Pillow or the upstream model.
+    """
+    with open(source, "rb") as handle:
+        head = handle.read(PROBE_BYTES)
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return _probe_png(handle, head)
+        if head.startswith(b"\xff\xd8\xff"):
+            return _probe_jpeg(handle)
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return _probe_gif(handle, head)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return _probe_webp(handle, head)
+        if head[4:8] == b"ftyp":
+            return _probe_avif(head)
+    return None
+
+
+def format_for_suffix(suffix: str) -> Optional[str]:
+    """The format a file extension claims, e.g. ``.jpg`` -> ``jpeg``."""
+    suffix = suffix.lower().lstrip(".")
+    if suffix == "jpg":
+        return "jpeg"
+    return suffix if suffix in MIME_TYPES else None
+
+
+def _read_at(handle: BinaryIO, offset: int, size: int) -> bytes:
+    handle.seek(offset)
+    return handle.read(size)
+
+
+def _probe_png(handle: BinaryIO, head: bytes) -> ImageInfo:
+    if head[12:16] != b"IHDR" or len(head) < 24:
+        return ImageInfo("png")
+    width, height = struct.unpack(">II", head[16:24])
+    # An APNG announces its frame count in acTL, which must precede the image data
+    offset = 8
+    for _ in range(MAX_SEGMENTS):
+        chunk = _read_at(handle, offset, 12)
+        if len(chunk) < 8 or chunk[4:8] in (b"IDAT", b"IEND"):
+            break
+        (length,) = struct.unpack(">I", chunk[:4])
+        if chunk[4:8] == b"acTL" and len(chunk) == 12:
+            (frames,) = struct.unpack(">I", chunk[8:12])
+            return ImageInfo("png", width, height, max(1, frames))
+        offset += 12 + length
+    return ImageInfo("png", width, height)
+
+
+def _probe_jpeg(handle: BinaryIO) -> ImageInfo:
+    offset = 2
+    for _ in range(MAX_SEGMENTS):
+        marker = _read_at(handle, offset, 2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if code in _JPEG_STANDALONE:
+            offset += 2
+            continue
+        segment = handle.read(7)
+        if len(segment) < 2:
+            break
+        if code in _JPEG_SOF and len(segment) == 7:
+            height, width = struct.unpack(">HH", segment[3:7])
+            return ImageInfo("jpeg", width, height)
+        if code in (0xD9, 0xDA):
+            # End of image, or scan data with no frame header before it
+            break
+        (length,) = struct.unpack(">H", segment[:2])
+        offset += 2 + length
+    return ImageInfo("jpeg")
+
+
+def _skip_sub_blocks(handle: BinaryIO) -> None:
+    """Seek past a run of GIF data sub-blocks, each prefixed with its length."""
+    while True:
+        size = handle.read(1)
+        if not size or size[0] == 0:
+            return
+        handle.seek(size[0], 1)
+
+
+def _probe_gif(handle: BinaryIO, head: bytes) -> ImageInfo:
+    if len(head) < 13:
+        return ImageInfo("gif")
+    width, height, packed = struct.unpack("<HHB", head[6:11])
+    offset = 13
+    if packed & 0x80:
+        offset += 3 << ((packed & 0x07) + 1)
+
+    # Walk the blocks until a second image appears; counting every frame would read the whole file
+    handle.seek(offset)
+    images = 0
+    for _ in range(MAX_SEGMENTS):
+        introducer = handle.read(1)
+        if introducer == b",":
+            images += 1
+            if images > 1:
+                return ImageInfo("gif", width, height, frames=None)
+            descriptor = handle.read(10)
+            if len(descriptor) < 10:
+                break
+            if descriptor[8] & 0x80:
+                handle.seek(3 << ((descriptor[8] & 0x07) + 1), 1)
+            # The byte after the descriptor is the LZW code size
+            _skip_sub_blocks(handle)
+        elif introducer == b"!":
+            handle.read(1)
+            _skip_sub_blocks(handle)
+        else:
+            # Trailer, or a damaged file
+            break
+    return ImageInfo("gif", width, height)
+
+
+def _probe_webp(handle: BinaryIO, head: bytes) -> ImageInfo:
+    chunk, data = head[12:16], head[20:30]
+    if chunk == b"VP8 " and len(data) >= 10 and data[3:6] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L" and len(data) >= 5 and data[0] == 0x2F:
+        (bits,) = struct.unpack("<I", data[1:5])
+        return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk != b"VP8X" or len(data) < 10:
+        return ImageInfo("webp")
+
+    width = int.from_bytes(data[4:7], "little") + 1
+    height = int.from_bytes(data[7:10], "little") + 1
+    if not data[0] & 0x02:
+        return ImageInfo("webp", width, height)
+    # Animated: one ANMF chunk per frame, each skipped by its header
+    frames = 0
+    offset = 12
+    for _ in range(MAX_SEGMENTS):
+        header = _read_at(handle, offset, 8)
+        if len(header) < 8:
+            break
+        (length,) = struct.unpack("<I", header[4:8])
+        frames += header[:4] == b"ANMF"
+        offset += 8 + length + (length & 1)
+    else:
+        return ImageInfo("webp", width, height, frames=None)
+    return ImageInfo("webp", width, height, max(1, frames))
+
+
+def _boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, payload end) of the ISO-BMFF boxes in ``data[start:end]``."""
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[offset : offset + 8])
+        header = 8
+        if size == 1 and offset + 16 <= end:
+            (size,) = struct.unpack(">Q", data[offset + 8 : offset + 16])
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, min(end, offset + size)
+        offset += size
+
+
+def _child(data: bytes, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    """Payload bounds of the first box of type ``kind`` in ``data[start:end]``."""
+    for found, payload_start, payload_end in _boxes(data, start, end):
+        if found == kind:
+            return payload_start, payload_end
+    return None
+
+
+def _probe_avif(head: bytes) -> Optional[ImageInfo]:
+    boxes = {kind: (start, end) for kind, start, end in _boxes(head, 0, len(head))}
+    if b"ftyp" not in boxes:
+        return None
+    start, end = boxes[b"ftyp"]
+    brands = {head[i : i + 4] for i in range(start, end - 3, 4) if i != start + 4}
+    if not brands & {b"avif", b"avis"}:
+        return None
+    frames = None if head[start : start + 4] == b"avis" else 1
+
+    # meta (a full box: 4 bytes of version and flags) > iprp > ipco > ispe (also a full box)
+    meta = boxes.get(b"meta")
+    iprp = meta and _child(head, meta[0] + 4, meta[1], b"iprp")
+    ipco = iprp and _child(head, iprp[0], iprp[1], b"ipco")
+    ispe = ipco and _child(head, ipco[0], ipco[1], b"ispe")
+    if ispe and ispe[1] - ispe[0] >= 12:
+        width, height = struct.unpack(">II", head[ispe[0] + 4 : ispe[0] + 12])
+        return ImageInfo("avif", width, height, frames)
+    return ImageInfo("avif", frames=frames)
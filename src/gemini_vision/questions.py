@@ -0,0 +1,71 @@
+# SPDX-License-Identifier: MIT
+"""Asking several questions about one image in a single request.
+
+The questions are numbered in one prompt that asks for a JSON object of
+answers, so the image is uploaded once instead of once per question.
+parse_answers() recovers the answers; when it cannot, the caller asks the
+questions one by one instead.
+"""
+
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Most questions per ask_many call
+MAX_QUESTIONS = 10
+
+ASK_MANY_PROMPT = (
+    "Answer each of the following {count} questions about the image. Answer every "
+    "question fully and independently, as if it had been asked on its own; do not "
+    "refer to the other questions or answers.\n\n"
+    "{questions}\n\n"
+    'Reply with only a JSON object of the form {{"answers": ["...", "..."]}} holding '
+    "exactly {count} strings, one per question, in the order asked. Markdown may be "
+    "used inside the strings."
+)
+
+
+def ask_many_prompt(questions: Sequence[str]) -> str:
+    """One prompt asking all ``questions``, with the answers requested as JSON."""
+    numbered = "\n".join(
+        f"Question {number}: {question}" for number, question in enumerate(questions, 1)
+    )
+    return ASK_MANY_PROMPT.format(count=len(questions), questions=numbered)
+
+
+def _answer_text(answer: Any) -> Optional[str]:
+    if isinstance(answer, str):
+        return answer
+    # Some replies wrap each answer as {"question": ..., "answer": ...}
+    text = answer.get("answer") if isinstance(answer, dict) else None
+    return text if isinstance(text, str) else None
+
+
+def parse_answers(text: str, count: int) -> Optional[Tuple[List[str], str]]:
+    """The ``count`` answers in a reply to ask_many_prompt(), and any text after them.
+
+    Accepts the JSON object on its own, inside a Markdown code fence or
+    followed by notes (such as the server's cache labels, returned as the
+    second item). Returns None if there is no such object or it does not
+    hold exactly ``count`` answers.
+    """
+    start = min(
+        (index for index in (text.find("{"), text.find("[")) if index >= 0), default=-1
+    )
+    if start < 0:
+        return None
+    try:
+        parsed, end = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict):
+        parsed = parsed.get("answers")
+    if not isinstance(parsed, list) or len(parsed) != count:
+        return None
+    answers = [_answer_text(answer) for answer in parsed]
+    if any(answer is None for answer in answers):
+        return None
+
+    rest = text[end:].strip()
+    if rest.startswith("```"):
+        rest = rest[3:].strip()
+    return [answer.strip() for answer in answers], rest  # type: ignore[union-attr]
@@ -0,0 +1,185 @@
+# SPDX-License-Identifier: MIT
+"""Client-side token-bucket rate limiting with an AIMD concurrency window."""
+
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .config import env_float, env_int
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+
+@dataclass
+class RateLimitConfig:
+    """Limiter settings. A ``rate`` of 0 disables the token bucket."""
+
+    rate: float = 0.0
+    burst: int = 10
+    initial_window: float = 8.0
+    min_window: float = 1.0
+    max_window: float = 64.0
+    decrease_factor: float = 0.5
+    latency_factor: float = 3.0
+
+    @classmethod
+    def from_env(cls) -> "RateLimitConfig":
+        """Build a config from ``GEMINI_VISION_RATE_*`` / ``GEMINI_VISION_WINDOW_*`` variables."""
+        return cls(
+            rate=env_float("GEMINI_VISION_RATE_LIMIT", cls.rate),
+            burst=max(1, env_int("GEMINI_VISION_RATE_BURST", cls.burst)),
+            initial_window=env_float("GEMINI_VISION_WINDOW_INITIAL", cls.initial_window),
+            min_window=max(1.0, env_float("GEMINI_VISION_WINDOW_MIN", cls.min_window)),
+            max_window=env_float("GEMINI_VISION_WINDOW_MAX", cls.max_window),
+        )
+
+
+class Permit:
+    """One admitted request; report its outcome to adjust the window."""
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._reported = False
+
+    def success(self) -> None:
+        """The request succeeded; grow the window unless latency spiked."""
+        if not self._reported:
+            self._reported = True
+            self._limiter._on_success(time.monotonic() - self._started)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """The upstream rate limited the request; shrink the window and pause."""
+        if not self._reported:
+            self._reported = True
+            self._limiter._on_throttled(retry_after)
+
+
+class AdaptiveLimiter:
+    """Admits upstream requests through a token bucket and an AIMD concurrency window.
+
+    Requests over the limits wait in FIFO order rather than failing. The
+    window grows by roughly one slot per window of successful requests
+    (additive increase) and is multiplied by ``decrease_factor`` on a 429
+    or when a request takes ``latency_factor`` times longer than the
+    moving average (multiplicative decrease).
+    """
+
+    def __init__(self, config: Optional[RateLimitConfig] = None):
+        self.config = config or RateLimitConfig()
+        self.window = min(
+            max(self.config.initial_window, self.config.min_window), self.config.max_window
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self._tokens = float(self.config.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._samples = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+        self._counters: Dict[str, float] = {
+            "admitted": 0,
+            "throttled": 0,
+            "latency_decreases": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Permit]:
+        """Wait for admission, yielding a Permit for the request's outcome."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._bucket_lock = asyncio.Lock()
+        assert self._bucket_lock is not None
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._bucket_lock:
+                await self._take_token()
+                async with self._condition:
+                    await self._condition.wait_for(
+                        lambda: self.in_flight < math.floor(self.window)
+                    )
+                    self.in_flight += 1
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self._counters["admitted"] += 1
+        self._counters["total_wait"] += waited
+        self._counters["max_wait"] = max(self._counters["max_wait"], waited)
+        try:
+            yield Permit(self)
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current window, queue depth and wait-time counters."""
+        admitted = self._counters["admitted"]
+        return {
+            "window": round(self.window, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": int(admitted),
+            "throttled": int(self._counters["throttled"]),
+            "latency_decreases": int(self._counters["latency_decreases"]),
+            "avg_wait_ms": round(1000 * self._counters["total_wait"] / admitted, 2)
+            if admitted
+            else 0.0,
+            "max_wait_ms": round(1000 * self._counters["max_wait"], 2),
+        }
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self.config.rate <= 0:
+                return
+            self._tokens = min(
+                float(self.config.burst),
+                self._tokens + (now - self._refilled_at) * self.config.rate,
+            )
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.config.rate)
+
+    def _on_success(self, latency: float) -> None:
+        average = self._latency_ewma
+        self._samples += 1
+        self._latency_ewma = latency if average is None else 0.8 * average + 0.2 * latency
+        spiked = (
+            average is not None
+            and self._samples > 5
+            and latency > self.config.latency_factor * average
+        )
+        if spiked:
+            self._decrease()
+            self._counters["latency_decreases"] += 1
+            logger.info(f"Latency spike ({latency:.2f}s); window now {self.window:.1f}")
+            return
+        # Waiters re-check the window when this request releases its slot
+        self.window = min(self.config.max_window, self.window + 1.0 / self.window)
+
+    def _on_throttled(self, retry_after: Optional[float]) -> None:
+        self._counters["throttled"] += 1
+        self._decrease()
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"Upstream rate limited; window now {self.window:.1f}")
+
+    def _decrease(self) -> None:
+        self.window = max(self.config.min_window, self.window * self.config.decrease_factor)
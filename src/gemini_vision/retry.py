@@ -0,0 +1,286 @@
+# SPDX-License-Identifier: MIT
+"""Retry policy with backoff and Retry-After support, plus a circuit breaker."""
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .config import env_float, env_int
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+T = TypeVar("T")
+
+# Statuses worth retrying besides 5xx: timeout, conflict, too early, rate limited
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+
+
+class UpstreamError(Exception):
+    """An upstream call failed.
+
+    ``retryable`` says whether trying again may succeed; ``retry_after`` is
+    the delay in seconds the upstream asked for, if any.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamError):
+    """The circuit breaker is open; the upstream is not being called."""
+
+
+def is_retryable_status(status: int) -> bool:
+    """Whether an HTTP status is a transient failure."""
+    return status >= 500 or status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def classify(error: BaseException) -> bool:
+    """Whether ``error`` is transient and the call may be retried."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, UpstreamError):
+        return error.retryable
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    # Not imported at module level, to keep startup fast; by the time an
+    # upstream call has failed, the session has imported it already
+    import aiohttp
+
+    if isinstance(
+        error,
+        (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError),
+    ):
+        return True
+    return False
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and a total deadline."""
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    deadline: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from ``GEMINI_VISION_RETRY_*`` environment variables."""
+        return cls(
+            max_attempts=max(1, env_int("GEMINI_VISION_RETRY_ATTEMPTS", cls.max_attempts)),
+            base_delay=env_float("GEMINI_VISION_RETRY_BASE_DELAY", cls.base_delay),
+            max_delay=env_float("GEMINI_VISION_RETRY_MAX_DELAY", cls.max_delay),
+            deadline=env_float("GEMINI_VISION_RETRY_DEADLINE", cls.deadline),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls raise CircuitOpenError for ``reset_timeout`` seconds. Then one
+    trial call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._counters = {"opened": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """Build a breaker from ``GEMINI_VISION_BREAKER_*`` environment variables."""
+        return cls(
+            failure_threshold=env_int("GEMINI_VISION_BREAKER_THRESHOLD", 5),
+            reset_timeout=env_float("GEMINI_VISION_BREAKER_RESET", 30.0),
+        )
+
+    def allows_calls(self) -> bool:
+        """Whether before_call() would let a call through right now, without changing state."""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() < self._opened_at + self.reset_timeout:
+            return False
+        return not self._trial_in_flight
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if calls should not be made right now."""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self._counters["rejected"] += 1
+                raise CircuitOpenError(
+                    f"Upstream circuit open after repeated failures; "
+                    f"retrying in {remaining:.1f}s",
+                    retry_after=remaining,
+                )
+            self.state = "half_open"
+        if self._trial_in_flight:
+            self._counters["rejected"] += 1
+            raise CircuitOpenError("Upstream circuit half-open; trial call in flight")
+        self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        if self.state != "closed":
+            logger.info("Upstream circuit closed")
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit past the threshold."""
+        self._trial_in_flight = False
+        self._failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Upstream circuit opened after {self._failures} failures")
+                self._counters["opened"] += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Forget an in-flight trial that ended without a verdict (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current state and counters."""
+        stats: Dict[str, Any] = dict(self._counters)
+        stats["state"] = self.state
+        stats["consecutive_failures"] = self._failures
+        return stats
+
+
+class RetryEngine:
+    """Runs upstream calls under a RetryPolicy and a CircuitBreaker.
+
+    Calls naming an ``upstream`` (such as a model) get a breaker of their
+    own, configured like ``breaker``, so one failing upstream does not
+    stop calls to the others; calls without one use ``breaker``.
+    """
+
+    def __init__(
+        self,
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._sleep = sleep
+        self._counters = {"calls": 0, "retries": 0, "gave_up": 0}
+
+    def breaker_for(self, upstream: Optional[str] = None) -> CircuitBreaker:
+        """The circuit breaker guarding calls to ``upstream``."""
+        if upstream is None:
+            return self.breaker
+        breaker = self._breakers.get(upstream)
+        if breaker is None:
+            breaker = self._breakers[upstream] = CircuitBreaker(
+                self.breaker.failure_threshold, self.breaker.reset_timeout
+            )
+        return breaker
+
+    async def run(
+        self, attempt: Callable[[], Awaitable[T]], upstream: Optional[str] = None
+    ) -> T:
+        """Call ``attempt`` until it succeeds, fails fatally or the budget runs out."""
+        breaker = self.breaker_for(upstream)
+        self._counters["calls"] += 1
+        started = time.monotonic()
+        number = 0
+        while True:
+            number += 1
+            breaker.before_call()
+            try:
+                result = await attempt()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                retryable = classify(e)
+                status = getattr(e, "status", None)
+                if retryable and status != 429:
+                    breaker.record_failure()
+                elif status is not None:
+                    # The upstream answered (4xx or rate limited), so it is up
+                    breaker.record_success()
+                else:
+                    breaker.release()
+                if not retryable:
+                    raise
+
+                delay = self.policy.backoff(number)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                elapsed = time.monotonic() - started
+                if number >= self.policy.max_attempts or elapsed + delay > self.policy.deadline:
+                    self._counters["gave_up"] += 1
+                    logger.error(f"Giving up after {number} attempt(s): {e}")
+                    raise
+
+                self._counters["retries"] += 1
+                logger.warning(
+                    f"Attempt {number} failed ({e}); retrying in {delay:.2f}s"
+                )
+                await self._sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry counters and circuit breaker state, per upstream under ``circuits``."""
+        stats: Dict[str, Any] = dict(self._counters)
+        stats["circuit"] = self.breaker.stats()
+        stats["circuits"] = {
+            upstream: breaker.stats() for upstream, breaker in self._breakers.items()
+        }
+        return stats
@@ -0,0 +1,235 @@
+# SPDX-License-Identifier: MIT
+"""Routing one completion across an ordered list of models, with hedged requests.
+
+The first model is asked first. If it has not answered within its hedge
+delay (a high percentile of its recent latencies), the next model is asked
+as well, and so on; the first answer wins and the other requests are
+cancelled. A model that fails hands over to the next one immediately, and
+a model that is currently unavailable (its circuit breaker is open) is
+skipped.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from .config import env_bool, env_float, env_int, env_str
+from .metrics import LatencyHistogram
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+T = TypeVar("T")
+
+# Called by a streaming request before it forwards its first piece of text;
+# returns False if another model already owns the output
+Claim = Callable[[], bool]
+
+# Models that answered the calls made in the enclosing collect_models() block
+_answered: ContextVar[Optional[List[str]]] = ContextVar("gemini_vision_answered", default=None)
+
+
+@contextmanager
+def collect_models() -> Iterator[List[str]]:
+    """List the models that answer completions made in the enclosed block.
+
+    Models are also reported to an enclosing collect_models() block.
+    """
+    parent = _answered.get()
+    models: List[str] = []
+    token = _answered.set(models)
+    try:
+        yield models
+    finally:
+        _answered.reset(token)
+        if parent is not None:
+            parent.extend(models)
+
+
+@dataclass
+class RoutingConfig:
+    """The models to use, in order of preference, and when to hedge."""
+
+    models: Tuple[str, ...] = ()
+    hedge: bool = True
+    quantile: float = 0.95
+    min_delay: float = 1.0
+    max_delay: float = 30.0
+    min_samples: int = 20
+
+    @classmethod
+    def from_env(cls, default_model: str) -> "RoutingConfig":
+        """Build a config from ``GEMINI_VISION_MODELS`` and ``GEMINI_VISION_HEDGE_*``."""
+        models = tuple(
+            name.strip()
+            for name in (env_str("GEMINI_VISION_MODELS", default_model) or "").split(",")
+            if name.strip()
+        )
+        return cls(
+            models=models or (default_model,),
+            hedge=env_bool("GEMINI_VISION_HEDGE", cls.hedge),
+            quantile=min(0.999, max(0.5, env_float("GEMINI_VISION_HEDGE_QUANTILE", cls.quantile))),
+            min_delay=max(0.0, env_float("GEMINI_VISION_HEDGE_MIN_DELAY", cls.min_delay)),
+            max_delay=max(0.0, env_float("GEMINI_VISION_HEDGE_MAX_DELAY", cls.max_delay)),
+            min_samples=max(1, env_int("GEMINI_VISION_HEDGE_MIN_SAMPLES", cls.min_samples)),
+        )
+
+
+class ModelStats:
+    """Latency of one model's successful completions, and how its requests ended."""
+
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram(reservoir=512)
+        self.counters = {
+            "requests": 0,
+            "wins": 0,
+            "errors": 0,
+            "cancelled": 0,
+            "hedged": 0,
+            "skipped": 0,
+        }
+
+    def snapshot(self, hedge_delay: float) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = dict(self.counters)
+        snapshot["latency"] = self.latency.snapshot()
+        snapshot["hedge_delay_s"] = round(hedge_delay, 3)
+        return snapshot
+
+
+class ModelRouter:
+    """Races the configured models for each completion; see the module docstring."""
+
+    def __init__(self, config: RoutingConfig):
+        if not config.models:
+            raise ValueError("At least one model is required")
+        self.config = config
+        self._stats = {model: ModelStats() for model in config.models}
+
+    @property
+    def primary(self) -> str:
+        return self.config.models[0]
+
+    @property
+    def key(self) -> str:
+        """Identifies the routing for cache keys: the primary, or the model list."""
+        return ",".join(self.config.models)
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait on ``model`` before also asking the next one.
+
+        The configured quantile of its recent latencies, clamped to
+        [min_delay, max_delay]; max_delay until enough samples are in.
+        """
+        latency = self._stats[model].latency
+        if latency.count < self.config.min_samples:
+            return self.config.max_delay
+        return min(
+            self.config.max_delay,
+            max(self.config.min_delay, latency.quantile(self.config.quantile)),
+        )
+
+    async def run(
+        self,
+        call: Callable[[str, Claim], Awaitable[T]],
+        available: Optional[Callable[[str], bool]] = None,
+    ) -> T:
+        """Get one answer from ``call(model, claim)``, hedging and failing over down the list.
+
+        Models for which ``available(model)`` is false are skipped, unless
+        none is available; then only the first model is asked, so its error
+        (such as an open circuit) is raised. Raises the first model's error
+        if every model fails.
+        """
+        models = [
+            model for model in self.config.models if available is None or available(model)
+        ]
+        for model in self.config.models:
+            if model not in models:
+                self._stats[model].counters["skipped"] += 1
+        if not models:
+            models = [self.config.models[0]]
+        pending: Dict["asyncio.Task[T]", str] = {}
+        errors: List[BaseException] = []
+        owner: Optional[str] = None
+        launched = 0
+
+        def launch() -> str:
+            nonlocal launched
+            model = models[launched]
+            launched += 1
+            self._stats[model].counters["requests"] += 1
+            pending[asyncio.ensure_future(timed(model))] = model
+            return model
+
+        async def timed(model: str) -> T:
+            started = time.perf_counter()
+            result = await call(model, claim_for(model))
+            self._stats[model].latency.observe(time.perf_counter() - started)
+            return result
+
+        def claim_for(model: str) -> Claim:
+            def claim() -> bool:
+                nonlocal owner
+                if owner is None:
+                    owner = model
+                    for task, other in pending.items():
+                        if other != model:
+                            task.cancel()
+                return owner == model
+
+            return claim
+
+        latest = launch()
+        try:
+            while pending:
+                can_hedge = self.config.hedge and owner is None and launched < len(models)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay(latest) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    logger.info(
+                        f"{latest} has not answered in {self.hedge_delay(latest):.1f}s; "
+                        f"hedging with {models[launched]}"
+                    )
+                    self._stats[latest].counters["hedged"] += 1
+                    latest = launch()
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    if task.cancelled():
+                        self._stats[model].counters["cancelled"] += 1
+                        continue
+                    error = task.exception()
+                    if error is None:
+                        self._stats[model].counters["wins"] += 1
+                        record = _answered.get()
+                        if record is not None:
+                            record.append(model)
+                        return task.result()
+                    self._stats[model].counters["errors"] += 1
+                    errors.append(error)
+                if not pending and owner is None and launched < len(models):
+                    logger.warning(f"{model} failed ({errors[-1]}); falling back to {models[launched]}")
+                    latest = launch()
+            raise errors[0]
+        finally:
+            for task, model in pending.items():
+                task.cancel()
+                self._stats[model].counters["cancelled"] += 1
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model latency, hedge delay and request outcomes."""
+        return {
+            "models": {
+                model: stats.snapshot(self.hedge_delay(model))
+                for model, stats in self._stats.items()
+            },
+            "hedging": self.config.hedge and len(self.config.models) > 1,
+        }
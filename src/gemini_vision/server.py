@@ -8,49 +8,166 @@ through OpenRouter API. This enables Claude Desktop and OpenCode to analyze
 images even when the primary AI model doesn't have native image viewing capabilities.
 """
 
+import argparse
 import asyncio
 import base64
+import contextvars
+import functools
+import hashlib
 import json
 import logging
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 
-import aiohttp
-from mcp.server import Server
+from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
 from mcp.types import (
     CallToolRequest,
     CallToolResult,
+    ContentBlock,
     ListToolsRequest,
+    ListToolsResult,
+    ServerResult,
     TextContent,
     Tool,
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("gemini_vision.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
+from .animation import FrameOptions, keyframe_label, keyframes_prompt
+from .batch import MANIFEST_NAME, RunSummary, analyze_directory
+from .cache import (
+    CacheConfig,
+    FileIdentity,
+    PreparedImageCache,
+    PreparedUpload,
+    ResponseCache,
+    cache_key,
 )
+from .coalesce import SingleFlight
+from .config import env_bool, env_float, env_int, env_str
+from .connection import ConnectionConfig, ConnectionPool
+from .log import SAMPLED, LogConfig, clip, configure_logging, request_context
+from .metrics import Metrics, collect_stages
+from .neardup import NearDuplicateConfig, NearDuplicateIndex, dhash
+from .payload import base64_size, encode_body, image_part
+from .preprocess import OUTPUT_FORMATS, PreprocessOptions
+from .probe import ImageInfo, format_for_suffix, probe_image
+from .questions import MAX_QUESTIONS, ask_many_prompt, parse_answers
+from .ratelimit import AdaptiveLimiter, RateLimitConfig
+from .routing import Claim, ModelRouter, RoutingConfig, collect_models
+from .retry import (
+    CircuitBreaker,
+    RetryEngine,
+    RetryPolicy,
+    UpstreamError,
+    classify,
+    is_retryable_status,
+    parse_retry_after,
+)
+from .workers import CpuPool, CpuPoolConfig, prepare_keyframes, prepare_tiles, prepare_upload
+from .streaming import DeltaCallback, ProgressReporter, StreamError, read_sse_completion
+from .tiling import Tile, TileOptions, grid_overlap, plan_tiles, reduce_prompt, tile_prompt
+
+if TYPE_CHECKING:
+    from .transport import HttpConfig
+
 logger = logging.getLogger("gemini-vision-mcp")
 
 # Supported image formats
 SUPPORTED_FORMATS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif"}
 
+# Files larger than this are rejected before they are read (MAX_IMAGE_SIZE_MB)
+DEFAULT_MAX_IMAGE_SIZE_MB = 25.0
+
+# Images with more pixels are rejected from their header (GEMINI_VISION_MAX_MEGAPIXELS);
+# Pillow refuses to decode anything over ~179 MP anyway
+DEFAULT_MAX_MEGAPIXELS = 178.0
+
+# Tiled analysis still decodes the whole image (about 3 bytes per pixel), so it
+# has its own total cap (GEMINI_VISION_MAX_TILED_MEGAPIXELS)
+DEFAULT_MAX_TILED_MEGAPIXELS = 300.0
+
 # OpenRouter API configuration
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 GEMINI_MODEL = "google/gemini-2.5-pro"
 
+# Sampling defaults
+DEFAULT_PROMPT = "Describe this image in detail"
+DEFAULT_TEMPERATURE = 0.7
+MAX_TOKENS = 4000
+
+# Default number of images analyze_images works on at once
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# compare_images limits; the payload budget covers the combined base64 image data
+# (and a single image sent without preprocessing)
+DEFAULT_COMPARE_PROMPT = "Compare these images and describe the differences between them"
+MAX_COMPARE_IMAGES = 16
+DEFAULT_MAX_PAYLOAD_MB = 20.0
+
+# Seconds between Prometheus dumps when GEMINI_VISION_METRICS_FILE is set
+DEFAULT_METRICS_INTERVAL = 15.0
+
+# Per-call options shared by the analysis tools
+ANALYSIS_OPTIONS_SCHEMA: Dict[str, Any] = {
+    "temperature": {
+        "type": "number",
+        "description": "Sampling temperature. Only temperature 0 responses are cached by default",
+        "default": DEFAULT_TEMPERATURE
+    },
+    "use_cache": {
+        "type": "boolean",
+        "description": "Set to false to bypass the response cache for this call",
+        "default": True
+    },
+    "stream": {
+        "type": "boolean",
+        "description": "Stream the model output, forwarding partial text as progress notifications when the request carries a progress token"
+    },
+    "preprocess": {
+        "type": "boolean",
+        "description": "Downscale and recompress the image before upload. Set to false to send the original file"
+    },
+    "max_edge": {
+        "type": "integer",
+        "description": "Longest edge in pixels after downscaling"
+    },
+    "quality": {
+        "type": "integer",
+        "description": "Re-encode quality (1-100)"
+    },
+    "max_bytes": {
+        "type": "integer",
+        "description": "Upload byte budget; quality and size are reduced until the image fits"
+    },
+    "output_format": {
+        "type": "string",
+        "enum": ["webp", "jpeg"],
+        "description": "Re-encode format"
+    },
+}
+
+T = TypeVar("T")
+
+
+def _hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class GeminiVisionServer:
     """MCP Server for Gemini Vision image analysis."""
     
-    def __init__(self):
+    def __init__(self) -> None:
         self.server = Server("gemini-vision")
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         
@@ -58,12 +175,206 @@ class GeminiVisionServer:
             logger.error("OPENROUTER_API_KEY environment variable not set")
             raise ValueError("OPENROUTER_API_KEY environment variable is required")
         
+        # Shared upstream session, reused across tool calls
+        self.base_url = env_str("OPENROUTER_BASE_URL") or OPENROUTER_BASE_URL
+        self.connection_pool = ConnectionPool(ConnectionConfig.from_env())
+        
+        # Ordered models (GEMINI_VISION_MODELS); slow or failing calls are hedged to the next
+        self.model_router = ModelRouter(RoutingConfig.from_env(GEMINI_MODEL))
+        
+        # Retries with backoff for transient upstream failures, behind a circuit breaker per model
+        self.retry_engine = RetryEngine(RetryPolicy.from_env(), CircuitBreaker.from_env())
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self._warm_up_deferred = False
+        
+        # Token bucket + adaptive concurrency window in front of every upstream attempt
+        self.rate_limiter = AdaptiveLimiter(RateLimitConfig.from_env())
+        
+        # Response cache keyed on image digest + prompt + model + sampling params
+        self.response_cache = ResponseCache(CacheConfig.from_env())
+        
+        # Perceptual hashes of analyzed images, to reuse answers for visually identical files
+        self.near_duplicates = NearDuplicateIndex(
+            NearDuplicateConfig.from_env(),
+            path=self.response_cache.config.path if self.response_cache.config.enabled else None,
+            ttl=self.response_cache.config.ttl,
+        )
+        
+        # Identical in-flight requests share one upstream call
+        self.single_flight = SingleFlight()
+        
+        # How ask_many calls were answered: in one combined request, or one request per question
+        self.ask_many_stats = {"combined": 0, "fallbacks": 0, "questions": 0}
+        
+        # Encoded uploads and digests keyed on file identity (path, inode, size, mtime)
+        self.prepared_cache = PreparedImageCache(
+            max_bytes=env_int("GEMINI_VISION_PREPARED_CACHE_MB", 64) * 1024 * 1024
+        )
+        
+        # Default downscale/recompress settings, overridable per call
+        self.preprocess_options = PreprocessOptions.from_env()
+        
+        # Blocking file I/O and content hashing run on worker threads
+        self.max_image_bytes = int(
+            env_float("MAX_IMAGE_SIZE_MB", DEFAULT_MAX_IMAGE_SIZE_MB) * 1024 * 1024
+        )
+        self.max_image_pixels = int(
+            env_float("GEMINI_VISION_MAX_MEGAPIXELS", DEFAULT_MAX_MEGAPIXELS) * 1_000_000
+        )
+        self.max_tiled_pixels = int(
+            env_float("GEMINI_VISION_MAX_TILED_MEGAPIXELS", DEFAULT_MAX_TILED_MEGAPIXELS) * 1_000_000
+        )
+        io_workers = env_int("GEMINI_VISION_IO_WORKERS", min(32, (os.cpu_count() or 1) + 4))
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=max(1, io_workers), thread_name_prefix="gemini-vision-io"
+        )
+        
+        # Tile grid for analyze_image calls with tiled=true
+        self.tile_options = TileOptions.from_env()
+        
+        # Keyframe sampling for analyze_image calls with keyframes=true
+        self.frame_options = FrameOptions.from_env()
+        
+        # Combined image budget for compare_images requests, and the limit for one image sent as-is
+        self.max_payload_bytes = int(
+            env_float("GEMINI_VISION_MAX_PAYLOAD_MB", DEFAULT_MAX_PAYLOAD_MB) * 1024 * 1024
+        )
+        
+        # Fan-out limit for analyze_images and the tiles of a tiled analysis
+        self.batch_concurrency = max(
+            1, env_int("GEMINI_VISION_BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY)
+        )
+        
+        # Stream upstream responses unless a call opts out
+        self.stream_default = env_bool("GEMINI_VISION_STREAM", False)
+        
+        # Per-stage timings, byte and token counters; optionally dumped for Prometheus
+        self.metrics = Metrics()
+        self.metrics_file = env_str("GEMINI_VISION_METRICS_FILE", "")
+        self.metrics_interval = max(
+            1.0, env_float("GEMINI_VISION_METRICS_INTERVAL", DEFAULT_METRICS_INTERVAL)
+        )
+        self._metrics_task: Optional[asyncio.Task] = None
+        
+        # Decoding, resizing, re-encoding and perceptual hashing run in worker
+        # processes (one per core by default) so they do not contend for the GIL
+        self.cpu_pool = CpuPool(CpuPoolConfig.from_env(), self._run_blocking, self.metrics)
+        
         # Register handlers
-        self.server.list_tools = self.list_tools
-        self.server.call_tool = self.call_tool
+        self.server.request_handlers[ListToolsRequest] = self._handle_list_tools
+        self.server.request_handlers[CallToolRequest] = self._handle_call_tool
         
         logger.info("Gemini Vision MCP Server initialized")
     
+    async def start(self, warm_up: bool = True) -> None:
+        """Start the metrics dump and warm up the upstream connection and worker processes, in the background.
+        
+        With ``warm_up=False`` the warm-up waits for the first tools/list or
+        tool call, so a client spawning the server gets its initialize
+        response without competing with it.
+        """
+        if warm_up:
+            self._begin_warm_up()
+        else:
+            self._warm_up_deferred = True
+        if self.metrics_file and self._metrics_task is None:
+            self._metrics_task = asyncio.create_task(self._write_metrics_periodically())
+    
+    def _begin_warm_up(self) -> None:
+        """Start the warm-up unless it has already run or is running."""
+        self._warm_up_deferred = False
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self._warm_up())
+    
+    def _warm_up_if_deferred(self) -> None:
+        """Start a warm-up that ``start(warm_up=False)`` put off."""
+        if self._warm_up_deferred:
+            self._begin_warm_up()
+    
+    async def _warm_up(self) -> None:
+        """Open the upstream connection and start the preprocessing workers."""
+        await asyncio.gather(
+            self.connection_pool.warm_up(self.base_url), self.cpu_pool.warm_up()
+        )
+    
+    async def close(self) -> None:
+        """Cancel background tasks and close the shared upstream session."""
+        for task in (self._warm_up_task, self._metrics_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._warm_up_task = None
+        self._warm_up_deferred = False
+        self._metrics_task = None
+        if self.metrics_file:
+            await self._write_metrics()
+        await self.connection_pool.close()
+        await self.response_cache.close()
+        await self.near_duplicates.close()
+        self.cpu_pool.close()
+        self._io_executor.shutdown(wait=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Collect metrics and the stats of every component."""
+        return {
+            "metrics": self.metrics.snapshot(),
+            "components": self._component_stats(),
+        }
+    
+    def _component_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Stats reported by the pool, caches, coalescer, retries and rate limiter."""
+        return {
+            "connection_pool": self.connection_pool.stats(),
+            "response_cache": self.response_cache.stats(),
+            "near_duplicates": self.near_duplicates.stats(),
+            "prepared_cache": self.prepared_cache.stats(),
+            "cpu_pool": self.cpu_pool.stats(),
+            "single_flight": self.single_flight.stats(),
+            "retry": self.retry_engine.stats(),
+            "routing": self.model_router.stats(),
+            "ask_many": dict(self.ask_many_stats),
+            "rate_limiter": self.rate_limiter.stats(),
+        }
+    
+    async def _write_metrics(self) -> None:
+        """Write the Prometheus text dump to GEMINI_VISION_METRICS_FILE."""
+        try:
+            await self._run_blocking(
+                self.metrics.write_prometheus, self.metrics_file, self._component_stats()
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write metrics to {self.metrics_file}: {e}")
+    
+    async def _write_metrics_periodically(self) -> None:
+        """Rewrite the metrics dump every GEMINI_VISION_METRICS_INTERVAL seconds."""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            await self._write_metrics()
+    
+    async def _handle_list_tools(self, request: ListToolsRequest) -> ServerResult:
+        """MCP request handler for tools/list."""
+        self._warm_up_if_deferred()
+        return ServerResult(ListToolsResult(tools=await self.list_tools()))
+    
+    async def _handle_call_tool(self, request: CallToolRequest) -> ServerResult:
+        """MCP request handler for tools/call."""
+        return ServerResult(await self.call_tool(request))
+    
+    def _progress_reporter(self, request: CallToolRequest) -> Optional[ProgressReporter]:
+        """Create a progress reporter if the client asked for progress."""
+        meta = getattr(request.params, "meta", None)
+        progress_token = getattr(meta, "progressToken", None)
+        if not isinstance(progress_token, (str, int)):
+            return None
+        try:
+            context = self.server.request_context
+        except LookupError:
+            return None
+        return ProgressReporter(context.session, progress_token, context.request_id)
+    
     async def list_tools(self) -> List[Tool]:
         """List available tools."""
         return [
@@ -80,16 +391,189 @@ class GeminiVisionServer:
                         "prompt": {
                             "type": "string",
                             "description": "Prompt describing what you want to know about the image",
-                            "default": "Describe this image in detail"
-                        }
+                            "default": DEFAULT_PROMPT
+                        },
+                        "tiled": {
+                            "type": "boolean",
+                            "description": "Split a very large image into overlapping tiles, analyze them concurrently and merge the answers. Use for small text or detail that downscaling would lose",
+                            "default": False
+                        },
+                        "tile_size": {
+                            "type": "integer",
+                            "description": "Tile edge in pixels for tiled analysis"
+                        },
+                        "tile_overlap": {
+                            "type": "integer",
+                            "description": "Pixels shared by neighbouring tiles"
+                        },
+                        "max_tiles": {
+                            "type": "integer",
+                            "description": "Most tiles per image; tiles grow beyond tile_size to stay within it"
+                        },
+                        "keyframes": {
+                            "type": "boolean",
+                            "description": "For an animated GIF, WebP or PNG (e.g. a screen recording), send its distinct keyframes with timestamps in one request instead of the whole file, which the model sees as a single frame",
+                            "default": False
+                        },
+                        "max_frames": {
+                            "type": "integer",
+                            "description": "Most keyframes to send; the frames that changed the most are kept"
+                        },
+                        "frame_threshold": {
+                            "type": "number",
+                            "description": "Frames with less than this fraction (0-1) of the picture changed since the previous keyframe are dropped"
+                        },
+                        **ANALYSIS_OPTIONS_SCHEMA
                     },
                     "required": ["image_path"]
                 }
+            ),
+            Tool(
+                name="analyze_images",
+                description="Analyze several images concurrently using Gemini 2.5 Pro model. Each item has its own image path and optional prompt; results are returned in input order and a failing item does not stop the others.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "items": {
+                            "type": "array",
+                            "description": "Images to analyze",
+                            "minItems": 1,
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "image_path": {
+                                        "type": "string",
+                                        "description": "Path to the image file to analyze"
+                                    },
+                                    "prompt": {
+                                        "type": "string",
+                                        "description": "Prompt for this image; defaults to the batch prompt"
+                                    }
+                                },
+                                "required": ["image_path"]
+                            }
+                        },
+                        "prompt": {
+                            "type": "string",
+                            "description": "Prompt used for items that do not specify one",
+                            "default": DEFAULT_PROMPT
+                        },
+                        "max_concurrency": {
+                            "type": "integer",
+                            "description": "Maximum number of images analyzed at the same time",
+                            "minimum": 1
+                        },
+                        **ANALYSIS_OPTIONS_SCHEMA
+                    },
+                    "required": ["items"]
+                }
+            ),
+            Tool(
+                name="compare_images",
+                description="Analyze several images together in one Gemini 2.5 Pro request, e.g. to ask what changed between two screenshots. The images are labelled Image 1, Image 2, ... in order, and are downscaled automatically if together they exceed the payload budget.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "image_paths": {
+                            "type": "array",
+                            "description": "Paths to the image files, in the order they should be shown",
+                            "items": {"type": "string"},
+                            "minItems": 2,
+                            "maxItems": MAX_COMPARE_IMAGES
+                        },
+                        "prompt": {
+                            "type": "string",
+                            "description": "Question about the images; refer to them as Image 1, Image 2, ...",
+                            "default": DEFAULT_COMPARE_PROMPT
+                        },
+                        "max_payload_bytes": {
+                            "type": "integer",
+                            "description": "Budget for the combined base64 image data. Default: GEMINI_VISION_MAX_PAYLOAD_MB",
+                            "minimum": 1
+                        },
+                        **ANALYSIS_OPTIONS_SCHEMA
+                    },
+                    "required": ["image_paths"]
+                }
+            ),
+            Tool(
+                name="ask_many",
+                description="Ask several questions about one image using Gemini 2.5 Pro model. The image is uploaded once and all questions are answered in a single request; answers are returned per question, in order.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "image_path": {
+                            "type": "string",
+                            "description": "Path to the image file to ask about"
+                        },
+                        "questions": {
+                            "type": "array",
+                            "description": "Questions about the image, each answered independently",
+                            "items": {"type": "string"},
+                            "minItems": 1,
+                            "maxItems": MAX_QUESTIONS
+                        },
+                        # The reply is JSON, parsed once complete, so there is nothing to stream
+                        **{
+                            name: schema
+                            for name, schema in ANALYSIS_OPTIONS_SCHEMA.items()
+                            if name != "stream"
+                        }
+                    },
+                    "required": ["image_path", "questions"]
+                }
+            ),
+            Tool(
+                name="analyze_directory",
+                description="Analyze every supported image in a directory or matching a glob (e.g. photos/**/*.jpg) with one prompt. Results are appended to a JSONL manifest as each image finishes; images already in the manifest are skipped, so an interrupted or limited run can be continued by calling again.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "Directory or glob pattern of images to analyze"
+                        },
+                        "prompt": {
+                            "type": "string",
+                            "description": "Prompt used for every image",
+                            "default": DEFAULT_PROMPT
+                        },
+                        "recursive": {
+                            "type": "boolean",
+                            "description": "Include subdirectories when path is a directory",
+                            "default": False
+                        },
+                        "manifest_path": {
+                            "type": "string",
+                            "description": f"JSONL file results are appended to. Default: {MANIFEST_NAME} in the directory"
+                        },
+                        "max_concurrency": {
+                            "type": "integer",
+                            "description": "Maximum number of images analyzed at the same time",
+                            "minimum": 1
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "Analyze at most this many not-yet-done images in this call",
+                            "minimum": 1
+                        },
+                        **ANALYSIS_OPTIONS_SCHEMA
+                    },
+                    "required": ["path"]
+                }
+            ),
+            Tool(
+                name="get_stats",
+                description="Report server performance statistics: per-stage latency percentiles (validate, hash, read, preprocess, encode, queue, upstream time to first byte and total), byte and token counters, per-tool latency and error counts, and cache, connection pool, retry and rate limiter state.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {}
+                }
             )
         ]
     
-    def _validate_image_path(self, image_path: str) -> Path:
-        """Validate image path and format."""
+    def _validate_image_path(self, image_path: str, check_size: bool = True) -> Path:
+        """Validate image path and format, and the file size unless check_size is False."""
         try:
             path = Path(image_path).resolve()
             
@@ -105,25 +589,131 @@ class GeminiVisionServer:
                     f"Supported formats: {', '.join(SUPPORTED_FORMATS)}"
                 )
             
+            size = path.stat().st_size
+            if check_size and size > self.max_image_bytes:
+                raise ValueError(
+                    f"Image file too large: {size / (1024 * 1024):.1f} MB "
+                    f"(max {self.max_image_bytes / (1024 * 1024):.1f} MB)"
+                )
+            
             return path
             
         except Exception as e:
             logger.error(f"Image validation failed: {e}")
             raise
     
-    def _encode_image(self, image_path: Path) -> str:
-        """Encode image to base64."""
+    def _probe_image(self, path: Path, check_size: bool = True) -> ImageInfo:
+        """Detect an image's real format and size from its header, before anything reads it in full.
+        
+        The pixel cap is skipped when check_size is False.
+        """
+        try:
+            info = probe_image(path)
+            if info is None:
+                raise ValueError(f"Not a PNG, JPEG, GIF, WebP or AVIF image: {path.name}")
+            
+            if info.format != format_for_suffix(path.suffix):
+                logger.warning(f"{path.name} is actually {info.format.upper()}; sending it as {info.mime_type}")
+            
+            if check_size and info.pixels is not None and info.pixels > self.max_image_pixels:
+                raise ValueError(
+                    f"Image too large: {info.width}x{info.height} pixels "
+                    f"({info.pixels / 1_000_000:.1f} MP, max {self.max_image_pixels / 1_000_000:.1f} MP)"
+                )
+            
+            return info
+            
+        except Exception as e:
+            logger.error(f"Image validation failed: {e}")
+            raise
+    
+    def _inspect_image(
+        self, image_path: str, tiles: Optional[TileOptions] = None
+    ) -> Tuple[Path, FileIdentity, ImageInfo]:
+        """Validate an image path, identify the current version of the file and probe its header.
+        
+        With tiles, the image is checked against the per-tile budget instead
+        of the whole-image size caps, since it is only ever sent in pieces.
+        """
+        if tiles is None:
+            path = self._validate_image_path(image_path)
+            return path, FileIdentity.from_path(path), self._probe_image(path)
+        
+        path = self._validate_image_path(image_path, check_size=False)
+        identity = FileIdentity.from_path(path)
+        info = self._probe_image(path, check_size=False)
+        self._check_tile_budget(path, identity.size, info, tiles)
+        return path, identity, info
+    
+    def _check_tile_budget(self, path: Path, size: int, info: ImageInfo, tiles: TileOptions) -> None:
+        """Reject an image whose tiles would exceed the per-image size caps.
+        
+        The whole image may use up to max_tiled_pixels, each tile up to
+        max_image_pixels, and the file up to max_image_bytes per tile.
+        Without dimensions in the header the grid is unknown, so the
+        whole-image byte cap applies.
+        """
+        try:
+            if info.width is None or info.height is None:
+                if size > self.max_image_bytes:
+                    raise ValueError(
+                        f"Image file too large: {size / (1024 * 1024):.1f} MB "
+                        f"(max {self.max_image_bytes / (1024 * 1024):.1f} MB without readable dimensions)"
+                    )
+                return
+            
+            if info.pixels is not None and info.pixels > self.max_tiled_pixels:
+                raise ValueError(
+                    f"Image too large to tile: {info.width}x{info.height} pixels "
+                    f"({info.pixels / 1_000_000:.1f} MP, max {self.max_tiled_pixels / 1_000_000:.1f} MP)"
+                )
+            
+            grid = plan_tiles(info.width, info.height, tiles)
+            if size > self.max_image_bytes * len(grid):
+                raise ValueError(
+                    f"Image file too large: {size / (1024 * 1024):.1f} MB "
+                    f"(max {self.max_image_bytes / (1024 * 1024):.1f} MB per tile, {len(grid)} tiles)"
+                )
+            
+            left, top, right, bottom = grid[0].box
+            tile_pixels = (right - left) * (bottom - top)
+            if tile_pixels > self.max_image_pixels:
+                raise ValueError(
+                    f"Image too large: {info.width}x{info.height} pixels needs "
+                    f"{tile_pixels / 1_000_000:.1f} MP tiles to fit in {tiles.max_tiles} tiles "
+                    f"(max {self.max_image_pixels / 1_000_000:.1f} MP); raise max_tiles"
+                )
+        
+        except Exception as e:
+            logger.error(f"Image validation failed: {e}")
+            raise
+    
+    def _read_image(self, image_path: Path) -> bytes:
+        """Read raw image bytes."""
         try:
             with open(image_path, "rb") as image_file:
-                encoded = base64.b64encode(image_file.read()).decode('utf-8')
-                logger.info(f"Successfully encoded image: {image_path}")
-                return encoded
+                return image_file.read()
         except Exception as e:
-            logger.error(f"Failed to encode image {image_path}: {e}")
+            logger.error(f"Failed to read image {image_path}: {e}")
             raise
     
+    async def _run_blocking(self, func: Callable[..., T], *args: Any) -> T:
+        """Run blocking work on the I/O thread pool instead of the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the request ID and stage timings over to the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._io_executor, functools.partial(context.run, func, *args)
+        )
+    
+    def _encode_image(self, image_path: Path) -> str:
+        """Encode image to base64."""
+        encoded = base64.b64encode(self._read_image(image_path)).decode('utf-8')
+        logger.info(f"Successfully encoded image: {image_path}", extra=SAMPLED)
+        return encoded
+    
     def _get_mime_type(self, image_path: Path) -> str:
-        """Get MIME type for image."""
+        """Get the MIME type an image's extension claims (uploads use the type probed from its header)."""
         extension = image_path.suffix.lower()
         mime_types = {
             ".png": "image/png",
@@ -135,8 +725,80 @@ class GeminiVisionServer:
         }
         return mime_types.get(extension, "image/jpeg")
     
-    async def _call_gemini_api(self, prompt: str, image_base64: str, mime_type: str) -> str:
-        """Call Gemini API through OpenRouter."""
+    async def _prepare_upload(
+        self,
+        image_path: Path,
+        mime_type: str,
+        options: PreprocessOptions,
+    ) -> Tuple[bytearray, str]:
+        """Read, preprocess and base64-encode an image for upload.
+        
+        Preprocessing decodes pixels, so it runs in the CPU pool; images sent
+        unchanged are only read and encoded, on an I/O thread.
+        """
+        if options.enabled:
+            upload = await self.cpu_pool.run(prepare_upload, str(image_path), mime_type, options)
+        else:
+            upload = await self.cpu_pool.run_in_thread(
+                prepare_upload, str(image_path), mime_type, options
+            )
+        self.metrics.add_bytes("image_read", upload.original_size)
+        self.metrics.add_bytes("image_prepared", upload.prepared_size)
+        
+        if upload.error is not None:
+            logger.warning(f"Preprocessing failed for {image_path}, sending original: {upload.error}")
+        elif upload.dimensions is None:
+            logger.info(
+                f"Sending original image: {image_path} ({upload.original_size} bytes)", extra=SAMPLED
+            )
+        else:
+            logger.info(
+                f"Preprocessed image {image_path}: {upload.original_size} -> "
+                f"{upload.prepared_size} bytes ({upload.dimensions[0]}x{upload.dimensions[1]} "
+                f"{upload.mime_type})",
+                extra=SAMPLED,
+            )
+        return upload.data, upload.mime_type
+    
+    async def _call_gemini_api(
+        self,
+        prompt: str,
+        image_base64: Union[str, bytes, bytearray],
+        mime_type: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
+        """Call Gemini API through OpenRouter.
+        
+        With ``stream`` the completion is read incrementally from the SSE
+        response and each piece of text is passed to ``on_delta``.
+        """
+        content = [
+            {
+                "type": "text",
+                "text": prompt
+            },
+            image_part(mime_type)
+        ]
+        return await self._request_completion(
+            content, [image_base64], temperature, stream, on_delta
+        )
+    
+    async def _request_completion(
+        self,
+        content: List[Dict[str, Any]],
+        images: Sequence[Union[str, bytes, bytearray]],
+        temperature: float = DEFAULT_TEMPERATURE,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
+        """Send one user message to Gemini, retrying transient failures.
+        
+        ``content`` is the message content array; it refers to the base64
+        data in ``images`` through image_part(mime_type, index). The request
+        is routed by model_router, which may also ask fallback models.
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -144,87 +806,1030 @@ class GeminiVisionServer:
             "X-Title": "Gemini Vision MCP Server"
         }
         
-        payload = {
-            "model": GEMINI_MODEL,
-            "messages": [
+        async def complete(model: str, claim: Claim) -> str:
+            payload = {
+                "model": model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": content
+                    }
+                ],
+                "max_tokens": MAX_TOKENS,
+                "temperature": temperature
+            }
+            if stream:
+                payload["stream"] = True
+            body = encode_body(payload, images)
+            
+            # Streamed text already forwarded to the client cannot be taken back,
+            # so a failed stream is only retried if nothing was emitted yet, and
+            # the first model to emit owns the output
+            emitted = False
+            
+            async def forward(delta: str) -> None:
+                nonlocal emitted
+                if not claim():
+                    return
+                emitted = True
+                if on_delta is not None:
+                    await on_delta(delta)
+            
+            async def attempt() -> str:
+                # Queue behind the client-side rate limiter instead of failing
+                queued = time.perf_counter()
+                async with self.rate_limiter.slot() as permit:
+                    self.metrics.observe("queue", time.perf_counter() - queued)
+                    try:
+                        content = await self._post_completion(headers, body, stream, forward)
+                    except UpstreamError as e:
+                        if e.status == 429:
+                            permit.throttled(e.retry_after)
+                        if emitted:
+                            e.retryable = False
+                        raise
+                    permit.success()
+                    return content
+            
+            return await self.retry_engine.run(attempt, upstream=model)
+        
+        def available(model: str) -> bool:
+            return self.retry_engine.breaker_for(model).allows_calls()
+        
+        try:
+            # Ask the models in order, hedging when one is slower than usual and
+            # skipping those whose circuit breaker is open
+            return await self.model_router.run(complete, available)
+        except asyncio.CancelledError:
+            logger.info("Gemini API call cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}")
+            raise
+    
+    async def _post_completion(
+        self,
+        headers: Dict[str, str],
+        body: bytes,
+        stream: bool,
+        on_delta: Optional[DeltaCallback],
+    ) -> str:
+        """Make one chat completions request, raising UpstreamError on failure."""
+        # Imported on first use so a new server answers initialize sooner
+        import aiohttp
+        
+        started = time.perf_counter()
+        try:
+            session = await self.connection_pool.get_session()
+            self.metrics.add_bytes("upload", len(body))
+            async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                data=body,
+                timeout=self.connection_pool.timeout
+            ) as response:
+                self.metrics.observe("upstream_ttfb", time.perf_counter() - started)
+                
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"API request failed: {response.status} - {error_text}")
+                    raise UpstreamError(
+                        f"API request failed: {response.status} - {error_text}",
+                        status=response.status,
+                        retryable=is_retryable_status(response.status),
+                        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    )
+                
+                if stream:
+                    streamed = await read_sse_completion(
+                        response.content, on_delta, self.metrics.record_usage
+                    )
+                    logger.info("Successfully streamed response from Gemini API", extra=SAMPLED)
+                    return streamed
+                
+                result = await response.json()
+                
+                if "choices" not in result or not result["choices"]:
+                    raise UpstreamError("No response from Gemini API", status=response.status)
+                
+                content: str = result["choices"][0]["message"]["content"]
+                self.metrics.record_usage(result.get("usage"))
+                logger.info("Successfully received response from Gemini API", extra=SAMPLED)
+                return content
+        
+        except StreamError as e:
+            logger.error(f"Stream from Gemini API failed: {e}")
+            raise UpstreamError(str(e), retryable=True)
+        except asyncio.TimeoutError:
+            logger.error("Gemini API request timed out")
+            raise UpstreamError("Upstream request timed out", retryable=True)
+        except aiohttp.ClientError as e:
+            logger.error(f"Network error calling Gemini API: {e}")
+            raise UpstreamError(f"Network error: {e}", retryable=classify(e))
+        finally:
+            self.metrics.observe("upstream_total", time.perf_counter() - started)
+    
+    async def _image_digest(self, path: Path, identity: FileIdentity) -> str:
+        """Content digest of an image, hashed off the event loop once per file version."""
+        digest = self.prepared_cache.digest(identity)
+        if digest is None:
+            with self.metrics.time("hash"):
+                digest = await self._run_blocking(_hash_file, path)
+            self.prepared_cache.set_digest(identity, digest)
+        return digest
+    
+    async def _cached_analysis(
+        self, key: str, near_duplicate: Optional[int] = None
+    ) -> Optional[str]:
+        """Look up a cached response, labelled as served from cache.
+        
+        ``near_duplicate`` is the perceptual hash distance when the response
+        belongs to a different but visually identical image.
+        """
+        cached = await self.response_cache.get(key)
+        if cached is None:
+            return None
+        note = "\n\n[Served from cache"
+        if near_duplicate is not None:
+            note += (
+                " as a near-duplicate of a previously analyzed image "
+                f"(perceptual hash distance {near_duplicate})"
+            )
+        if not cached.deterministic:
+            note += (
+                f"; sampled at temperature {cached.temperature}, "
+                "a fresh call may differ"
+            )
+        return cached.text + note + "]"
+    
+    def _label_answer(self, analysis: str, answered: List[str]) -> Tuple[str, str]:
+        """The answer, noting the model if a fallback gave it, and the model that answered."""
+        model = answered[-1] if answered else self.model_router.primary
+        if model != self.model_router.primary:
+            analysis += f"\n\n[Answered by fallback model {model}]"
+        return analysis, model
+    
+    async def _perceptual_hash(self, path: Path) -> Optional[int]:
+        """dHash of an image, or None if it cannot be decoded."""
+        try:
+            with self.metrics.time("phash"):
+                return await self.cpu_pool.run(dhash, str(path))
+        except Exception as e:
+            logger.warning(f"Perceptual hash failed for {path}: {e}")
+            return None
+    
+    async def _near_duplicate_analysis(self, hash_value: int, context: str) -> Optional[str]:
+        """Cached response for the nearest visually identical image analyzed with the same request."""
+        for distance, key in await self.near_duplicates.find(hash_value, context):
+            cached = await self._cached_analysis(key, near_duplicate=distance)
+            if cached is not None:
+                self.near_duplicates.record_hit(True)
+                return cached
+            # The response expired or was evicted
+            await self.near_duplicates.discard(context, key)
+        self.near_duplicates.record_hit(False)
+        return None
+    
+    async def _get_prepared(
+        self, path: Path, identity: FileIdentity, info: ImageInfo, options: PreprocessOptions
+    ) -> PreparedUpload:
+        """Encoded upload for an image, reused if this file version was prepared before.
+        
+        Otherwise the image is read, downscaled/recompressed and encoded in a
+        worker process (see _prepare_upload). Animations are never
+        re-encoded, so they are only read and encoded.
+        """
+        options_key = json.dumps(options.cache_token(), sort_keys=True)
+        prepared = self.prepared_cache.get(identity, options_key)
+        if prepared is not None:
+            logger.info(f"Reusing prepared image: {path}", extra=SAMPLED)
+            return prepared
+        if info.animated:
+            options = replace(options, enabled=False)
+        prepared = PreparedUpload(
+            *await self._prepare_upload(path, info.mime_type, options)
+        )
+        self.prepared_cache.put(identity, options_key, prepared)
+        return prepared
+    
+    def _fit_upload(
+        self, image_path: str, identity: FileIdentity, info: ImageInfo, options: PreprocessOptions
+    ) -> PreprocessOptions:
+        """Turn preprocessing on for an image whose original is over the payload budget.
+        
+        Decided from the file size before the image is read, rather than
+        after upstream rejects the request. Animations are left as they are.
+        """
+        if options.enabled or info.animated or base64_size(identity.size) <= self.max_payload_bytes:
+            return options
+        max_bytes = self.max_payload_bytes * 3 // 4
+        if options.max_bytes:
+            max_bytes = min(max_bytes, options.max_bytes)
+        logger.info(
+            f"{image_path} would be {base64_size(identity.size)} bytes as base64, over the "
+            f"{self.max_payload_bytes} byte payload budget; downscaling it to {max_bytes} bytes"
+        )
+        return replace(options, enabled=True, max_bytes=max_bytes)
+    
+    async def _analyze_image(
+        self,
+        image_path: str,
+        prompt: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        use_cache: bool = True,
+        preprocess: Optional[PreprocessOptions] = None,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+        cache_if: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """Validate, preprocess, encode and analyze one image, consulting the response cache.
+        
+        A fresh answer is only cached if ``cache_if`` (when given) accepts it.
+        """
+        options = preprocess or self.preprocess_options
+        logger.info(f"Analyzing image: {image_path} with prompt: {clip(prompt)}")
+        
+        # Validate image off the event loop
+        with self.metrics.time("validate"):
+            validated_path, identity, info = await self._run_blocking(
+                self._inspect_image, image_path
+            )
+        options = self._fit_upload(image_path, identity, info, options)
+        
+        # Requests are identified by image digest + prompt + model + params
+        key = None
+        cacheable = use_cache and self.response_cache.should_cache(temperature)
+        params = {
+            "temperature": temperature,
+            "max_tokens": MAX_TOKENS,
+            "preprocess": options.cache_token(),
+        }
+        if use_cache:
+            digest = await self._image_digest(validated_path, identity)
+            key = cache_key(digest, prompt, self.model_router.key, params)
+        
+        # Check the response cache
+        if key is not None and cacheable:
+            cached = await self._cached_analysis(key)
+            if cached is not None:
+                logger.info(f"Serving cached analysis for: {image_path}", extra=SAMPLED)
+                return cached
+        
+        # Then look for a visually identical image analyzed with the same request
+        perceptual_hash = None
+        context = cache_key("", prompt, self.model_router.key, params)
+        if key is not None and cacheable and self.near_duplicates.enabled:
+            perceptual_hash = await self._perceptual_hash(validated_path)
+            if perceptual_hash is not None:
+                cached = await self._near_duplicate_analysis(perceptual_hash, context)
+                if cached is not None:
+                    logger.info(f"Serving near-duplicate cached analysis for: {image_path}")
+                    return cached
+        
+        async def fetch(forward: Optional[DeltaCallback]) -> str:
+            prepared = await self._get_prepared(validated_path, identity, info, options)
+            
+            # Call Gemini API
+            with collect_models() as answered:
+                analysis = await self._call_gemini_api(
+                    prompt,
+                    prepared.data,
+                    prepared.mime_type,
+                    temperature=temperature,
+                    stream=stream,
+                    on_delta=forward,
+                )
+            analysis, model = self._label_answer(analysis, answered)
+            
+            if key is not None and cacheable and (cache_if is None or cache_if(analysis)):
+                await self.response_cache.put(key, analysis, model, temperature)
+                if perceptual_hash is not None:
+                    await self.near_duplicates.add(perceptual_hash, context, key)
+            
+            return analysis
+        
+        if key is None:
+            return await fetch(on_delta)
+        
+        # Identical concurrent requests share one upstream call
+        return await self.single_flight.run(key, fetch, on_delta)
+    
+    async def _analyze_tiled(
+        self,
+        image_path: str,
+        prompt: str,
+        tiles: Optional[TileOptions] = None,
+        temperature: float = DEFAULT_TEMPERATURE,
+        use_cache: bool = True,
+        preprocess: Optional[PreprocessOptions] = None,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
+        """Analyze a large image as overlapping tiles, then merge the answers.
+        
+        Each tile is sent with a prompt locating it in the image, up to
+        batch_concurrency at a time. A final request gets the tile notes and a
+        downscaled overview and answers the prompt; only that request is
+        streamed. Images that fit in one tile are analyzed normally.
+        """
+        tiles = tiles or self.tile_options
+        options = preprocess or self.preprocess_options
+        logger.info(f"Analyzing image in tiles: {image_path} with prompt: {clip(prompt)}")
+        
+        # Validate image off the event loop
+        with self.metrics.time("validate"):
+            validated_path, identity, info = await self._run_blocking(
+                self._inspect_image, image_path, tiles
+            )
+        
+        # Requests are identified by image digest + prompt + model + params + tile grid
+        key = None
+        cacheable = use_cache and self.response_cache.should_cache(temperature)
+        if use_cache:
+            digest = await self._image_digest(validated_path, identity)
+            key = cache_key(
+                digest,
+                prompt,
+                self.model_router.key,
                 {
-                    "role": "user",
-                    "content": [
+                    "temperature": temperature,
+                    "max_tokens": MAX_TOKENS,
+                    "preprocess": options.cache_token(),
+                    "tiles": tiles.cache_token(),
+                },
+            )
+        
+        # Check the response cache
+        if key is not None and cacheable:
+            cached = await self._cached_analysis(key)
+            if cached is not None:
+                logger.info(f"Serving cached tiled analysis for: {image_path}")
+                return cached
+        
+        async def fetch(forward: Optional[DeltaCallback]) -> Optional[str]:
+            size, uploads, overview, prepared_size = await self.cpu_pool.run(
+                prepare_tiles, str(validated_path), tiles, options, self.max_tiled_pixels
+            )
+            self.metrics.add_bytes("image_prepared", prepared_size)
+            if not uploads or overview is None:
+                return None
+            logger.info(
+                f"Split {image_path} ({size[0]}x{size[1]}) into {len(uploads)} tiles"
+            )
+            
+            # Map: analyze the tiles concurrently
+            mime_type = OUTPUT_FORMATS[options.output_format]
+            overlap = grid_overlap([tile for tile, _ in uploads])
+            semaphore = asyncio.Semaphore(self.batch_concurrency)
+            
+            async def analyze_tile(number: int, tile: Tile, data: bytearray) -> str:
+                async with semaphore:
+                    return await self._call_gemini_api(
+                        tile_prompt(prompt, tile, number, len(uploads), size, overlap),
+                        data,
+                        mime_type,
+                        temperature=temperature,
+                    )
+            
+            notes = await asyncio.gather(
+                *(
+                    analyze_tile(number, tile, data)
+                    for number, (tile, data) in enumerate(uploads, start=1)
+                )
+            )
+            grid = [tile for tile, _ in uploads]
+            del uploads[:]
+            
+            # Reduce: merge the notes, with the whole image downscaled for layout
+            with collect_models() as answered:
+                analysis = await self._request_completion(
+                    [
                         {
                             "type": "text",
-                            "text": prompt
+                            "text": reduce_prompt(prompt, grid, notes, size)
                         },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 4000,
-            "temperature": 0.7
+                        image_part(mime_type)
+                    ],
+                    [overview],
+                    temperature=temperature,
+                    stream=stream,
+                    on_delta=forward,
+                )
+            analysis, model = self._label_answer(analysis, answered)
+            
+            if key is not None and cacheable:
+                await self.response_cache.put(key, analysis, model, temperature)
+            
+            return analysis
+        
+        analysis = await (
+            fetch(on_delta) if key is None else self.single_flight.run(key, fetch, on_delta)
+        )
+        if analysis is None:
+            logger.info(f"Image fits in one tile, analyzing normally: {image_path}")
+            return await self._analyze_image(
+                image_path,
+                prompt,
+                temperature=temperature,
+                use_cache=use_cache,
+                preprocess=options,
+                stream=stream,
+                on_delta=on_delta,
+            )
+        return analysis
+    
+    async def _analyze_keyframes(
+        self,
+        image_path: str,
+        prompt: str,
+        frames: Optional[FrameOptions] = None,
+        temperature: float = DEFAULT_TEMPERATURE,
+        use_cache: bool = True,
+        preprocess: Optional[PreprocessOptions] = None,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
+        """Analyze an animation from its distinct keyframes, in a single upstream request.
+        
+        Near-identical consecutive frames are dropped and at most
+        ``frames.max_frames`` are kept (see gemini_vision.animation); each
+        is sent with its timestamp and re-encoded within an equal share of
+        the payload budget. Still images are analyzed normally.
+        """
+        frames = frames or self.frame_options
+        options = preprocess or self.preprocess_options
+        logger.info(f"Analyzing keyframes of: {image_path} with prompt: {clip(prompt)}")
+        
+        # Validate image off the event loop
+        with self.metrics.time("validate"):
+            validated_path, identity, info = await self._run_blocking(
+                self._inspect_image, image_path
+            )
+        if not info.animated:
+            logger.info(f"Image is not animated, analyzing normally: {image_path}")
+            return await self._analyze_image(
+                image_path,
+                prompt,
+                temperature=temperature,
+                use_cache=use_cache,
+                preprocess=options,
+                stream=stream,
+                on_delta=on_delta,
+            )
+        
+        # Keyframes are always re-encoded, each within its share of the payload budget
+        max_bytes = max(1, self.max_payload_bytes // frames.max_frames * 3 // 4)
+        if options.max_bytes:
+            max_bytes = min(max_bytes, options.max_bytes)
+        options = replace(options, enabled=True, max_bytes=max_bytes)
+        
+        # Requests are identified by image digest + prompt + model + params + sampling
+        key = None
+        cacheable = use_cache and self.response_cache.should_cache(temperature)
+        if use_cache:
+            digest = await self._image_digest(validated_path, identity)
+            key = cache_key(
+                digest,
+                prompt,
+                self.model_router.key,
+                {
+                    "temperature": temperature,
+                    "max_tokens": MAX_TOKENS,
+                    "preprocess": options.cache_token(),
+                    "frames": frames.cache_token(),
+                },
+            )
+        
+        # Check the response cache
+        if key is not None and cacheable:
+            cached = await self._cached_analysis(key)
+            if cached is not None:
+                logger.info(f"Serving cached keyframe analysis for: {image_path}")
+                return cached
+        
+        async def fetch(forward: Optional[DeltaCallback]) -> str:
+            total, duration, uploads, prepared_size = await self.cpu_pool.run(
+                prepare_keyframes, str(validated_path), frames, options
+            )
+            self.metrics.add_bytes("image_prepared", prepared_size)
+            logger.info(
+                f"Sampled {len(uploads)} of {total} frames ({duration:.1f}s) from {image_path}"
+            )
+            
+            mime_type = OUTPUT_FORMATS[options.output_format]
+            keyframes = [keyframe for keyframe, _ in uploads]
+            content: List[Dict[str, Any]] = [
+                {"type": "text", "text": keyframes_prompt(prompt, keyframes, total, duration)}
+            ]
+            for index, keyframe in enumerate(keyframes):
+                content.append({"type": "text", "text": keyframe_label(keyframe)})
+                content.append(image_part(mime_type, index))
+            
+            with collect_models() as answered:
+                analysis = await self._request_completion(
+                    content,
+                    [data for _, data in uploads],
+                    temperature=temperature,
+                    stream=stream,
+                    on_delta=forward,
+                )
+            analysis, model = self._label_answer(analysis, answered)
+            
+            if key is not None and cacheable:
+                await self.response_cache.put(key, analysis, model, temperature)
+            
+            return analysis
+        
+        if key is None:
+            return await fetch(on_delta)
+        
+        # Identical concurrent requests share one upstream call
+        return await self.single_flight.run(key, fetch, on_delta)
+    
+    async def _fit_payload(
+        self,
+        inspected: Sequence[Tuple[Path, FileIdentity, ImageInfo]],
+        options: PreprocessOptions,
+        budget: int,
+    ) -> List[PreparedUpload]:
+        """Prepare uploads, shrinking the larger ones until their base64 data fits ``budget`` bytes.
+        
+        Images already under an equal share of the budget are kept; the rest
+        of the budget is split between the others, which are re-encoded with a
+        byte limit (even if preprocessing was turned off for the call).
+        """
+        uploads = list(await asyncio.gather(
+            *(self._get_prepared(path, identity, info, options) for path, identity, info in inspected)
+        ))
+        total = sum(len(upload.data) for upload in uploads)
+        if total <= budget:
+            return uploads
+        
+        fair_share = budget // len(uploads)
+        large = [i for i, upload in enumerate(uploads) if len(upload.data) > fair_share]
+        small_total = total - sum(len(uploads[i].data) for i in large)
+        share = (budget - small_total) // len(large)
+        # max_bytes limits the re-encoded image; base64 adds a third on top
+        max_bytes = max(1, share * 3 // 4)
+        if options.max_bytes:
+            max_bytes = min(max_bytes, options.max_bytes)
+        fitted = replace(options, enabled=True, max_bytes=max_bytes)
+        logger.info(
+            f"Images total {total} bytes, over the {budget} byte payload budget; "
+            f"fitting {len(large)} of them to {max_bytes} bytes each"
+        )
+        
+        refitted = await asyncio.gather(
+            *(self._get_prepared(*inspected[i], fitted) for i in large)
+        )
+        for i, upload in zip(large, refitted):
+            uploads[i] = upload
+        total = sum(len(upload.data) for upload in uploads)
+        if total > budget:
+            raise ValueError(
+                f"Images are {total} bytes after downscaling, over the "
+                f"{budget} byte payload budget; use fewer images or a larger max_payload_bytes"
+            )
+        return uploads
+    
+    async def _compare_images(
+        self,
+        image_paths: Sequence[str],
+        prompt: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        use_cache: bool = True,
+        preprocess: Optional[PreprocessOptions] = None,
+        stream: bool = False,
+        on_delta: Optional[DeltaCallback] = None,
+        max_payload_bytes: Optional[int] = None,
+    ) -> str:
+        """Analyze several images together in a single upstream request.
+        
+        Each image is preceded by an "Image N: <file name>" label so the
+        prompt can refer to it. The combined base64 data is kept within
+        ``max_payload_bytes`` (GEMINI_VISION_MAX_PAYLOAD_MB by default).
+        """
+        if not 2 <= len(image_paths) <= MAX_COMPARE_IMAGES:
+            raise ValueError(
+                f"compare_images takes between 2 and {MAX_COMPARE_IMAGES} images"
+            )
+        options = preprocess or self.preprocess_options
+        budget = max_payload_bytes or self.max_payload_bytes
+        logger.info(f"Comparing {len(image_paths)} images with prompt: {clip(prompt)}")
+        
+        # Validate all images off the event loop
+        with self.metrics.time("validate"):
+            inspected = await asyncio.gather(
+                *(self._run_blocking(self._inspect_image, path) for path in image_paths)
+            )
+        
+        # Requests are identified by the ordered image digests + prompt + model + params
+        key = None
+        cacheable = use_cache and self.response_cache.should_cache(temperature)
+        if use_cache:
+            digests = await asyncio.gather(
+                *(self._image_digest(path, identity) for path, identity, _ in inspected)
+            )
+            key = cache_key(
+                "+".join(digests),
+                prompt,
+                self.model_router.key,
+                {
+                    "temperature": temperature,
+                    "max_tokens": MAX_TOKENS,
+                    "preprocess": options.cache_token(),
+                    "max_payload_bytes": budget,
+                },
+            )
+        
+        # Check the response cache
+        if key is not None and cacheable:
+            cached = await self._cached_analysis(key)
+            if cached is not None:
+                logger.info(f"Serving cached comparison for: {', '.join(image_paths)}")
+                return cached
+        
+        async def fetch(forward: Optional[DeltaCallback]) -> str:
+            uploads = await self._fit_payload(inspected, options, budget)
+            
+            content: List[Dict[str, Any]] = []
+            for index, ((path, _, _), upload) in enumerate(zip(inspected, uploads)):
+                content.append({"type": "text", "text": f"Image {index + 1}: {path.name}"})
+                content.append(image_part(upload.mime_type, index))
+            content.append({"type": "text", "text": prompt})
+            
+            with collect_models() as answered:
+                analysis = await self._request_completion(
+                    content,
+                    [upload.data for upload in uploads],
+                    temperature=temperature,
+                    stream=stream,
+                    on_delta=forward,
+                )
+            analysis, model = self._label_answer(analysis, answered)
+            
+            if key is not None and cacheable:
+                await self.response_cache.put(key, analysis, model, temperature)
+            
+            return analysis
+        
+        if key is None:
+            return await fetch(on_delta)
+        
+        # Identical concurrent requests share one upstream call
+        return await self.single_flight.run(key, fetch, on_delta)
+    
+    async def _ask_many(
+        self,
+        image_path: str,
+        questions: Sequence[str],
+        temperature: float = DEFAULT_TEMPERATURE,
+        use_cache: bool = True,
+        preprocess: Optional[PreprocessOptions] = None,
+    ) -> Tuple[List[Union[str, Exception]], Optional[str]]:
+        """Answer several questions about one image, uploading it once.
+        
+        All questions go in one request that asks for a JSON list of answers
+        (see gemini_vision.questions). If the reply cannot be parsed, each
+        question is asked on its own, up to batch_concurrency at a time; the
+        prepared upload is reused, but the image is sent with every request.
+        
+        Returns the answers (or errors) in order, and a note for the combined
+        answer such as its cache label; the note is None after a fallback.
+        """
+        if not 1 <= len(questions) <= MAX_QUESTIONS:
+            raise ValueError(f"ask_many takes between 1 and {MAX_QUESTIONS} questions")
+        logger.info(f"Asking {len(questions)} questions about: {image_path}")
+        self.ask_many_stats["questions"] += len(questions)
+        
+        if len(questions) > 1:
+            # A reply without the answers is not cached, so it is not served again
+            reply = await self._analyze_image(
+                image_path,
+                ask_many_prompt(questions),
+                temperature=temperature,
+                use_cache=use_cache,
+                preprocess=preprocess,
+                cache_if=lambda text: parse_answers(text, len(questions)) is not None,
+            )
+            parsed = parse_answers(reply, len(questions))
+            if parsed is not None:
+                self.ask_many_stats["combined"] += 1
+                answers, note = parsed
+                return list(answers), note
+            logger.warning(
+                f"Could not parse {len(questions)} answers from the combined reply for "
+                f"{image_path}; asking each question separately: {clip(reply)}"
+            )
+            self.ask_many_stats["fallbacks"] += 1
+        
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        async def ask(question: str) -> Union[str, Exception]:
+            async with semaphore:
+                try:
+                    return await self._analyze_image(
+                        image_path,
+                        question,
+                        temperature=temperature,
+                        use_cache=use_cache,
+                        preprocess=preprocess,
+                    )
+                except Exception as e:
+                    logger.error(f"Question failed for {image_path}: {e}")
+                    return e
+        
+        return list(await asyncio.gather(*(ask(question) for question in questions))), None
+    
+    def _analysis_options(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the per-call options shared by the analysis tools."""
+        return {
+            "temperature": float(arguments.get("temperature", DEFAULT_TEMPERATURE)),
+            "use_cache": bool(arguments.get("use_cache", True)),
+            "preprocess": self.preprocess_options.with_overrides(arguments),
+            "stream": bool(arguments.get("stream", self.stream_default)),
         }
+    
+    def _format_analysis(self, image_path: str, prompt: str, analysis: str) -> str:
+        """Format an analysis result for the tool response."""
+        return f"Image Analysis for: {image_path}\n\nPrompt: {prompt}\n\nAnalysis:\n{analysis}"
+    
+    async def _analyze_batch(
+        self,
+        items: List[Dict[str, Any]],
+        default_prompt: str,
+        max_concurrency: int,
+        progress: Optional[ProgressReporter] = None,
+        **options: Any,
+    ) -> List[Union[str, Exception]]:
+        """Analyze items concurrently, returning results or errors in input order.
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{OPENROUTER_BASE_URL}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"API request failed: {response.status} - {error_text}")
-                        raise Exception(f"API request failed: {response.status} - {error_text}")
-                    
-                    result = await response.json()
-                    
-                    if "choices" not in result or not result["choices"]:
-                        raise Exception("No response from Gemini API")
-                    
-                    content = result["choices"][0]["message"]["content"]
-                    logger.info("Successfully received response from Gemini API")
-                    return content
-                    
-        except aiohttp.ClientError as e:
-            logger.error(f"Network error calling Gemini API: {e}")
-            raise Exception(f"Network error: {e}")
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {e}")
-            raise
+        ``progress`` is advanced by one as each item finishes.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        completed = 0
+        
+        async def run(item: Dict[str, Any]) -> Union[str, Exception]:
+            nonlocal completed
+            async with semaphore:
+                try:
+                    image_path = item.get("image_path")
+                    if not image_path:
+                        raise ValueError("image_path parameter is required")
+                    result: Union[str, Exception] = await self._analyze_image(
+                        image_path, item.get("prompt") or default_prompt, **options
+                    )
+                except Exception as e:
+                    logger.error(f"Batch item failed for {item.get('image_path')}: {e}")
+                    result = e
+            completed += 1
+            if progress is not None:
+                await progress.advance(
+                    completed, total=len(items), message=f"Finished {item.get('image_path')}"
+                )
+            return result
+        
+        return await asyncio.gather(*(run(item) for item in items))
     
     async def call_tool(self, request: CallToolRequest) -> CallToolResult:
-        """Handle tool calls."""
+        """Handle tool calls, recording their latency, outcome and per-stage timings."""
+        self._warm_up_if_deferred()
+        with request_context(), collect_stages() as stages, collect_models() as models:
+            started = time.perf_counter()
+            result = await self._dispatch_tool(request)
+            elapsed = time.perf_counter() - started
+            self.metrics.record_call(request.params.name, elapsed, not result.isError)
+            logger.info(
+                f"Tool call {request.params.name} finished in {elapsed * 1000:.0f} ms",
+                extra={
+                    "tool": request.params.name,
+                    "ok": not result.isError,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "stages_ms": {
+                        stage: round(seconds * 1000, 1) for stage, seconds in stages.items()
+                    },
+                    "models": sorted(set(models)),
+                },
+            )
+        return result
+    
+    async def _dispatch_tool(self, request: CallToolRequest) -> CallToolResult:
+        """Run the requested tool."""
         try:
+            arguments = request.params.arguments or {}
+            
             if request.params.name == "analyze_image":
                 # Extract parameters
-                image_path = request.params.arguments.get("image_path")
-                prompt = request.params.arguments.get("prompt", "Describe this image in detail")
+                image_path = arguments.get("image_path")
+                prompt = arguments.get("prompt", DEFAULT_PROMPT)
                 
                 if not image_path:
                     raise ValueError("image_path parameter is required")
                 
-                logger.info(f"Analyzing image: {image_path} with prompt: {prompt}")
+                options = self._analysis_options(arguments)
+                progress = self._progress_reporter(request) if options["stream"] else None
+                if arguments.get("keyframes", False):
+                    analysis = await self._analyze_keyframes(
+                        image_path,
+                        prompt,
+                        self.frame_options.with_overrides(arguments),
+                        on_delta=progress.on_delta if progress else None,
+                        **options,
+                    )
+                elif arguments.get("tiled", False):
+                    analysis = await self._analyze_tiled(
+                        image_path,
+                        prompt,
+                        self.tile_options.with_overrides(arguments),
+                        on_delta=progress.on_delta if progress else None,
+                        **options,
+                    )
+                else:
+                    analysis = await self._analyze_image(
+                        image_path,
+                        prompt,
+                        on_delta=progress.on_delta if progress else None,
+                        **options,
+                    )
+                if progress is not None:
+                    await progress.flush()
+                
+                return CallToolResult(
+                    content=[
+                        TextContent(
+                            type="text",
+                            text=self._format_analysis(image_path, prompt, analysis)
+                        )
+                    ]
+                )
+            
+            elif request.params.name == "analyze_images":
+                items = arguments.get("items")
+                if not items or not isinstance(items, list):
+                    raise ValueError("items parameter must be a non-empty list")
                 
-                # Validate image
-                validated_path = self._validate_image_path(image_path)
+                default_prompt = arguments.get("prompt", DEFAULT_PROMPT)
+                max_concurrency = int(
+                    arguments.get("max_concurrency", self.batch_concurrency)
+                )
+                if max_concurrency < 1:
+                    raise ValueError("max_concurrency must be at least 1")
+                
+                logger.info(
+                    f"Analyzing {len(items)} images with concurrency {max_concurrency}"
+                )
+                results = await self._analyze_batch(
+                    items,
+                    default_prompt,
+                    max_concurrency,
+                    progress=self._progress_reporter(request),
+                    **self._analysis_options(arguments),
+                )
+                
+                failures = sum(1 for result in results if isinstance(result, Exception))
+                content: List[ContentBlock] = [
+                    TextContent(
+                        type="text",
+                        text=f"Batch analysis: {len(results) - failures} succeeded, {failures} failed"
+                    )
+                ]
+                for index, (item, result) in enumerate(zip(items, results), start=1):
+                    image_path = item.get("image_path")
+                    if isinstance(result, Exception):
+                        text = f"[{index}] Error for: {image_path}\n\nError: {result}"
+                    else:
+                        prompt = item.get("prompt") or default_prompt
+                        text = f"[{index}] " + self._format_analysis(image_path, prompt, result)
+                    content.append(TextContent(type="text", text=text))
+                
+                return CallToolResult(content=content, isError=failures == len(results))
+            
+            elif request.params.name == "compare_images":
+                image_paths = arguments.get("image_paths")
+                prompt = arguments.get("prompt", DEFAULT_COMPARE_PROMPT)
+                
+                if not image_paths or not isinstance(image_paths, list):
+                    raise ValueError("image_paths parameter must be a list of image paths")
                 
-                # Encode image
-                image_base64 = self._encode_image(validated_path)
-                mime_type = self._get_mime_type(validated_path)
+                max_payload_bytes = arguments.get("max_payload_bytes")
+                if max_payload_bytes is not None and int(max_payload_bytes) < 1:
+                    raise ValueError("max_payload_bytes must be positive")
                 
-                # Call Gemini API
-                analysis = await self._call_gemini_api(prompt, image_base64, mime_type)
+                options = self._analysis_options(arguments)
+                progress = self._progress_reporter(request) if options["stream"] else None
+                analysis = await self._compare_images(
+                    image_paths,
+                    prompt,
+                    on_delta=progress.on_delta if progress else None,
+                    max_payload_bytes=int(max_payload_bytes) if max_payload_bytes else None,
+                    **options,
+                )
+                if progress is not None:
+                    await progress.flush()
                 
                 return CallToolResult(
                     content=[
                         TextContent(
                             type="text",
-                            text=f"Image Analysis for: {image_path}\n\nPrompt: {prompt}\n\nAnalysis:\n{analysis}"
+                            text=f"Image Comparison for: {', '.join(image_paths)}\n\nPrompt: {prompt}\n\nAnalysis:\n{analysis}"
+                        )
+                    ]
+                )
+            
+            elif request.params.name == "ask_many":
+                image_path = arguments.get("image_path")
+                questions = arguments.get("questions")
+                
+                if not image_path:
+                    raise ValueError("image_path parameter is required")
+                if (
+                    not questions
+                    or not isinstance(questions, list)
+                    or not all(isinstance(question, str) and question.strip() for question in questions)
+                ):
+                    raise ValueError("questions parameter must be a non-empty list of strings")
+                
+                options = self._analysis_options(arguments)
+                del options["stream"]
+                answers, note = await self._ask_many(image_path, questions, **options)
+                
+                failures = sum(1 for answer in answers if isinstance(answer, Exception))
+                summary = f"Answers for: {image_path}\n\n{len(questions) - failures} of {len(questions)} questions answered"
+                if note:
+                    summary += f"\n\n{note}"
+                content = [TextContent(type="text", text=summary)]
+                for index, (question, answer) in enumerate(zip(questions, answers), start=1):
+                    if isinstance(answer, Exception):
+                        text = f"[{index}] Question: {question}\n\nError: {answer}"
+                    else:
+                        text = f"[{index}] Question: {question}\n\nAnswer:\n{answer}"
+                    content.append(TextContent(type="text", text=text))
+                
+                return CallToolResult(content=content, isError=failures == len(answers))
+            
+            elif request.params.name == "analyze_directory":
+                source = arguments.get("path")
+                prompt = arguments.get("prompt", DEFAULT_PROMPT)
+                
+                if not source:
+                    raise ValueError("path parameter is required")
+                
+                max_concurrency = int(
+                    arguments.get("max_concurrency", self.batch_concurrency)
+                )
+                if max_concurrency < 1:
+                    raise ValueError("max_concurrency must be at least 1")
+                limit = arguments.get("limit")
+                
+                options = self._analysis_options(arguments)
+                # Results go to the manifest; progress reports images, not text
+                options["stream"] = False
+                progress = self._progress_reporter(request)
+                
+                async def on_result(record: Dict[str, Any], summary: RunSummary) -> None:
+                    if progress is not None:
+                        await progress.advance(
+                            summary.processed,
+                            total=summary.queued,
+                            message=f"{record['status']}: {record['image_path']}",
+                        )
+                
+                run_summary = await analyze_directory(
+                    self,
+                    source,
+                    prompt,
+                    SUPPORTED_FORMATS,
+                    manifest_path=arguments.get("manifest_path"),
+                    recursive=bool(arguments.get("recursive", False)),
+                    concurrency=max_concurrency,
+                    limit=int(limit) if limit is not None else None,
+                    on_result=on_result,
+                    **options,
+                )
+                
+                stats = run_summary.as_dict()
+                return CallToolResult(
+                    content=[
+                        TextContent(
+                            type="text",
+                            text=(
+                                f"Directory analysis of: {source}\n\n"
+                                f"{stats['found']} images found, {stats['skipped']} already done, "
+                                f"{stats['succeeded']} succeeded, {stats['failed']} failed "
+                                f"in {stats['elapsed_s']}s ({stats['images_per_s']} images/s)\n\n"
+                                f"Manifest: {stats['manifest']}"
+                            )
+                        )
+                    ],
+                    isError=run_summary.failed > 0 and run_summary.succeeded == 0
+                )
+            
+            elif request.params.name == "get_stats":
+                return CallToolResult(
+                    content=[
+                        TextContent(
+                            type="text",
+                            text=json.dumps(self.stats(), indent=2)
                         )
                     ]
                 )
@@ -244,29 +1849,98 @@ class GeminiVisionServer:
                 isError=True
             )
 
-async def main():
-    """Main entry point for the MCP server."""
+
+def transport_name(transport: Optional[str] = None) -> str:
+    """The transport to serve: ``transport`` or GEMINI_VISION_TRANSPORT, lowercased (default: stdio)."""
+    return (transport or env_str("GEMINI_VISION_TRANSPORT", "stdio") or "stdio").strip().lower()
+
+
+async def main(transport: Optional[str] = None, http_config: Optional["HttpConfig"] = None) -> None:
+    """Main entry point for the MCP server.
+    
+    Serves a single client over stdio unless ``transport`` (default:
+    GEMINI_VISION_TRANSPORT) is ``http``, which serves many clients over
+    streamable HTTP from this process.
+    """
+    transport = transport_name(transport)
+    
+    # Logs go to a file (or stderr) from a background thread; stdout is the stdio transport.
+    # Over HTTP nobody captures the process's stderr for us, so log there too unless told not to
+    log_config = LogConfig.from_env()
+    if transport == "http" and env_str("GEMINI_VISION_LOG_STDERR") is None:
+        log_config.stderr = True
+    configure_logging(log_config)
     try:
+        if transport not in ("stdio", "http"):
+            raise ValueError(f"Unknown transport: {transport} (expected stdio or http)")
+        
         # Initialize server
         vision_server = GeminiVisionServer()
         
+        if transport == "http":
+            # Imported here so stdio startup does not pay for the HTTP stack
+            from .transport import serve_http
+            await serve_http(vision_server, http_config)
+            return
+        
+        # A client waits on initialize before anything else; warm up once it lists or calls tools
+        await vision_server.start(warm_up=False)
+        
         # Run server
-        async with stdio_server() as (read_stream, write_stream):
-            await vision_server.server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="gemini-vision",
-                    server_version="1.0.0",
-                    capabilities=vision_server.server.get_capabilities(
-                        notification_options=None,
-                        experimental_capabilities=None,
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await vision_server.server.run(
+                    read_stream,
+                    write_stream,
+                    InitializationOptions(
+                        server_name="gemini-vision",
+                        server_version="1.0.0",
+                        capabilities=vision_server.server.get_capabilities(
+                            notification_options=NotificationOptions(),
+                            experimental_capabilities={},
+                        ),
                     ),
-                ),
-            )
+                )
+        finally:
+            await vision_server.close()
     except Exception as e:
         logger.error(f"Server failed to start: {e}")
         sys.exit(1)
 
+
+def cli(argv: Optional[Sequence[str]] = None) -> None:
+    """Entry point of ``gemini-vision-mcp``."""
+    parser = argparse.ArgumentParser(
+        prog="gemini-vision-mcp",
+        description="Gemini Vision MCP server",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        help="stdio serves one client; http serves many from one process (default: GEMINI_VISION_TRANSPORT or stdio)",
+    )
+    parser.add_argument("--host", help="HTTP bind address (default: GEMINI_VISION_HTTP_HOST or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="HTTP port (default: GEMINI_VISION_HTTP_PORT or 8000)")
+    parser.add_argument("--path", help="HTTP endpoint path (default: GEMINI_VISION_HTTP_PATH or /mcp)")
+    parser.add_argument("--stateless", action="store_true", help="HTTP: no session state between requests")
+    args = parser.parse_args(argv)
+    
+    transport = transport_name(args.transport)
+    http_config = None
+    if transport == "http":
+        from .transport import HttpConfig
+        http_config = HttpConfig.from_env()
+        for name in ("host", "port", "path"):
+            if getattr(args, name) is not None:
+                setattr(http_config, name, getattr(args, name))
+        if args.stateless:
+            http_config.stateless = True
+    
+    try:
+        asyncio.run(main(transport, http_config))
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    cli()
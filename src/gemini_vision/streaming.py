@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: MIT
+"""Incremental parsing of OpenRouter SSE streams and MCP progress reporting."""
+
+import json
+import logging
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+# Called with each new piece of generated text
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
+class StreamError(Exception):
+    """The upstream reported an error or ended the stream early."""
+
+
+async def read_sse_completion(
+    lines: AsyncIterable[bytes],
+    on_delta: Optional[DeltaCallback] = None,
+    on_usage: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> str:
+    """Accumulate the completion text from an OpenRouter ``stream: true`` response.
+
+    ``lines`` yields raw SSE lines (``response.content`` in aiohttp). Comment
+    lines such as ``: OPENROUTER PROCESSING`` are skipped. The ``usage``
+    object OpenRouter sends with the final chunk is passed to ``on_usage``.
+    Raises StreamError if the upstream sends an error chunk or closes before
+    finishing.
+    """
+    parts: List[str] = []
+    finished = False
+
+    async for raw_line in lines:
+        line = raw_line.decode("utf-8").strip()
+        if not line or line.startswith(":") or not line.startswith("data:"):
+            continue
+
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            finished = True
+            break
+
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed stream chunk: {data[:200]}")
+            continue
+
+        if "error" in chunk:
+            error = chunk["error"]
+            message = error.get("message", error) if isinstance(error, dict) else error
+            raise StreamError(f"Upstream stream error: {message}")
+
+        if chunk.get("usage") and on_usage is not None:
+            on_usage(chunk["usage"])
+
+        for choice in chunk.get("choices") or []:
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                if on_delta is not None:
+                    await on_delta(delta)
+            finish_reason = choice.get("finish_reason")
+            if finish_reason == "error":
+                raise StreamError("Upstream stream ended with an error")
+            if finish_reason:
+                finished = True
+
+    if not finished:
+        raise StreamError("Upstream stream ended before the response was complete")
+
+    return "".join(parts)
+
+
+class ProgressReporter:
+    """Forwards streamed text to an MCP client as progress notifications.
+
+    Notifications are throttled to one per ``interval`` seconds; the text
+    received since the last notification is sent as the message and the
+    number of characters received so far as the progress value.
+    """
+
+    def __init__(
+        self,
+        session: Any,
+        progress_token: Union[str, int],
+        request_id: Any = None,
+        interval: float = 0.25,
+    ):
+        self.session = session
+        self.progress_token = progress_token
+        self.request_id = request_id
+        self.interval = interval
+        self.progress = 0.0
+        self._pending: List[str] = []
+        self._last_sent = 0.0
+
+    async def on_delta(self, delta: str) -> None:
+        """Record streamed text, notifying the client if the interval has passed."""
+        self.progress += len(delta)
+        self._pending.append(delta)
+        if time.monotonic() - self._last_sent >= self.interval:
+            await self.flush()
+
+    async def advance(
+        self, progress: float, total: Optional[float] = None, message: Optional[str] = None
+    ) -> None:
+        """Report absolute progress, e.g. completed items of a batch."""
+        self.progress = progress
+        await self._send(total=total, message=message)
+
+    async def flush(self) -> None:
+        """Send any text received since the last notification."""
+        if not self._pending:
+            return
+        message = "".join(self._pending)
+        self._pending.clear()
+        await self._send(message=message)
+
+    async def _send(
+        self, total: Optional[float] = None, message: Optional[str] = None
+    ) -> None:
+        self._last_sent = time.monotonic()
+        try:
+            await self.session.send_progress_notification(
+                self.progress_token,
+                self.progress,
+                total=total,
+                message=message,
+                related_request_id=self.request_id,
+            )
+        except Exception as e:
+            # Progress is best-effort; never fail the tool call over it
+            logger.warning(f"Failed to send progress notification: {e}")
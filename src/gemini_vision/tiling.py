@@ -0,0 +1,284 @@
+# SPDX-License-Identifier: MIT
+"""Splitting very large images into overlapping tiles for map-reduce analysis."""
+
+import math
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .config import env_int
+from .preprocess import PreprocessOptions, _encode, _encode_fitted, _flatten
+
+# Growth factor for the tile size when the grid would exceed max_tiles
+TILE_GROWTH = 1.25
+
+# Pillow's decompression-bomb limit is process-wide; raising it for one
+# image is serialized so concurrent workers always restore the original
+_pixel_limit_lock = threading.Lock()
+
+TILE_PROMPT = (
+    "This is tile {number} of {count} cut from a larger {width}x{height} image "
+    "(row {row}, column {column}; pixels {left}-{right} across, {top}-{bottom} down). "
+    "Neighbouring tiles overlap by {across} pixels across and {down} pixels down, "
+    "so content at the edges may be cut off here and repeated in another tile. "
+    "Report everything in this tile that is relevant to the question below, "
+    "transcribing any text exactly and noting where in the tile it appears. If nothing is relevant, say so briefly.\n\n"
+    "Question: {prompt}"
+)
+
+REDUCE_PROMPT = (
+    "A {width}x{height} image was split into {count} overlapping tiles, "
+    "each analyzed separately. The tile notes below are in reading order. "
+    "A downscaled copy of the whole image is attached for layout; rely on the "
+    "tile notes for fine detail and text. "
+    "Combine them into a single answer to the question. Merge details that appear "
+    "in more than one tile because of the overlap instead of repeating them, and "
+    "keep transcribed text exact.\n\n"
+    "Question: {prompt}\n\n"
+    "{notes}"
+)
+
+
+class Tile(NamedTuple):
+    """One tile of an image grid; ``box`` is (left, top, right, bottom) in pixels."""
+
+    row: int
+    column: int
+    box: Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class TileOptions:
+    """How images are split for tiled analysis."""
+
+    tile_size: int = 1024
+    overlap: int = 128
+    max_tiles: int = 16
+
+    @classmethod
+    def from_env(cls) -> "TileOptions":
+        """Build options from ``GEMINI_VISION_TILE_*`` environment variables."""
+        return cls(
+            tile_size=env_int("GEMINI_VISION_TILE_SIZE", cls.tile_size),
+            overlap=env_int("GEMINI_VISION_TILE_OVERLAP", cls.overlap),
+            max_tiles=env_int("GEMINI_VISION_MAX_TILES", cls.max_tiles),
+        ).validated()
+
+    def with_overrides(self, arguments: Dict[str, Any]) -> "TileOptions":
+        """Return a copy with per-call tool arguments applied."""
+        overrides: Dict[str, Any] = {}
+        for argument, name in (
+            ("tile_size", "tile_size"),
+            ("tile_overlap", "overlap"),
+            ("max_tiles", "max_tiles"),
+        ):
+            if arguments.get(argument) is not None:
+                overrides[name] = int(arguments[argument])
+        if not overrides:
+            return self
+        return replace(self, **overrides).validated()
+
+    def validated(self) -> "TileOptions":
+        """Check option values, raising ValueError on bad input."""
+        if self.tile_size < 64:
+            raise ValueError("tile_size must be at least 64")
+        if not 0 <= self.overlap < self.tile_size // 2:
+            raise ValueError("tile_overlap must be between 0 and half the tile size")
+        if self.max_tiles < 1:
+            raise ValueError("max_tiles must be at least 1")
+        return self
+
+    def cache_token(self) -> Dict[str, Any]:
+        """Options that change the result, for use in cache keys."""
+        return asdict(self)
+
+
+def _steps(length: int, tile: int, overlap: int) -> List[Tuple[int, int]]:
+    """Start/end offsets covering ``length`` with ``tile``-sized, overlapping spans."""
+    if length <= tile:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    # Spread the spans evenly so the last one does not end in a thin sliver
+    stride = (length - tile) / (count - 1)
+    return [(round(i * stride), round(i * stride) + tile) for i in range(count)]
+
+
+def plan_tiles(width: int, height: int, options: TileOptions) -> List[Tile]:
+    """Lay out overlapping tiles over a ``width`` x ``height`` image, in reading order.
+
+    If the grid would have more than ``max_tiles`` tiles, the tile size is
+    increased until it fits.
+    """
+    tile_size = options.tile_size
+    while True:
+        overlap = min(options.overlap, tile_size // 2 - 1)
+        rows = _steps(height, tile_size, overlap)
+        columns = _steps(width, tile_size, overlap)
+        if len(rows) * len(columns) <= options.max_tiles:
+            break
+        tile_size = math.ceil(tile_size * TILE_GROWTH)
+    return [
+        Tile(row, column, (left, top, right, bottom))
+        for row, (top, bottom) in enumerate(rows)
+        for column, (left, right) in enumerate(columns)
+    ]
+
+
+def grid_overlap(grid: Sequence[Tile]) -> Tuple[int, int]:
+    """Pixels shared by neighbouring tiles (across, down); 0 along an axis with one tile.
+
+    This is what the layout actually applied, which is at least the
+    configured overlap: it is capped for small tiles and widened when the
+    tiles are spread evenly over the image.
+    """
+    lefts = sorted({tile.box[0] for tile in grid})
+    tops = sorted({tile.box[1] for tile in grid})
+    width = grid[0].box[2] - grid[0].box[0]
+    height = grid[0].box[3] - grid[0].box[1]
+    across = min((width - (b - a) for a, b in zip(lefts, lefts[1:])), default=0)
+    down = min((height - (b - a) for a, b in zip(tops, tops[1:])), default=0)
+    return across, down
+
+
+@contextmanager
+def _pixel_limit(max_pixels: Optional[int]) -> Iterator[None]:
+    """Raise Pillow's decompression-bomb limit to ``max_pixels`` while in the block.
+
+    Pillow checks it on open and again on every crop. Only blocks that
+    raise the limit hold the lock, but the check itself takes it, so no
+    caller reads a limit another thread is about to restore.
+    """
+    from PIL import Image
+
+    _pixel_limit_lock.acquire()
+    limit = Image.MAX_IMAGE_PIXELS
+    if max_pixels is None or limit is None or max_pixels <= limit:
+        _pixel_limit_lock.release()
+        yield
+        return
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+        _pixel_limit_lock.release()
+
+
+def split_image(
+    source: Union[str, Path],
+    tiles: TileOptions,
+    options: PreprocessOptions,
+    max_pixels: Optional[int] = None,
+) -> Tuple[Tuple[int, int], List[Tuple[Tile, bytes]], Optional[bytes]]:
+    """Cut an image into tiles encoded with ``options``' format and quality.
+
+    Returns the (width, height) after EXIF orientation, one encoded image
+    per tile and a downscaled overview of the whole image fitted to
+    ``options``, or no tiles and no overview if the image fits in a single
+    tile. Tiles larger than ``options.max_edge`` (when the grid had to grow
+    to respect ``max_tiles``) are downscaled to it.
+
+    ``max_pixels`` is a hard cap on the whole image, which is decoded in
+    full: larger images raise DecompressionBombError before decoding, and
+    Pillow's own limit is raised to it at most.
+    """
+    with _pixel_limit(max_pixels):
+        return _split_image(source, tiles, options, max_pixels)
+
+
+def _split_image(
+    source: Union[str, Path],
+    tiles: TileOptions,
+    options: PreprocessOptions,
+    max_pixels: Optional[int],
+) -> Tuple[Tuple[int, int], List[Tuple[Tile, bytes]], Optional[bytes]]:
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as opened:
+        # Pillow only refuses images over twice its limit
+        width, height = opened.size
+        if max_pixels is not None and width * height > max_pixels:
+            raise Image.DecompressionBombError(
+                f"Image size ({width * height} pixels) exceeds limit of "
+                f"{max_pixels} pixels for tiling"
+            )
+        # Checked before decoding; a rotation swaps the grid but not its size
+        if len(plan_tiles(opened.size[0], opened.size[1], tiles)) == 1:
+            return opened.size, [], None
+        image = _flatten(ImageOps.exif_transpose(opened))
+    size = image.size
+    grid = plan_tiles(size[0], size[1], tiles)
+
+    encoded = []
+    for tile in grid:
+        crop = image.crop(tile.box)
+        if options.max_edge and max(crop.size) > options.max_edge:
+            crop.thumbnail(
+                (options.max_edge, options.max_edge), Image.Resampling.LANCZOS
+            )
+        encoded.append((tile, _encode(crop, options.output_format, options.quality)))
+    # Made from the decoded image, which the whole-image path may refuse to open
+    _, overview, _ = _encode_fitted(image, options)
+    return size, encoded, overview
+
+
+def tile_prompt(
+    prompt: str,
+    tile: Tile,
+    number: int,
+    count: int,
+    size: Tuple[int, int],
+    overlap: Tuple[int, int],
+) -> str:
+    """Prompt for one tile, locating it within the whole image.
+
+    ``overlap`` is the (across, down) overlap from grid_overlap().
+    """
+    left, top, right, bottom = tile.box
+    return TILE_PROMPT.format(
+        number=number,
+        count=count,
+        width=size[0],
+        height=size[1],
+        row=tile.row + 1,
+        column=tile.column + 1,
+        left=left,
+        right=right,
+        top=top,
+        bottom=bottom,
+        across=overlap[0],
+        down=overlap[1],
+        prompt=prompt,
+    )
+
+
+def reduce_prompt(
+    prompt: str,
+    tiles: Sequence[Tile],
+    notes: Sequence[str],
+    size: Tuple[int, int],
+) -> str:
+    """Prompt for the final call that merges the per-tile notes."""
+    sections = [
+        f"--- Tile {number} (row {tile.row + 1}, column {tile.column + 1}) ---\n{note}"
+        for number, (tile, note) in enumerate(zip(tiles, notes), start=1)
+    ]
+    return REDUCE_PROMPT.format(
+        width=size[0],
+        height=size[1],
+        count=len(tiles),
+        prompt=prompt,
+        notes="\n\n".join(sections),
+    )
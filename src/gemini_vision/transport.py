@@ -0,0 +1,217 @@
+# SPDX-License-Identifier: MIT
+"""Streamable HTTP transport: one long-running process serving many MCP clients.
+
+All sessions share the process's GeminiVisionServer, so caches, the
+upstream connection pool, the rate limiter and metrics are shared too.
+"""
+
+import contextlib
+import hmac
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple
+
+import uvicorn
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.server.transport_security import TransportSecuritySettings
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.types import Receive, Scope, Send
+
+from .config import env_bool, env_float, env_int, env_str
+
+if TYPE_CHECKING:
+    from .server import GeminiVisionServer
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+# Host names a loopback-bound server is reached by
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+_WILDCARD_HOSTS = ("0.0.0.0", "::", "")
+
+
+def _env_list(name: str) -> Tuple[str, ...]:
+    """Comma-separated values of an environment variable, blanks dropped."""
+    value = env_str(name) or ""
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+@dataclass
+class HttpConfig:
+    """Bind address, session and access settings of the HTTP transport.
+
+    The MCP endpoint reads local image files and the batch tools write
+    files, so requests are only accepted with a ``Host`` header in
+    ``allowed_hosts`` and, when a browser sends one, an ``Origin`` in
+    ``allowed_origins``. Both default to the loopback names plus the bind
+    host. When ``token`` is set, requests must also carry
+    ``Authorization: Bearer <token>``.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 8000
+    path: str = "/mcp"
+    stateless: bool = False
+    json_response: bool = False
+    shutdown_timeout: float = 30.0
+    allowed_hosts: Tuple[str, ...] = ()
+    allowed_origins: Tuple[str, ...] = ()
+    token: Optional[str] = None
+
+    @property
+    def is_loopback(self) -> bool:
+        """Whether the server only listens on a loopback address."""
+        return self.host in ("127.0.0.1", "localhost", "::1")
+
+    def security_settings(self) -> TransportSecuritySettings:
+        """Host/Origin checks guarding the endpoint against DNS rebinding."""
+        hosts: List[str] = list(self.allowed_hosts)
+        if not hosts:
+            names = list(_LOOPBACK_HOSTS)
+            if self.host not in _WILDCARD_HOSTS and not self.is_loopback:
+                names.append(f"[{self.host}]" if ":" in self.host else self.host)
+            hosts = names + [f"{name}:*" for name in names]
+        origins: List[str] = list(self.allowed_origins)
+        if not origins:
+            origins = [
+                f"{scheme}://{host}" for scheme in ("http", "https") for host in hosts
+            ]
+        return TransportSecuritySettings(
+            enable_dns_rebinding_protection=True,
+            allowed_hosts=hosts,
+            allowed_origins=origins,
+        )
+
+    @classmethod
+    def from_env(cls) -> "HttpConfig":
+        """Build a config from ``GEMINI_VISION_HTTP_*`` environment variables."""
+        path = env_str("GEMINI_VISION_HTTP_PATH", cls.path) or cls.path
+        return cls(
+            host=env_str("GEMINI_VISION_HTTP_HOST", cls.host) or cls.host,
+            port=env_int("GEMINI_VISION_HTTP_PORT", cls.port),
+            path=path if path.startswith("/") else f"/{path}",
+            stateless=env_bool("GEMINI_VISION_HTTP_STATELESS", cls.stateless),
+            json_response=env_bool("GEMINI_VISION_HTTP_JSON_RESPONSE", cls.json_response),
+            shutdown_timeout=env_float(
+                "GEMINI_VISION_HTTP_SHUTDOWN_TIMEOUT", cls.shutdown_timeout
+            ),
+            allowed_hosts=_env_list("GEMINI_VISION_HTTP_ALLOWED_HOSTS"),
+            allowed_origins=_env_list("GEMINI_VISION_HTTP_ALLOWED_ORIGINS"),
+            token=env_str("GEMINI_VISION_HTTP_TOKEN") or None,
+        )
+
+
+class _McpEndpoint:
+    """ASGI endpoint handing authorized requests to the session manager."""
+
+    def __init__(
+        self, session_manager: StreamableHTTPSessionManager, token: Optional[str] = None
+    ):
+        self.session_manager = session_manager
+        self.token = token
+
+    def _authorized(self, scope: Scope) -> bool:
+        if not self.token:
+            return True
+        header = Request(scope).headers.get("authorization", "")
+        scheme, _, credentials = header.partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            credentials.strip().encode(), self.token.encode()
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._authorized(scope):
+            response = JSONResponse(
+                {"error": "Missing or invalid bearer token"},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            await response(scope, receive, send)
+            return
+        await self.session_manager.handle_request(scope, receive, send)
+
+
+def build_app(vision_server: "GeminiVisionServer", config: HttpConfig) -> Starlette:
+    """ASGI app serving MCP at ``config.path`` and a health check at ``/healthz``.
+
+    MCP requests are checked against ``config.security_settings()`` and,
+    if configured, the bearer token; the health check is open.
+
+    The app's lifespan starts the vision server's background tasks and
+    closes it (flushing metrics, closing caches and the upstream session)
+    after the last session ends.
+    """
+    session_manager = StreamableHTTPSessionManager(
+        app=vision_server.server,
+        json_response=config.json_response,
+        stateless=config.stateless,
+        security_settings=config.security_settings(),
+    )
+    if not config.is_loopback and not config.token:
+        logger.warning(
+            f"HTTP transport listens on {config.host} without authentication; "
+            f"anyone who can reach it can read files this process can read. "
+            f"Set GEMINI_VISION_HTTP_TOKEN to require a bearer token"
+        )
+
+    async def health(request: Request) -> JSONResponse:
+        return JSONResponse(
+            {
+                "status": "ok",
+                "uptime_s": vision_server.stats()["metrics"]["uptime_s"],
+                "rate_limiter": vision_server.rate_limiter.stats(),
+            }
+        )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        await vision_server.start()
+        try:
+            async with session_manager.run():
+                logger.info(
+                    f"Serving MCP over streamable HTTP at "
+                    f"http://{config.host}:{config.port}{config.path}"
+                )
+                yield
+        finally:
+            logger.info("HTTP transport shutting down")
+            await vision_server.close()
+
+    return Starlette(
+        routes=[
+            Route(config.path, endpoint=_McpEndpoint(session_manager, config.token)),
+            Route("/healthz", endpoint=health, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def create_http_server(
+    vision_server: "GeminiVisionServer", config: Optional[HttpConfig] = None
+) -> uvicorn.Server:
+    """A uvicorn server for the app; ``serve()`` it, set ``should_exit`` to stop.
+
+    On SIGINT/SIGTERM uvicorn stops accepting connections and waits up to
+    ``shutdown_timeout`` seconds for in-flight requests before the lifespan
+    shuts the vision server down.
+    """
+    config = config or HttpConfig.from_env()
+    uvicorn_config = uvicorn.Config(
+        build_app(vision_server, config),
+        host=config.host,
+        port=config.port,
+        # Keep the logging configured by configure_logging()
+        log_config=None,
+        timeout_graceful_shutdown=int(config.shutdown_timeout) or None,
+        lifespan="on",
+    )
+    return uvicorn.Server(uvicorn_config)
+
+
+async def serve_http(
+    vision_server: "GeminiVisionServer", config: Optional[HttpConfig] = None
+) -> None:
+    """Serve MCP over streamable HTTP until interrupted."""
+    await create_http_server(vision_server, config).serve()
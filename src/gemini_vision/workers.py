@@ -0,0 +1,269 @@
+# SPDX-License-Identifier: MIT
+"""CPU-bound image work (decode, resize, re-encode, perceptual hashing) in worker processes.
+
+Pillow holds the GIL while it decodes and resamples, so on threads every
+request's preprocessing shares one core. Jobs here are sent to a
+``ProcessPoolExecutor`` as file paths and options; only compressed,
+base64-encoded results come back, never pixel buffers.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from .animation import FrameOptions, Keyframe, sample_frames
+from .config import env_int
+from .metrics import Metrics, collect_stages
+from .payload import encode_base64
+from .preprocess import PreprocessOptions, preprocess_image
+from .tiling import Tile, TileOptions, split_image
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+T = TypeVar("T")
+
+# Stage timings of a job are collected through this registry and sent back
+# to the server's Metrics; a one-sample reservoir keeps it from growing
+_job_metrics = Metrics(reservoir=1)
+
+
+def available_cpus() -> int:
+    """Cores this process may run on (its affinity mask where supported)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+@dataclass
+class CpuPoolConfig:
+    """Size of the preprocessing process pool; ``workers=0`` keeps the work on threads."""
+
+    workers: int = 0
+
+    @classmethod
+    def from_env(cls) -> "CpuPoolConfig":
+        """Build a config from ``GEMINI_VISION_CPU_WORKERS`` (default: one per available core)."""
+        return cls(workers=max(0, env_int("GEMINI_VISION_CPU_WORKERS", available_cpus())))
+
+
+@dataclass
+class Upload:
+    """A base64-encoded image ready for the request body, and how it was made."""
+
+    data: bytearray
+    mime_type: str
+    original_size: int
+    prepared_size: int
+    # (width, height) when the image was downscaled/recompressed, None when sent as-is
+    dimensions: Optional[Tuple[int, int]] = None
+    # Why preprocessing failed, if it did; the original was sent instead
+    error: Optional[str] = None
+
+
+def prepare_upload(path: str, mime_type: str, options: PreprocessOptions) -> Upload:
+    """Read, preprocess and base64-encode an image, falling back to the original bytes.
+
+    The raw bytes never leave this call, so at most the raw and base64
+    copies exist at once.
+    """
+    with _job_metrics.time("read"):
+        with open(path, "rb") as image_file:
+            raw = image_file.read()
+    original_size = len(raw)
+
+    error = None
+    with _job_metrics.time("preprocess"):
+        try:
+            prepared = preprocess_image(raw, options)
+        except Exception as e:
+            prepared, error = None, str(e)
+    if prepared is not None:
+        data, mime_type, dimensions = prepared.data, prepared.mime_type, (
+            prepared.width,
+            prepared.height,
+        )
+    else:
+        data, dimensions = raw, None
+    del raw
+
+    with _job_metrics.time("encode"):
+        encoded = encode_base64(data)
+    return Upload(encoded, mime_type, original_size, len(data), dimensions, error)
+
+
+def prepare_tiles(
+    path: str,
+    tiles: TileOptions,
+    options: PreprocessOptions,
+    max_pixels: Optional[int] = None,
+) -> Tuple[Tuple[int, int], List[Tuple[Tile, bytearray]], Optional[bytearray], int]:
+    """Cut an image into tiles and base64-encode each one and the overview.
+
+    Returns the image size, the encoded tiles and overview (none if the
+    image fits in one tile) and the total size of the tiles and overview
+    before encoding. ``max_pixels`` is passed on to split_image().
+    """
+    with _job_metrics.time("preprocess"):
+        size, encoded, overview = split_image(path, tiles, options, max_pixels)
+    uploads = []
+    prepared_size = 0
+    for tile, data in encoded:
+        prepared_size += len(data)
+        with _job_metrics.time("encode"):
+            uploads.append((tile, encode_base64(data)))
+    if overview is None:
+        return size, uploads, None, prepared_size
+    prepared_size += len(overview)
+    with _job_metrics.time("encode"):
+        return size, uploads, encode_base64(overview), prepared_size
+
+
+def prepare_keyframes(
+    path: str, frames: FrameOptions, options: PreprocessOptions
+) -> Tuple[int, float, List[Tuple[Keyframe, bytearray]], int]:
+    """Sample an animation's keyframes and base64-encode each one.
+
+    Returns the frame count, the duration in seconds, the encoded
+    keyframes and their total size before encoding.
+    """
+    with _job_metrics.time("preprocess"):
+        total, duration, encoded = sample_frames(path, frames, options)
+    uploads = []
+    prepared_size = 0
+    for keyframe, data in encoded:
+        prepared_size += len(data)
+        with _job_metrics.time("encode"):
+            uploads.append((keyframe, encode_base64(data)))
+    return total, duration, uploads, prepared_size
+
+
+def _run_job(func: Callable[..., T], *args: Any) -> Tuple[T, Dict[str, float]]:
+    """Run a job, returning its result and the stage timings it observed."""
+    with collect_stages() as stages:
+        result = func(*args)
+    return result, stages
+
+
+def _mp_context() -> Any:
+    # Forking a process that runs threads (the event loop's executors, the log
+    # writer) can deadlock the child, so prefer a fork server where available
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class CpuPool:
+    """Runs CPU-bound jobs in worker processes, or on threads when disabled.
+
+    The process pool is started on first use. If a worker dies, the job
+    is rerun on a thread and a fresh pool is started for the next one.
+    Stage timings observed inside a job are added to ``metrics``.
+    """
+
+    def __init__(
+        self,
+        config: CpuPoolConfig,
+        run_in_thread: Callable[..., Awaitable[Any]],
+        metrics: Optional[Metrics] = None,
+    ):
+        self.config = config
+        self.metrics = metrics
+        self._run_in_thread = run_in_thread
+        self._executor: Optional[Executor] = None
+        # Submitted to the pool and not finished, so close() can cancel them
+        self._pending: "Set[Future[Any]]" = set()
+        self._jobs = 0
+        self._fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.workers > 0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a module-level function with picklable arguments in the pool."""
+        if not self.enabled:
+            return await self.run_in_thread(func, *args)
+        from concurrent.futures.process import BrokenProcessPool
+
+        self._jobs += 1
+        result: T
+        stages: Dict[str, float]
+        try:
+            result, stages = await self._submit(_run_job, func, *args)
+        except BrokenProcessPool as e:
+            logger.warning(f"Preprocessing worker died, running on a thread instead: {e}")
+            self._fallbacks += 1
+            self._shutdown()
+            return await self.run_in_thread(func, *args)
+        self._record(stages)
+        return result
+
+    async def warm_up(self) -> None:
+        """Start the worker processes ahead of the first job, so it skips their startup."""
+        if not self.enabled:
+            return
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            await asyncio.gather(
+                *(self._submit(os.getpid) for _ in range(self.config.workers))
+            )
+            logger.info(f"Started {self.config.workers} preprocessing worker processes")
+        except BrokenProcessPool as e:
+            logger.warning(f"Preprocessing worker warm-up failed: {e}")
+            self._shutdown()
+
+    async def run_in_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a job on an I/O thread instead, for work that is mostly reading and copying."""
+        result: T
+        stages: Dict[str, float]
+        result, stages = await self._run_in_thread(_run_job, func, *args)
+        self._record(stages)
+        return result
+
+    def _submit(self, func: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        future = self._pool().submit(func, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return asyncio.wrap_future(future)
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            # Not imported at module level: the server should start without it
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.workers, mp_context=_mp_context()
+            )
+        return self._executor
+
+    def _record(self, stages: Dict[str, float]) -> None:
+        if self.metrics is not None:
+            for stage, seconds in stages.items():
+                self.metrics.observe(stage, seconds)
+
+    def _shutdown(self) -> None:
+        if self._executor is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9; cancelling each
+            # job does the same: those not yet started never run
+            for future in list(self._pending):
+                future.cancel()
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def close(self) -> None:
+        """Stop the worker processes; queued jobs are cancelled."""
+        self._shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, whether its processes are running, and jobs run in them."""
+        return {
+            "workers": self.config.workers,
+            "running": self._executor is not None,
+            "jobs": self._jobs,
+            "thread_fallbacks": self._fallbacks,
+        }
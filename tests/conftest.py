@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: MIT
+"""Fixtures shared by the test modules.
+
+``server`` is a GeminiVisionServer talking to the ``upstream`` fake
+OpenRouter, built from ``env``. Modules customize it by overriding
+``upstream`` (e.g. a different reply) or ``server_env`` (extra
+environment variables) rather than redefining the whole chain.
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+
+from gemini_vision.server import GeminiVisionServer
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    """A running fake OpenRouter."""
+    async with FakeOpenRouter() as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env():
+    """Module-specific environment variables for ``env``."""
+    return {}
+
+
+@pytest.fixture
+def env(upstream, server_env):
+    """Environment for a server using ``upstream`` and no persistent cache."""
+    return {
+        "OPENROUTER_API_KEY": "test_key",
+        "OPENROUTER_BASE_URL": upstream.base_url,
+        "GEMINI_VISION_CACHE_PATH": "none",
+        **server_env,
+    }
+
+
+@pytest_asyncio.fixture
+async def server(env):
+    """A server built from ``env``, closed after the test."""
+    with patch.dict(os.environ, env):
+        vision_server = GeminiVisionServer()
+    yield vision_server
+    await vision_server.close()
@@ -0,0 +1,142 @@
+# SPDX-License-Identifier: MIT
+"""Tests for keyframe sampling from animated images."""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image, ImageDraw
+
+from gemini_vision.animation import FrameOptions, frame_difference, sample_frames
+from gemini_vision.preprocess import PreprocessOptions
+
+
+def recording(path, scenes=("red", "green", "blue"), repeats=10, size=(200, 150)):
+    """A screen-recording-like animation: each scene held for ``repeats`` frames of 100 ms.
+
+    The middle frame of every scene has one changed pixel, which should not
+    count as a new keyframe. Encoders merge identical consecutive frames, so
+    the file holds fewer frames than were drawn.
+    """
+    frames = []
+    for number, color in enumerate(scenes):
+        for repeat in range(repeats):
+            image = Image.new("RGB", size, "white")
+            draw = ImageDraw.Draw(image)
+            draw.rectangle([number * 40, 20, number * 40 + 60, 100], fill=color)
+            if repeat == repeats // 2:
+                draw.point((1, 1), fill="black")
+            frames.append(image)
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100)
+    return path
+
+
+class TestFrameOptions:
+    """Test cases for keyframe settings."""
+
+    def test_from_env_and_overrides(self):
+        """Test settings come from the environment and per-call arguments."""
+        with patch.dict(os.environ, {"GEMINI_VISION_MAX_KEYFRAMES": "4"}):
+            options = FrameOptions.from_env()
+        assert options.max_frames == 4
+        assert options.with_overrides({"frame_threshold": 0.1}).threshold == 0.1
+        assert options.with_overrides({}) is options
+
+    def test_validation(self):
+        """Test out-of-range values are rejected."""
+        with pytest.raises(ValueError, match="max_frames"):
+            FrameOptions().with_overrides({"max_frames": 0})
+        with pytest.raises(ValueError, match="frame_threshold"):
+            FrameOptions().with_overrides({"frame_threshold": 1.5})
+
+
+class TestSampleFrames:
+    """Test cases for picking keyframes."""
+
+    def test_drops_near_identical_frames(self, tmp_path):
+        """Test one keyframe per scene, with timestamps from the frame durations."""
+        path = recording(tmp_path / "recording.webp")
+
+        total, duration, keyframes = sample_frames(
+            path, FrameOptions(), PreprocessOptions()
+        )
+
+        assert 3 < total < 30
+        assert duration == pytest.approx(3.0)
+        assert [k.timestamp for k, _ in keyframes] == pytest.approx([0.0, 1.0, 2.0])
+        assert keyframes[0][0].frame_index == 0
+        assert all(data[:4] == b"RIFF" for _, data in keyframes)
+
+    def test_keeps_first_and_largest_changes(self, tmp_path):
+        """Test max_frames keeps the first frame and the biggest changes, in order."""
+        path = recording(
+            tmp_path / "recording.gif", scenes=("red", "white", "blue"), repeats=2
+        )
+
+        _, _, keyframes = sample_frames(
+            path, FrameOptions(max_frames=2), PreprocessOptions()
+        )
+
+        # Red to white is a smaller change than white to blue
+        assert [k.timestamp for k, _ in keyframes] == pytest.approx([0.0, 0.4])
+
+    def test_frames_downscaled_within_budget(self, tmp_path):
+        """Test keyframes are capped at max_edge and encoded within max_bytes."""
+        path = recording(tmp_path / "recording.webp", repeats=1, size=(800, 600))
+        options = PreprocessOptions(max_edge=100, max_bytes=2000)
+
+        _, _, keyframes = sample_frames(path, FrameOptions(), options)
+
+        for _, data in keyframes:
+            assert len(data) <= 2000
+
+    def test_frame_difference(self):
+        """Test the difference is the fraction of pixels changed beyond the tolerance."""
+        assert frame_difference(bytes([0, 0, 0, 0]), bytes([255, 0, 5, 0])) == 0.25
+
+
+class TestServerKeyframes:
+    """Test analyze_image with keyframes=true."""
+
+    @pytest.mark.asyncio
+    async def test_sends_keyframes_in_one_request(self, server, tmp_path):
+        """Test the keyframes are sent together, labelled with their timestamps."""
+        path = recording(tmp_path / "recording.gif")
+        request = MagicMock()
+        request.params.name = "analyze_image"
+        request.params.arguments = {
+            "image_path": str(path),
+            "prompt": "What happens?",
+            "keyframes": True,
+        }
+
+        with patch.object(
+            server, "_request_completion", return_value="Three boxes"
+        ) as mock:
+            result = await server.call_tool(request)
+
+        assert "Three boxes" in result.content[0].text
+        mock.assert_called_once()
+        content, images = mock.call_args.args[:2]
+        assert len(images) == 3
+        assert "3 images are keyframes from an animation of" in content[0]["text"]
+        assert "What happens?" in content[0]["text"]
+        labels = [part["text"] for part in content[1:] if part["type"] == "text"]
+        assert labels[0] == "Frame 1 at 0.00s"
+        assert [label.split(" at ")[1] for label in labels] == [
+            "0.00s",
+            "1.00s",
+            "2.00s",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_still_image_analyzed_normally(self, server, tmp_path):
+        """Test a single-frame image falls back to a normal analysis."""
+        path = tmp_path / "still.png"
+        Image.new("RGB", (64, 64), "red").save(path)
+
+        with patch.object(server, "_call_gemini_api", return_value="Red") as mock_api:
+            result = await server._analyze_keyframes(str(path), "Describe")
+
+        assert result == "Red"
+        mock_api.assert_called_once()
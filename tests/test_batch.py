@@ -0,0 +1,262 @@
+# SPDX-License-Identifier: MIT
+"""Tests for directory/glob analysis, the JSONL job runner and the resumable manifest."""
+
+import asyncio
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from PIL import Image
+
+from gemini_vision.batch import (
+    MANIFEST_NAME,
+    Manifest,
+    analyze_directory,
+    default_manifest_path,
+    find_images,
+    run_jobs,
+)
+from gemini_vision.cli import analyze_dir, batch
+from gemini_vision.server import SUPPORTED_FORMATS
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """A directory with five images, a nested image and a non-image file."""
+    for i in range(5):
+        Image.new("RGB", (40, 40), color=(i * 40, 0, 0)).save(tmp_path / f"img{i}.png")
+    (tmp_path / "sub").mkdir()
+    Image.new("RGB", (40, 40)).save(tmp_path / "sub" / "deep.JPG")
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="A caption") as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env():
+    return {"GEMINI_VISION_RETRY_ATTEMPTS": "1"}
+
+
+class TestFindImages:
+    """Test cases for file discovery."""
+
+    def test_directory(self, image_dir):
+        """Test a directory lists supported images only, sorted."""
+        images = find_images(image_dir, SUPPORTED_FORMATS)
+        assert [image.name for image in images] == [f"img{i}.png" for i in range(5)]
+
+    def test_recursive_directory(self, image_dir):
+        """Test recursive listing includes subdirectories, matching extensions case-insensitively."""
+        images = find_images(image_dir, SUPPORTED_FORMATS, recursive=True)
+        assert "deep.JPG" in [image.name for image in images]
+        assert len(images) == 6
+
+    def test_glob(self, image_dir):
+        """Test glob patterns, including **."""
+        assert len(find_images(f"{image_dir}/img[0-2].png", SUPPORTED_FORMATS)) == 3
+        assert len(find_images(f"{image_dir}/**/*", SUPPORTED_FORMATS)) == 6
+
+    def test_missing_source(self, tmp_path):
+        """Test a missing path is reported."""
+        with pytest.raises(ValueError, match="No such directory"):
+            find_images(tmp_path / "missing", SUPPORTED_FORMATS)
+
+    def test_default_manifest_path(self, image_dir):
+        """Test the manifest goes in the directory, or the glob's base directory."""
+        assert default_manifest_path(image_dir) == image_dir / MANIFEST_NAME
+        assert default_manifest_path(f"{image_dir}/**/*.png") == image_dir / MANIFEST_NAME
+
+
+class TestManifest:
+    """Test cases for the JSONL manifest."""
+
+    def test_skips_truncated_line(self, tmp_path):
+        """Test a line cut short by a crash is ignored and terminated before appending."""
+        path = tmp_path / "manifest.jsonl"
+        good = {"image_path": "/a.png", "prompt": "p", "size": 1, "mtime_ns": 2, "status": "ok"}
+        path.write_text(json.dumps(good) + "\n" + '{"image_path": "/b.png", "sta')
+
+        manifest = Manifest(path)
+        assert manifest.completed() == {("/a.png", "p", 1, 2)}
+
+        manifest.append({**good, "image_path": "/c.png"})
+        manifest.close()
+        assert len(Manifest(path).completed()) == 2
+
+
+class TestAnalyzeDirectory:
+    """Test directory runs against a local fake OpenRouter."""
+
+    @pytest.mark.asyncio
+    async def test_run_and_resume(self, server, upstream, image_dir):
+        """Test results are appended as they finish and a rerun skips done images."""
+        upstream.failures = [400]
+        seen = []
+
+        async def on_result(record, summary):
+            seen.append(record["status"])
+
+        summary = await analyze_directory(
+            server, str(image_dir), "Caption", SUPPORTED_FORMATS,
+            concurrency=2, limit=4, on_result=on_result,
+        )
+
+        assert (summary.found, summary.skipped, summary.queued) == (5, 0, 4)
+        assert (summary.succeeded, summary.failed) == (3, 1)
+        assert sorted(seen) == ["error", "ok", "ok", "ok"]
+        lines = (image_dir / MANIFEST_NAME).read_text().splitlines()
+        assert len(lines) == 4
+        assert json.loads(lines[-1])["prompt"] == "Caption"
+
+        # The failed and the unprocessed image are done on the next run
+        summary = await analyze_directory(
+            server, str(image_dir), "Caption", SUPPORTED_FORMATS, concurrency=2
+        )
+        assert (summary.skipped, summary.succeeded, summary.failed) == (3, 2, 0)
+        assert len(upstream.requests) == 6
+
+        # A different prompt is a different job
+        summary = await analyze_directory(
+            server, str(image_dir), "Other", SUPPORTED_FORMATS, limit=1
+        )
+        assert (summary.skipped, summary.succeeded) == (0, 1)
+
+    @pytest.mark.asyncio
+    async def test_changed_file_is_redone(self, server, image_dir):
+        """Test an image modified since it was recorded is analyzed again."""
+        await analyze_directory(server, str(image_dir), "Caption", SUPPORTED_FORMATS)
+
+        target = image_dir / "img0.png"
+        Image.new("RGB", (40, 40), color="blue").save(target)
+        stat = target.stat()
+        os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        summary = await analyze_directory(server, str(image_dir), "Caption", SUPPORTED_FORMATS)
+        assert (summary.skipped, summary.succeeded) == (4, 1)
+
+    @pytest.mark.asyncio
+    async def test_cli(self, env, image_dir, tmp_path, capsys):
+        """Test the command-line entry point writes the manifest and prints a summary."""
+        manifest = tmp_path / "out" / "results.jsonl"
+        with patch.dict(os.environ, env):
+            exit_code = await asyncio.to_thread(
+                analyze_dir,
+                [f"{image_dir}/*.png", "--manifest", str(manifest), "--concurrency", "3"],
+            )
+
+        assert exit_code == 0
+        summary = json.loads(capsys.readouterr().out)
+        assert summary["succeeded"] == 5
+        assert len(manifest.read_text().splitlines()) == 5
+
+
+class TestRunJobs:
+    """Test the offline JSONL job runner against a local fake OpenRouter."""
+
+    def write_jobs(self, path, image_dir, extra_lines=()):
+        lines = [
+            json.dumps({"id": f"job-{i}", "image_path": str(image_dir / f"img{i}.png")})
+            for i in range(5)
+        ]
+        path.write_text("\n".join(list(lines) + list(extra_lines)) + "\n")
+        return path
+
+    @pytest.mark.asyncio
+    async def test_ordered_output_and_summary(self, server, upstream, image_dir, tmp_path):
+        """Test records come out in job order with ids, errors and token totals."""
+        jobs = self.write_jobs(
+            tmp_path / "jobs.jsonl",
+            image_dir,
+            ["", "not json", json.dumps({"prompt": "no image"})],
+        )
+        output = tmp_path / "results.jsonl"
+
+        summary = await run_jobs(server, jobs, output, "Caption", concurrency=3)
+
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert [record["line"] for record in records] == [1, 2, 3, 4, 5, 7, 8]
+        assert [record.get("id") for record in records[:5]] == [f"job-{i}" for i in range(5)]
+        assert all(record["status"] == "ok" for record in records[:5])
+        assert "Invalid JSON" in records[5]["error"]
+        assert "image_path is required" in records[6]["error"]
+        assert (summary.found, summary.succeeded, summary.failed) == (7, 5, 2)
+        assert summary.tokens["prompt_tokens"] == 500
+        assert summary.as_dict()["images_per_s"] > 0
+
+    @pytest.mark.asyncio
+    async def test_ordered_output_waits_for_slow_job(self, server, image_dir, tmp_path):
+        """Test a slow first job does not let later records overtake it in ordered mode."""
+        jobs = self.write_jobs(tmp_path / "jobs.jsonl", image_dir)
+        original = server._analyze_image
+
+        async def analyze(image_path, prompt, **options):
+            if image_path.endswith("img0.png"):
+                await asyncio.sleep(0.05)
+            return await original(image_path, prompt, **options)
+
+        with patch.object(server, "_analyze_image", side_effect=analyze):
+            await run_jobs(server, jobs, tmp_path / "ordered.jsonl", "Caption", concurrency=3)
+            await run_jobs(
+                server, jobs, tmp_path / "unordered.jsonl", "Caption",
+                concurrency=3, ordered=False,
+            )
+
+        def lines(name):
+            return [
+                json.loads(line)["line"]
+                for line in (tmp_path / name).read_text().splitlines()
+            ]
+
+        assert lines("ordered.jsonl") == [1, 2, 3, 4, 5]
+        assert lines("unordered.jsonl")[-1] == 1
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, server, upstream, image_dir, tmp_path):
+        """Test a rerun skips jobs with an ok record and retries failed ones."""
+        jobs = self.write_jobs(tmp_path / "jobs.jsonl", image_dir)
+        output = tmp_path / "results.jsonl"
+        upstream.failures = [400]
+
+        first = await run_jobs(server, jobs, output, "Caption", concurrency=1)
+        second = await run_jobs(server, jobs, output, "Caption", concurrency=1)
+        restarted = await run_jobs(server, jobs, output, "Caption", resume=False)
+
+        assert (first.succeeded, first.failed) == (4, 1)
+        assert (second.skipped, second.succeeded) == (4, 1)
+        assert (restarted.skipped, restarted.succeeded) == (0, 5)
+        assert len(output.read_text().splitlines()) == 5
+
+    @pytest.mark.asyncio
+    async def test_tokens_exclude_concurrent_requests(self, server, image_dir, tmp_path):
+        """Test the token totals only count the run's own jobs."""
+        jobs = self.write_jobs(tmp_path / "jobs.jsonl", image_dir)
+
+        summary, _ = await asyncio.gather(
+            run_jobs(server, jobs, tmp_path / "results.jsonl", "Caption"),
+            server._analyze_image(str(image_dir / "img0.png"), "Unrelated"),
+        )
+
+        assert summary.tokens["prompt_tokens"] == 500
+        assert server.metrics.snapshot()["tokens"]["prompt_tokens"] == 600
+
+    @pytest.mark.asyncio
+    async def test_cli(self, env, image_dir, tmp_path, capsys):
+        """Test the gemini-vision-batch entry point."""
+        jobs = self.write_jobs(tmp_path / "jobs.jsonl", image_dir)
+        output = tmp_path / "results.jsonl"
+        with patch.dict(os.environ, env):
+            exit_code = await asyncio.to_thread(
+                batch, [str(jobs), "--output", str(output), "--unordered", "--quiet"]
+            )
+
+        assert exit_code == 0
+        assert json.loads(capsys.readouterr().out)["succeeded"] == 5
+        assert len(output.read_text().splitlines()) == 5
@@ -0,0 +1,45 @@
+# SPDX-License-Identifier: MIT
+"""Smoke test for the benchmark harness."""
+
+import importlib.util
+import json
+from pathlib import Path
+
+from PIL import Image
+
+HARNESS = Path(__file__).resolve().parent.parent / "benchmarks" / "run.py"
+
+
+def load_harness():
+    spec = importlib.util.spec_from_file_location("benchmarks_run", HARNESS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_harness_writes_comparable_results(tmp_path, capsys):
+    """Test a tiny run writes results and a second run compares against them."""
+    harness = load_harness()
+    image = tmp_path / "image.png"
+    Image.new("RGB", (64, 48), color="green").save(image)
+    baseline = tmp_path / "baseline.json"
+    args = ["--images", str(image), "--concurrency", "1,2", "--requests", "3", "--latency", "0"]
+
+    assert harness.main(args + ["--output", str(baseline)]) == 0
+
+    results = json.loads(baseline.read_text())
+    assert [s["name"] for s in results["scenarios"]] == ["image.png/c1", "image.png/c2"]
+    scenario = results["scenarios"][0]
+    assert scenario["requests"] == 3
+    assert scenario["errors"] == 0
+    assert scenario["throughput_rps"] > 0
+    assert scenario["bytes_sent"] > 0
+    assert scenario["peak_rss_mb"] > 0
+    assert scenario["stages"]["upstream_total"]["count"] == 3
+
+    current = tmp_path / "current.json"
+    exit_code = harness.main(
+        args + ["--output", str(current), "--compare", str(baseline)]
+    )
+    assert exit_code == 0
+    assert "image.png/c1: throughput_rps" in capsys.readouterr().out
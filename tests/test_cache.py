@@ -0,0 +1,230 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the response cache."""
+
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from gemini_vision.cache import (
+    CacheConfig,
+    FileIdentity,
+    PreparedImageCache,
+    PreparedUpload,
+    ResponseCache,
+    cache_key,
+)
+
+
+def make_cache(tmp_path, **overrides):
+    """Create a cache backed by a temporary SQLite file."""
+    config = CacheConfig(path=str(tmp_path / "cache.sqlite3"), **overrides)
+    return ResponseCache(config)
+
+
+class TestCacheKey:
+    """Test cases for cache_key."""
+
+    def test_key_is_stable(self):
+        """Test the same inputs produce the same key regardless of param order."""
+        first = cache_key("abc", "prompt", "model", {"a": 1, "b": 2})
+        second = cache_key("abc", "prompt", "model", {"b": 2, "a": 1})
+        assert first == second
+
+    def test_key_changes_with_inputs(self):
+        """Test every component contributes to the key."""
+        base = cache_key("abc", "prompt", "model", {"temperature": 0})
+        assert base != cache_key("abd", "prompt", "model", {"temperature": 0})
+        assert base != cache_key("abc", "other", "model", {"temperature": 0})
+        assert base != cache_key("abc", "prompt", "other", {"temperature": 0})
+        assert base != cache_key("abc", "prompt", "model", {"temperature": 1})
+
+
+class TestResponseCache:
+    """Test cases for ResponseCache."""
+
+    def test_should_cache_only_deterministic_by_default(self):
+        """Test non-zero temperatures are not cached unless opted in."""
+        cache = ResponseCache(CacheConfig(path=None))
+        assert cache.should_cache(0)
+        assert not cache.should_cache(0.7)
+
+        cache = ResponseCache(CacheConfig(path=None, cache_nondeterministic=True))
+        assert cache.should_cache(0.7)
+
+        cache = ResponseCache(CacheConfig(path=None, enabled=False))
+        assert not cache.should_cache(0)
+
+    @pytest.mark.asyncio
+    async def test_memory_hit_and_miss(self, tmp_path):
+        """Test a stored response is served from memory."""
+        cache = make_cache(tmp_path)
+        try:
+            assert await cache.get("key") is None
+            await cache.put("key", "answer", "model", 0)
+            entry = await cache.get("key")
+            assert entry.text == "answer"
+            assert entry.deterministic
+
+            stats = cache.stats()
+            assert stats["misses"] == 1
+            assert stats["memory_hits"] == 1
+        finally:
+            await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_restart(self, tmp_path):
+        """Test responses persist across cache instances."""
+        cache = make_cache(tmp_path)
+        await cache.put("key", "answer", "model", 0)
+        await cache.close()
+
+        cache = make_cache(tmp_path)
+        try:
+            entry = await cache.get("key")
+            assert entry is not None and entry.text == "answer"
+            assert cache.stats()["disk_hits"] == 1
+            # Promoted into memory
+            await cache.get("key")
+            assert cache.stats()["memory_hits"] == 1
+        finally:
+            await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_memory_lru_eviction(self):
+        """Test the in-memory tier evicts least recently used entries."""
+        cache = ResponseCache(CacheConfig(path=None, memory_entries=2))
+        await cache.put("a", "1", "model", 0)
+        await cache.put("b", "2", "model", 0)
+        await cache.get("a")
+        await cache.put("c", "3", "model", 0)
+
+        assert await cache.get("b") is None
+        assert (await cache.get("a")).text == "1"
+        assert cache.stats()["memory_evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_size_eviction(self, tmp_path):
+        """Test the disk tier evicts oldest entries past its byte budget."""
+        cache = make_cache(tmp_path, memory_entries=0, max_disk_bytes=300)
+        try:
+            for i in range(5):
+                await cache.put(f"key{i}", "x" * 100, "model", 0)
+            assert cache.stats()["disk_evictions"] >= 3
+            assert await cache.get("key0") is None
+            assert await cache.get("key4") is not None
+        finally:
+            await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, tmp_path):
+        """Test expired entries are not served from either tier."""
+        cache = make_cache(tmp_path, ttl=10)
+        try:
+            await cache.put("key", "answer", "model", 0)
+            with patch("gemini_vision.cache.time.time", return_value=time.time() + 60):
+                assert await cache.get("key") is None
+            assert cache.stats()["expired"] >= 1
+        finally:
+            await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_unreadable_disk_tier_is_a_miss(self, tmp_path, caplog):
+        """Test a corrupt cache file is logged and treated as a miss, not an error."""
+        (tmp_path / "cache.sqlite3").write_bytes(b"not a database" * 100)
+        cache = make_cache(tmp_path, memory_entries=0)
+        try:
+            assert await cache.get("key") is None
+            await cache.put("key", "answer", "model", 0)
+            assert await cache.get("key") is None
+        finally:
+            await cache.close()
+
+        assert cache.stats()["misses"] == 2
+        assert "Failed to read cached response" in caplog.text
+
+
+class TestPreparedImageCache:
+    """Test cases for PreparedImageCache."""
+
+    def test_identity_changes_with_file(self, tmp_path):
+        """Test rewriting a file changes its identity."""
+        path = tmp_path / "image.png"
+        path.write_bytes(b"one")
+        first = FileIdentity.from_path(path)
+        assert FileIdentity.from_path(path) == first
+
+        path.write_bytes(b"three")
+        os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+        assert FileIdentity.from_path(path) != first
+
+    def test_get_and_put(self):
+        """Test uploads are keyed on identity and options."""
+        cache = PreparedImageCache(max_bytes=100)
+        identity = FileIdentity("/a.png", 1, 2, 3, 4)
+        cache.put(identity, "opts", PreparedUpload(b"data", "image/webp"))
+
+        assert cache.get(identity, "opts") == (b"data", "image/webp")
+        assert cache.get(identity, "other") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_byte_size_eviction(self):
+        """Test least recently used uploads are evicted past the byte budget."""
+        cache = PreparedImageCache(max_bytes=10)
+        identities = [FileIdentity(f"/{i}.png", 1, i, 4, 5) for i in range(3)]
+        cache.put(identities[0], "", PreparedUpload(b"x" * 4, "image/png"))
+        cache.put(identities[1], "", PreparedUpload(b"x" * 4, "image/png"))
+        cache.get(identities[0], "")
+        cache.put(identities[2], "", PreparedUpload(b"x" * 4, "image/png"))
+
+        assert cache.get(identities[1], "") is None
+        assert cache.get(identities[0], "") is not None
+        assert cache.stats()["bytes"] == 8
+        assert cache.stats()["evictions"] == 1
+
+        # Uploads larger than the whole budget are not cached
+        cache.put(identities[1], "", PreparedUpload(b"x" * 11, "image/png"))
+        assert cache.get(identities[1], "") is None
+
+    def test_new_version_invalidates_old(self):
+        """Test a new identity for the same path drops the old entries."""
+        cache = PreparedImageCache()
+        old = FileIdentity("/a.png", 1, 2, 3, 4)
+        new = old._replace(mtime_ns=5)
+        cache.set_digest(old, "olddigest")
+        cache.put(old, "", PreparedUpload(b"old", "image/png"))
+
+        cache.set_digest(new, "newdigest")
+
+        assert cache.digest(old) is None
+        assert cache.digest(new) == "newdigest"
+        assert cache.stats()["entries"] == 0
+        assert cache.stats()["invalidations"] == 1
+
+    def test_evicted_paths_are_forgotten(self):
+        """Test paths stop being tracked once all their entries are evicted."""
+        cache = PreparedImageCache(max_bytes=4, max_digests=2)
+        identities = [FileIdentity(f"/{i}.png", 1, i, 4, 5) for i in range(10)]
+        for identity in identities:
+            cache.set_digest(identity, "digest")
+            cache.put(identity, "", PreparedUpload(b"x" * 4, "image/png"))
+
+        assert set(cache._current) == {"/8.png", "/9.png"}
+
+
+def test_config_from_env(tmp_path):
+    """Test cache settings are read from the environment."""
+    env = {
+        "GEMINI_VISION_CACHE": "false",
+        "GEMINI_VISION_CACHE_PATH": "none",
+        "GEMINI_VISION_CACHE_MAX_DISK_MB": "2",
+        "GEMINI_VISION_CACHE_NONDETERMINISTIC": "yes",
+    }
+    with patch.dict(os.environ, env, clear=True):
+        config = CacheConfig.from_env()
+    assert not config.enabled
+    assert config.path is None
+    assert config.max_disk_bytes == 2 * 1024 * 1024
+    assert config.cache_nondeterministic
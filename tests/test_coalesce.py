@@ -0,0 +1,151 @@
+# SPDX-License-Identifier: MIT
+"""Tests for single-flight request coalescing."""
+
+import asyncio
+
+import pytest
+
+from gemini_vision.coalesce import SingleFlight
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_result(self):
+        """Test identical concurrent calls run the factory once."""
+        flight = SingleFlight()
+        calls = 0
+
+        async def factory(forward):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.run("key", factory) for _ in range(5)))
+
+        assert results == ["answer"] * 5
+        assert calls == 1
+        assert flight.stats() == {
+            "leaders": 1,
+            "coalesced": 4,
+            "abandoned": 0,
+            "in_flight": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_different_keys_do_not_coalesce(self):
+        """Test calls with different keys run independently."""
+        flight = SingleFlight()
+
+        async def factory(forward):
+            await asyncio.sleep(0)
+            return "answer"
+
+        await asyncio.gather(flight.run("a", factory), flight.run("b", factory))
+        assert flight.stats()["leaders"] == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared(self):
+        """Test every waiter sees the factory's exception."""
+        flight = SingleFlight()
+
+        async def factory(forward):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flight.run("key", factory), flight.run("key", factory), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_one_waiter_cancelling_keeps_call_alive(self):
+        """Test a cancelled waiter does not cancel the shared call."""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def factory(forward):
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(flight.run("key", factory))
+        second = asyncio.create_task(flight.run("key", factory))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert flight.stats()["abandoned"] == 0
+
+    @pytest.mark.asyncio
+    async def test_all_waiters_cancelling_cancels_call(self):
+        """Test the shared call is cancelled once nobody waits for it."""
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def factory(forward):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flight.run("key", factory))
+        await started.wait()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert flight.stats()["abandoned"] == 1
+        assert flight.stats()["in_flight"] == 0
+
+        async def fresh(forward):
+            return "fresh"
+
+        assert await flight.run("key", fresh) == "fresh"
+
+    @pytest.mark.asyncio
+    async def test_streamed_text_reaches_every_waiter(self):
+        """Test deltas go to all current waiters, and not to one that was cancelled."""
+        flight = SingleFlight()
+        joined = asyncio.Event()
+        release = asyncio.Event()
+        received = {"first": [], "second": []}
+
+        def listener(name):
+            async def on_delta(delta):
+                received[name].append(delta)
+
+            return on_delta
+
+        async def factory(forward):
+            await forward("a")
+            await joined.wait()
+            await forward("b")
+            await release.wait()
+            await forward("c")
+            return "abc"
+
+        first = asyncio.create_task(flight.run("key", factory, listener("first")))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.run("key", factory, listener("second")))
+        await asyncio.sleep(0)
+        joined.set()
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        release.set()
+
+        assert await second == "abc"
+        assert received == {"first": ["a", "b"], "second": ["b", "c"]}
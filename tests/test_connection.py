@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the shared upstream connection pool."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from gemini_vision.connection import ConnectionConfig, ConnectionPool
+
+
+@pytest_asyncio.fixture
+async def local_server():
+    """Start a small local HTTP server and yield its base URL."""
+    async def handle(request):
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+
+class TestConnectionConfig:
+    """Test cases for ConnectionConfig."""
+
+    def test_from_env_defaults(self):
+        """Test defaults are used when no variables are set."""
+        with patch.dict(os.environ, {}, clear=True):
+            config = ConnectionConfig.from_env()
+        assert config == ConnectionConfig()
+
+    def test_from_env_overrides(self):
+        """Test environment variables override the defaults."""
+        env = {
+            "GEMINI_VISION_POOL_LIMIT": "10",
+            "GEMINI_VISION_POOL_LIMIT_PER_HOST": "4",
+            "GEMINI_VISION_DNS_CACHE_TTL": "60",
+            "GEMINI_VISION_KEEPALIVE_TIMEOUT": "5.5",
+            "GEMINI_VISION_REQUEST_TIMEOUT": "not-a-number",
+        }
+        with patch.dict(os.environ, env, clear=True):
+            config = ConnectionConfig.from_env()
+        assert config.limit == 10
+        assert config.limit_per_host == 4
+        assert config.dns_cache_ttl == 60
+        assert config.keepalive_timeout == 5.5
+        assert config.request_timeout == ConnectionConfig.request_timeout
+
+
+class TestConnectionPool:
+    """Test cases for ConnectionPool."""
+
+    @pytest.mark.asyncio
+    async def test_session_is_shared(self):
+        """Test the same session is returned until closed."""
+        pool = ConnectionPool()
+        first = await pool.get_session()
+        second = await pool.get_session()
+        assert first is second
+
+        await pool.close()
+        assert first.closed
+        third = await pool.get_session()
+        assert third is not first
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_connections_are_reused(self, local_server):
+        """Test warm-up opens a connection that later requests reuse."""
+        pool = ConnectionPool()
+        try:
+            assert await pool.warm_up(local_server)
+
+            session = await pool.get_session()
+            for _ in range(3):
+                async with session.post(f"{local_server}/chat", json={}) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+
+            stats = pool.stats()
+            assert stats["requests"] == 4
+            assert stats["connections_created"] == 1
+            assert stats["connections_reused"] == 3
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_warm_up_failure_is_not_fatal(self):
+        """Test warm-up against an unreachable host returns False."""
+        pool = ConnectionPool(ConnectionConfig(request_timeout=1.0))
+        try:
+            assert not await pool.warm_up("http://127.0.0.1:9")
+        finally:
+            await pool.close()
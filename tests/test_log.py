@@ -0,0 +1,171 @@
+# SPDX-License-Identifier: MIT
+"""Tests for queued, structured, sampled logging."""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from gemini_vision.log import (
+    SAMPLED,
+    JsonFormatter,
+    LogConfig,
+    clip,
+    configure_logging,
+    request_context,
+    shutdown_logging,
+)
+from gemini_vision.server import GeminiVisionServer
+
+logger = logging.getLogger("gemini-vision-mcp")
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Configure logging to a JSON file; yields a function reading its records."""
+    path = tmp_path / "server.log"
+
+    def records():
+        shutdown_logging()
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    yield path, records
+    shutdown_logging()
+
+
+class TestConfig:
+    """Test cases for logging settings."""
+
+    def test_from_env(self):
+        """Test settings are read from GEMINI_VISION_LOG_* variables."""
+        env = {
+            "GEMINI_VISION_LOG_LEVEL": "debug",
+            "GEMINI_VISION_LOG_FILE": "none",
+            "GEMINI_VISION_LOG_FORMAT": "text",
+            "GEMINI_VISION_LOG_MAX_MB": "2",
+            "GEMINI_VISION_LOG_SAMPLE_RATE": "5",
+        }
+        with patch.dict(os.environ, env):
+            config = LogConfig.from_env()
+        assert (config.level, config.file, config.format) == ("DEBUG", None, "text")
+        assert config.max_bytes == 2 * 1024 * 1024
+        assert config.sample_rate == 1.0
+
+    def test_clip(self):
+        """Test long text is shortened with its original length."""
+        assert clip("short") == "short"
+        assert clip("x" * 500, 10) == "xxxxxxxxxx... (500 chars)"
+
+
+class TestJsonFormatter:
+    """Test cases for JSON records."""
+
+    def test_fields(self):
+        """Test extra fields, the request ID and exceptions are included."""
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            record = logger.makeRecord(
+                logger.name, logging.ERROR, __file__, 1, "Failed %s", ("job",),
+                exc_info=sys.exc_info(), extra={"tool": "analyze_image", "request_id": "abc"},
+            )
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "Failed job"
+        assert entry["level"] == "ERROR"
+        assert entry["tool"] == "analyze_image"
+        assert entry["request_id"] == "abc"
+        assert "RuntimeError: boom" in entry["exception"]
+
+
+class TestConfigureLogging:
+    """Test the queue handler and background writer."""
+
+    def test_writes_json_off_thread_never_stdout(self, log_file, capsys):
+        """Test records reach the file through the listener, tagged with the request ID."""
+        path, records = log_file
+        configure_logging(LogConfig(file=str(path)))
+
+        async def handle() -> None:
+            with request_context("req-1"):
+                await asyncio.sleep(0)
+                logger.info("Inside request", extra={"stage": "read"})
+            logger.warning("Outside request")
+
+        asyncio.run(handle())
+
+        entries = records()
+        assert entries[0]["message"] == "Inside request"
+        assert entries[0]["request_id"] == "req-1"
+        assert entries[0]["stage"] == "read"
+        assert "request_id" not in entries[1]
+        assert capsys.readouterr().out == ""
+
+    def test_sampling(self, log_file):
+        """Test sampled lines are dropped at the configured rate; others are kept."""
+        path, records = log_file
+        configure_logging(LogConfig(file=str(path), sample_rate=0.0))
+
+        for _ in range(20):
+            logger.info("High volume", extra=SAMPLED)
+        logger.info("Important")
+
+        assert [entry["message"] for entry in records()] == ["Important"]
+
+    def test_rotation(self, log_file):
+        """Test the file is rotated by size."""
+        path, records = log_file
+        configure_logging(LogConfig(file=str(path), max_bytes=2000, backups=2))
+
+        for i in range(100):
+            logger.info(f"Line {i}")
+        shutdown_logging()
+
+        assert path.exists() and (path.parent / "server.log.1").exists()
+        assert not (path.parent / "server.log.3").exists()
+        assert path.stat().st_size <= 2000
+
+    def test_unwritable_file_falls_back_to_stderr(self, tmp_path, capsys):
+        """Test a log file that cannot be opened sends records to stderr instead."""
+        configure_logging(LogConfig(file=str(tmp_path / "missing" / "dir" / "x.log")))
+        logger.warning("Still visible")
+        shutdown_logging()
+
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert "Still visible" in captured.err
+
+
+class TestToolCallRecord:
+    """Test the per-call log record of the server."""
+
+    @pytest.mark.asyncio
+    async def test_stage_timings(self, log_file, tmp_path):
+        """Test each tool call logs its duration and stage timings, including worker-thread stages."""
+        path, records = log_file
+        image = tmp_path / "image.png"
+        Image.new("RGB", (64, 64), color="red").save(image)
+        env = {"OPENROUTER_API_KEY": "test_key", "GEMINI_VISION_CACHE_PATH": "none"}
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+        configure_logging(LogConfig(file=str(path)))
+
+        request = MagicMock()
+        request.params.name = "analyze_image"
+        request.params.arguments = {"image_path": str(image), "prompt": "p" * 1000}
+        with patch.object(server, "_call_gemini_api", return_value="Result"):
+            await server.call_tool(request)
+        await server.close()
+
+        entries = records()
+        finished = [entry for entry in entries if entry.get("tool") == "analyze_image"]
+        assert len(finished) == 1
+        assert finished[0]["ok"] is True
+        assert {"validate", "read", "preprocess", "encode"} <= set(finished[0]["stages_ms"])
+        request_ids = {entry.get("request_id") for entry in entries if "request_id" in entry}
+        assert request_ids == {finished[0]["request_id"]}
+        assert all(len(entry["message"]) < 400 for entry in entries)
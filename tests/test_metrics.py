@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: MIT
+"""Tests for per-stage metrics and the get_stats tool."""
+
+import json
+
+import pytest
+from mcp.types import CallToolRequest, CallToolRequestParams
+from PIL import Image
+
+from gemini_vision.metrics import LatencyHistogram, Metrics, collect_usage
+
+
+class TestLatencyHistogram:
+    """Test cases for LatencyHistogram."""
+
+    def test_quantiles(self):
+        """Test nearest-rank quantiles over the samples."""
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.observe(ms / 1000)
+
+        snapshot = histogram.snapshot()
+
+        assert snapshot["count"] == 100
+        assert snapshot["p50_ms"] == 50.0
+        assert snapshot["p95_ms"] == 95.0
+        assert snapshot["p99_ms"] == 99.0
+        assert snapshot["max_ms"] == 100.0
+        assert snapshot["mean_ms"] == pytest.approx(50.5)
+
+    def test_reservoir_keeps_recent_samples(self):
+        """Test quantiles use the most recent samples but counts cover all."""
+        histogram = LatencyHistogram(reservoir=10)
+        for _ in range(100):
+            histogram.observe(1.0)
+        for _ in range(10):
+            histogram.observe(0.001)
+
+        assert histogram.count == 110
+        assert histogram.quantile(0.99) == 0.001
+        assert histogram.max == 1.0
+
+    def test_empty(self):
+        """Test an empty histogram reports zeros."""
+        assert LatencyHistogram().snapshot()["p50_ms"] == 0.0
+
+
+class TestMetrics:
+    """Test cases for Metrics."""
+
+    def test_snapshot(self):
+        """Test stages, bytes, tokens and tool calls are collected."""
+        metrics = Metrics()
+        with metrics.time("upstream_total"):
+            pass
+        metrics.observe("validate", 0.002)
+        metrics.add_bytes("upload", 100)
+        metrics.add_bytes("upload", 50)
+        metrics.record_usage({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+        metrics.record_usage(None)
+        metrics.record_call("analyze_image", 0.1, ok=True)
+        metrics.record_call("analyze_image", 0.2, ok=False)
+
+        snapshot = metrics.snapshot()
+
+        # Stages are listed in pipeline order
+        assert list(snapshot["stages"]) == ["validate", "upstream_total"]
+        assert snapshot["bytes"] == {"upload": 150}
+        assert snapshot["tokens"] == {
+            "prompt_tokens": 10,
+            "completion_tokens": 5,
+            "total_tokens": 15,
+        }
+        assert snapshot["tools"]["analyze_image"]["count"] == 2
+        assert snapshot["tools"]["analyze_image"]["errors"] == 1
+
+    def test_collect_usage(self):
+        """Test usage is totalled per block as well as globally."""
+        metrics = Metrics()
+        metrics.record_usage({"prompt_tokens": 3})
+        with collect_usage() as tokens:
+            metrics.record_usage({"prompt_tokens": 10, "total_tokens": 12})
+
+        assert tokens == {"prompt_tokens": 10, "completion_tokens": 0, "total_tokens": 12}
+        assert metrics.snapshot()["tokens"]["prompt_tokens"] == 13
+
+    def test_render_prometheus(self):
+        """Test the text exposition includes summaries, counters and component gauges."""
+        metrics = Metrics()
+        metrics.observe("queue", 0.5)
+        metrics.add_bytes("image_read", 1234)
+        metrics.record_usage({"completion_tokens": 7})
+
+        text = metrics.render_prometheus(
+            {"rate_limiter": {"window": 4.5, "circuit": {"state": "closed", "opened": 2}}}
+        )
+
+        assert "# TYPE gemini_vision_stage_seconds summary" in text
+        assert 'gemini_vision_stage_seconds{stage="queue",quantile="0.99"} 0.500000' in text
+        assert 'gemini_vision_stage_seconds_count{stage="queue"} 1' in text
+        assert 'gemini_vision_bytes_total{kind="image_read"} 1234' in text
+        assert 'gemini_vision_tokens_total{kind="completion"} 7' in text
+        assert "gemini_vision_rate_limiter_window 4.5" in text
+        assert "gemini_vision_rate_limiter_circuit_opened 2" in text
+        assert "closed" not in text
+
+    def test_write_prometheus(self, tmp_path):
+        """Test the dump is written to the given path."""
+        metrics = Metrics()
+        metrics.add_bytes("upload", 1)
+        path = tmp_path / "nested" / "metrics.prom"
+
+        metrics.write_prometheus(path)
+
+        assert 'gemini_vision_bytes_total{kind="upload"} 1' in path.read_text()
+        assert [p.name for p in path.parent.iterdir()] == ["metrics.prom"]
+
+
+@pytest.fixture
+def server_env(tmp_path):
+    return {"GEMINI_VISION_METRICS_FILE": str(tmp_path / "metrics.prom")}
+
+
+class TestServerMetrics:
+    """Test stage timings recorded by the server and the get_stats tool."""
+
+    @pytest.mark.asyncio
+    async def test_get_stats_reports_stages(self, server, tmp_path):
+        """Test an analysis records every stage and get_stats reports them."""
+        image_path = tmp_path / "image.png"
+        Image.new("RGB", (64, 64), color="blue").save(image_path)
+
+        for stream in (False, True):
+            result = await server.call_tool(
+                CallToolRequest(
+                    method="tools/call",
+                    params=CallToolRequestParams(
+                        name="analyze_image",
+                        arguments={
+                            "image_path": str(image_path),
+                            "stream": stream,
+                            "use_cache": False,
+                        },
+                    ),
+                )
+            )
+            assert not result.isError
+
+        result = await server.call_tool(
+            CallToolRequest(
+                method="tools/call",
+                params=CallToolRequestParams(name="get_stats", arguments={}),
+            )
+        )
+        stats = json.loads(result.content[0].text)
+
+        stages = stats["metrics"]["stages"]
+        for stage in ("validate", "queue", "upstream_ttfb", "upstream_total"):
+            assert stages[stage]["count"] == 2, stage
+        # The second call reuses the prepared upload
+        for stage in ("read", "preprocess", "encode"):
+            assert stages[stage]["count"] == 1, stage
+        assert stats["metrics"]["tools"]["analyze_image"]["count"] == 2
+        assert stats["metrics"]["tokens"]["prompt_tokens"] == 200
+        assert stats["metrics"]["bytes"]["upload"] > 0
+        assert stats["components"]["rate_limiter"]["admitted"] == 2
+        assert stats["components"]["connection_pool"]["requests"] == 2
+
+    @pytest.mark.asyncio
+    async def test_metrics_file_written_on_close(self, server, tmp_path):
+        """Test the Prometheus dump is written when the server closes."""
+        await server.start()
+        await server.close()
+
+        text = (tmp_path / "metrics.prom").read_text()
+        assert "gemini_vision_response_cache_misses" in text
@@ -0,0 +1,215 @@
+# SPDX-License-Identifier: MIT
+"""Tests for perceptual-hash near-duplicate lookups."""
+
+import os
+import random
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from PIL import Image, ImageDraw
+
+from gemini_vision.neardup import (
+    MultiIndexHash,
+    NearDuplicateConfig,
+    NearDuplicateIndex,
+    dhash,
+    hamming,
+)
+from gemini_vision.server import GeminiVisionServer
+
+
+def draw_scene(size=(400, 300), shapes=((50, 40, 200, 180), (220, 120, 380, 280))):
+    """A picture with enough structure for a meaningful hash."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for index, box in enumerate(shapes):
+        draw.rectangle(box, fill=(40 * index, 90, 200 - 60 * index))
+    draw.ellipse((120, 20, 300, 140), fill=(240, 200, 20))
+    return image
+
+
+class TestDHash:
+    """Test cases for the difference hash."""
+
+    def test_reencoded_copy_is_close(self, tmp_path):
+        """Test a JPEG, resized copy of a PNG hashes (almost) the same."""
+        draw_scene().save(tmp_path / "original.png")
+        draw_scene().resize((800, 600)).save(tmp_path / "copy.jpg", quality=70)
+
+        assert hamming(dhash(tmp_path / "original.png"), dhash(tmp_path / "copy.jpg")) <= 2
+
+    def test_different_image_is_far(self, tmp_path):
+        """Test an unrelated picture is far away."""
+        draw_scene().save(tmp_path / "a.png")
+        draw_scene(shapes=((0, 200, 400, 300),)).transpose(Image.FLIP_LEFT_RIGHT).save(
+            tmp_path / "b.png"
+        )
+
+        assert hamming(dhash(tmp_path / "a.png"), dhash(tmp_path / "b.png")) > 10
+
+
+class TestMultiIndexHash:
+    """Test cases for the multi-index hash table."""
+
+    def test_search_matches_brute_force(self):
+        """Test range queries find exactly the hashes a linear scan finds."""
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        # Near neighbours of the first few hashes
+        hashes += [h ^ (1 << rng.randrange(64)) for h in hashes[:50]]
+        table: MultiIndexHash[int] = MultiIndexHash(max_distance=4)
+        for index, value in enumerate(hashes):
+            table.add(value, index)
+
+        for query in hashes[:20] + [rng.getrandbits(64) for _ in range(5)]:
+            expected = sorted(
+                (hamming(query, value), index)
+                for index, value in enumerate(hashes)
+                if hamming(query, value) <= 4
+            )
+            assert sorted(table.search(query)) == expected
+
+    def test_shared_hash_and_discard(self):
+        """Test values sharing a hash are kept apart and can be removed."""
+        table: MultiIndexHash[str] = MultiIndexHash(max_distance=1)
+        table.add(0b1010, "a")
+        table.add(0b1010, "b")
+        table.add(0b1011, "c")
+        assert table.search(0b1010) == [(0, "a"), (0, "b"), (1, "c")]
+
+        table.discard(0b1010, "a")
+        table.discard(0b1011, "c")
+        assert table.search(0b1010) == [(0, "b")]
+        assert len(table) == 1
+
+
+def test_config_from_env():
+    """Test the index holds hundreds of thousands of images unless configured."""
+    with patch.dict(os.environ, {}, clear=True):
+        assert NearDuplicateConfig.from_env().max_entries == 250_000
+    env = {"GEMINI_VISION_NEAR_DUPLICATE_MAX_ENTRIES": "1000"}
+    with patch.dict(os.environ, env):
+        assert NearDuplicateConfig.from_env().max_entries == 1000
+
+
+class TestNearDuplicateIndex:
+    """Test cases for the persistent index."""
+
+    @pytest.mark.asyncio
+    async def test_context_and_persistence(self, tmp_path):
+        """Test lookups are limited to the same context and survive a restart."""
+        path = str(tmp_path / "cache.sqlite3")
+        config = NearDuplicateConfig(enabled=True, max_distance=2)
+        index = NearDuplicateIndex(config, path=path)
+        await index.add(0b1111, "context", "key-1")
+        await index.add(0xFFFF0000, "context", "key-2")
+        await index.close()
+
+        reopened = NearDuplicateIndex(config, path=path)
+        assert await reopened.find(0b0111, "context") == [(1, "key-1")]
+        assert await reopened.find(0b0111, "other") == []
+
+        await reopened.discard("context", "key-1")
+        assert await reopened.find(0b0111, "context") == []
+        assert reopened.stats()["entries"] == 1
+        await reopened.close()
+
+    @pytest.mark.asyncio
+    async def test_max_entries_evicts_least_recently_used(self, tmp_path):
+        """Test the index is capped in memory and on disk, keeping recently found entries."""
+        path = str(tmp_path / "cache.sqlite3")
+        config = NearDuplicateConfig(enabled=True, max_distance=0, max_entries=2)
+        index = NearDuplicateIndex(config, path=path)
+        await index.add(1, "context", "key-1")
+        await index.add(2, "context", "key-2")
+        assert await index.find(1, "context") == [(0, "key-1")]
+        await index.add(3, "context", "key-3")
+
+        assert await index.find(2, "context") == []
+        assert index.stats()["entries"] == 2
+        assert index.stats()["evictions"] == 1
+        await index.close()
+
+        reopened = NearDuplicateIndex(config, path=path)
+        assert await reopened.find(1, "context") == [(0, "key-1")]
+        assert await reopened.find(3, "context") == [(0, "key-3")]
+        assert reopened.stats()["entries"] == 2
+        await reopened.close()
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="A yellow circle over two rectangles") as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env(tmp_path):
+    return {
+        "GEMINI_VISION_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        "GEMINI_VISION_RETRY_ATTEMPTS": "1",
+        "GEMINI_VISION_NEAR_DUPLICATE": "true",
+    }
+
+
+class TestServerNearDuplicates:
+    """Test near-duplicate reuse in analyze_image against a local fake OpenRouter."""
+
+    @pytest.mark.asyncio
+    async def test_reuses_analysis_of_reencoded_copy(self, env, upstream, tmp_path):
+        """Test a re-saved copy is answered from the cache and flagged as a near-duplicate."""
+        draw_scene().save(tmp_path / "screenshot.png")
+        draw_scene().save(tmp_path / "screenshot.jpg", quality=80)
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+
+        try:
+            first = await server._analyze_image(str(tmp_path / "screenshot.png"), "Describe", temperature=0)
+            copy = await server._analyze_image(str(tmp_path / "screenshot.jpg"), "Describe", temperature=0)
+            other_prompt = await server._analyze_image(
+                str(tmp_path / "screenshot.jpg"), "Count the shapes", temperature=0
+            )
+        finally:
+            await server.close()
+
+        assert "Served from cache" not in first
+        assert copy.startswith("A yellow circle over two rectangles")
+        assert "near-duplicate of a previously analyzed image" in copy
+        assert "near-duplicate" not in other_prompt
+        assert len(upstream.requests) == 2
+        assert server.stats()["components"]["near_duplicates"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_survives_restart(self, env, upstream, tmp_path):
+        """Test the index is reloaded from the cache database."""
+        draw_scene().save(tmp_path / "a.png")
+        draw_scene().resize((300, 225)).save(tmp_path / "b.webp")
+        for name in ("a.png", "b.webp"):
+            with patch.dict(os.environ, env):
+                server = GeminiVisionServer()
+            try:
+                result = await server._analyze_image(str(tmp_path / name), "Describe", temperature=0)
+            finally:
+                await server.close()
+
+        assert "near-duplicate" in result
+        assert len(upstream.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, env, upstream, tmp_path):
+        """Test visually identical files are analyzed separately unless enabled."""
+        draw_scene().save(tmp_path / "a.png")
+        draw_scene().save(tmp_path / "b.jpg")
+        del env["GEMINI_VISION_NEAR_DUPLICATE"]
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+
+        try:
+            for name in ("a.png", "b.jpg"):
+                await server._analyze_image(str(tmp_path / name), "Describe", temperature=0)
+        finally:
+            await server.close()
+
+        assert len(upstream.requests) == 2
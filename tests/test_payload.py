@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: MIT
+"""Tests for request body construction."""
+
+import base64
+import json
+import os
+
+import pytest
+
+from gemini_vision.payload import encode_base64, encode_body, image_part
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 196607, 196608, 196609, 500000])
+def test_encode_base64_matches_stdlib(size):
+    """Test chunked encoding matches base64.b64encode at chunk boundaries."""
+    data = os.urandom(size)
+    assert bytes(encode_base64(data)) == base64.b64encode(data)
+
+
+def test_encode_body_splices_images():
+    """Test image data is spliced into the serialized payload."""
+    payload = {
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": 'Compare "these"'},
+                    image_part("image/png", 0),
+                    image_part("image/webp", 1),
+                ],
+            }
+        ]
+    }
+    body = encode_body(payload, ["QUJD", bytearray(b"REVG")])
+
+    parts = json.loads(body)["messages"][0]["content"]
+    assert parts[0]["text"] == 'Compare "these"'
+    assert parts[1]["image_url"]["url"] == "data:image/png;base64,QUJD"
+    assert parts[2]["image_url"]["url"] == "data:image/webp;base64,REVG"
+
+
+def test_encode_body_missing_placeholder():
+    """Test a missing placeholder is reported."""
+    with pytest.raises(ValueError, match="placeholder for image 0"):
+        encode_body({"messages": []}, [b"QUJD"])
+
+
+def test_encode_body_ignores_marker_like_text():
+    """Test text that looks like a placeholder is left alone."""
+    payload = {
+        "content": [
+            {"type": "text", "text": "what does @@gemini-vision-image-0@@ mean"},
+            image_part("image/png", 0),
+        ]
+    }
+    parts = json.loads(encode_body(payload, [b"QUJD"]))["content"]
+
+    assert parts[0]["text"] == "what does @@gemini-vision-image-0@@ mean"
+    assert parts[1]["image_url"]["url"] == "data:image/png;base64,QUJD"
+
+
+def test_encode_body_repeated_placeholder():
+    """Test a placeholder copied into other text is refused instead of spliced there."""
+    part = image_part("image/png", 0)
+    payload = {"content": [{"type": "text", "text": part["image_url"]["url"]}, part]}
+    with pytest.raises(ValueError, match="2 placeholders for image 0"):
+        encode_body(payload, [b"QUJD"])
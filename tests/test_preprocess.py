@@ -0,0 +1,120 @@
+# SPDX-License-Identifier: MIT
+"""Tests for image preprocessing."""
+
+import io
+import os
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from gemini_vision.preprocess import PreprocessOptions, preprocess_image
+
+
+def make_png(size=(3000, 1500), mode="RGB", color=(200, 30, 30)):
+    """Create PNG bytes with some detail so re-encoding is not trivial."""
+    img = Image.new(mode, size, color)
+    for x in range(0, size[0], 37):
+        for y in range(0, size[1], 41):
+            img.putpixel((x, y), (0, 0, 0) if mode == "RGB" else (0, 0, 0, 0))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestPreprocessOptions:
+    """Test cases for PreprocessOptions."""
+
+    def test_from_env(self):
+        """Test options are read from the environment."""
+        env = {
+            "GEMINI_VISION_MAX_EDGE": "1024",
+            "GEMINI_VISION_OUTPUT_FORMAT": "JPEG",
+            "GEMINI_VISION_QUALITY": "70",
+        }
+        with patch.dict(os.environ, env, clear=True):
+            options = PreprocessOptions.from_env()
+        assert options.max_edge == 1024
+        assert options.output_format == "jpeg"
+        assert options.quality == 70
+
+    def test_with_overrides(self):
+        """Test per-call arguments override defaults."""
+        options = PreprocessOptions().with_overrides(
+            {"preprocess": False, "max_edge": 512, "prompt": "ignored"}
+        )
+        assert not options.enabled
+        assert options.max_edge == 512
+        assert PreprocessOptions().with_overrides({}) == PreprocessOptions()
+
+    def test_invalid_overrides(self):
+        """Test bad values are rejected."""
+        with pytest.raises(ValueError, match="Unsupported output format"):
+            PreprocessOptions().with_overrides({"output_format": "bmp"})
+        with pytest.raises(ValueError, match="quality"):
+            PreprocessOptions().with_overrides({"quality": 0})
+
+    def test_cache_token(self):
+        """Test disabled preprocessing collapses to a single cache token."""
+        assert PreprocessOptions(enabled=False, max_edge=1).cache_token() == {
+            "enabled": False
+        }
+        assert PreprocessOptions().cache_token()["max_edge"] == 2048
+
+
+class TestPreprocessImage:
+    """Test cases for preprocess_image."""
+
+    def test_downscales_longest_edge(self):
+        """Test large images are capped at max_edge and re-encoded."""
+        data = make_png()
+        prepared = preprocess_image(data, PreprocessOptions(max_edge=1000))
+
+        assert prepared is not None
+        assert prepared.mime_type == "image/webp"
+        assert (prepared.width, prepared.height) == (1000, 500)
+        assert prepared.original_size == len(data)
+        assert len(prepared.data) < len(data)
+
+    def test_flattens_alpha_and_strips_metadata(self):
+        """Test transparent images become RGB JPEGs without EXIF."""
+        img = Image.new("RGBA", (3000, 100), (0, 0, 255, 0))
+        exif = Image.Exif()
+        exif[0x010E] = "secret description"
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", exif=exif)
+
+        prepared = preprocess_image(
+            buffer.getvalue(), PreprocessOptions(max_edge=1500, output_format="jpeg")
+        )
+
+        with Image.open(io.BytesIO(prepared.data)) as result:
+            assert result.format == "JPEG"
+            assert result.mode == "RGB"
+            assert result.getpixel((10, 10)) == pytest.approx((255, 255, 255), abs=2)
+            assert not result.getexif()
+
+    def test_byte_budget(self):
+        """Test quality and size are reduced until the budget is met."""
+        data = make_png()
+        prepared = preprocess_image(
+            data, PreprocessOptions(max_edge=0, max_bytes=20_000)
+        )
+        assert len(prepared.data) <= 20_000
+
+    def test_small_image_kept_when_not_smaller(self, tmp_path):
+        """Test tiny images are sent unchanged when re-encoding does not help."""
+        path = tmp_path / "tiny.png"
+        Image.new("RGB", (4, 4), "red").save(path)
+        assert preprocess_image(path, PreprocessOptions(output_format="jpeg")) is None
+
+    def test_disabled(self):
+        """Test disabled preprocessing returns None."""
+        assert preprocess_image(make_png(), PreprocessOptions(enabled=False)) is None
+
+    def test_animated_images_are_skipped(self):
+        """Test animated images are sent unchanged."""
+        frames = [Image.new("RGB", (3000, 10), c) for c in ("red", "blue")]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:])
+        assert preprocess_image(buffer.getvalue(), PreprocessOptions()) is None
@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: MIT
+"""Tests for header-only image probing."""
+
+import base64
+import io
+import os
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from gemini_vision.preprocess import PreprocessOptions
+from gemini_vision.probe import ImageInfo, format_for_suffix, probe_image
+
+
+def frames(size=(50, 40), colors=("red", "green", "blue")):
+    return [Image.new("RGB", size, color) for color in colors]
+
+
+class TestProbeImage:
+    """Test cases for reading formats and sizes from headers."""
+
+    @pytest.mark.parametrize(
+        "name, fmt, params",
+        [
+            ("image.png", "png", {}),
+            ("image.jpg", "jpeg", {}),
+            ("image.gif", "gif", {}),
+            ("lossy.webp", "webp", {}),
+            ("lossless.webp", "webp", {"lossless": True}),
+            ("image.avif", "avif", {}),
+        ],
+    )
+    def test_formats_and_dimensions(self, tmp_path, name, fmt, params):
+        """Test every supported format is recognized with its size."""
+        path = tmp_path / name
+        Image.new("RGB", (321, 123), "red").save(path, **params)
+
+        assert probe_image(path) == ImageInfo(fmt, 321, 123, 1)
+        assert probe_image(path).mime_type == f"image/{fmt}"
+
+    def test_extended_webp(self, tmp_path):
+        """Test a WebP with alpha (VP8X header) reports its canvas size."""
+        path = tmp_path / "alpha.webp"
+        Image.new("RGBA", (77, 66), (0, 0, 0, 0)).save(path)
+
+        assert probe_image(path) == ImageInfo("webp", 77, 66, 1)
+
+    def test_jpeg_size_after_large_metadata(self, tmp_path):
+        """Test the JPEG frame header is found past a large EXIF segment."""
+        exif = Image.Exif()
+        exif[0x010E] = "x" * 60000
+        path = tmp_path / "exif.jpg"
+        Image.new("RGB", (640, 480)).save(path, exif=exif)
+
+        assert probe_image(path) == ImageInfo("jpeg", 640, 480, 1)
+
+    @pytest.mark.parametrize(
+        "name, expected_frames", [("anim.png", 3), ("anim.webp", 3), ("anim.gif", None)]
+    )
+    def test_animations(self, tmp_path, name, expected_frames):
+        """Test animations are flagged, with a frame count where the header gives one."""
+        path = tmp_path / name
+        first, *rest = frames()
+        first.save(path, save_all=True, append_images=rest, duration=100)
+
+        info = probe_image(path)
+        assert info.frames == expected_frames
+        assert info.animated
+        assert (info.width, info.height) == (50, 40)
+
+    def test_unrecognized(self, tmp_path):
+        """Test files without a known signature are not identified."""
+        path = tmp_path / "fake.png"
+        path.write_bytes(b"not an image at all")
+        assert probe_image(path) is None
+
+    def test_format_for_suffix(self):
+        """Test extensions map to the format they claim."""
+        assert format_for_suffix(".JPG") == "jpeg"
+        assert format_for_suffix(".webp") == "webp"
+        assert format_for_suffix(".txt") is None
+
+
+class TestServerProbe:
+    """Test the server acts on probed headers before reading images."""
+
+    def test_mislabeled_image_sent_as_real_format(self, server, tmp_path):
+        """Test a JPEG named .png is identified as JPEG."""
+        path = tmp_path / "photo.png"
+        Image.new("RGB", (64, 64), "red").save(path, format="JPEG")
+
+        _, _, info = server._inspect_image(str(path))
+        assert info.mime_type == "image/jpeg"
+
+    def test_rejects_before_reading(self, server, tmp_path):
+        """Test non-images and images over the pixel limit are rejected from their header."""
+        junk = tmp_path / "junk.webp"
+        junk.write_bytes(b"\0" * 4096)
+        large = tmp_path / "large.png"
+        Image.new("1", (4000, 3000)).save(large)
+        server.max_image_pixels = 10_000_000
+
+        with pytest.raises(ValueError, match="Not a PNG, JPEG, GIF, WebP or AVIF image"):
+            server._inspect_image(str(junk))
+        with pytest.raises(ValueError, match=r"4000x3000 pixels \(12.0 MP, max 10.0 MP\)"):
+            server._inspect_image(str(large))
+
+    @pytest.mark.asyncio
+    async def test_oversized_original_is_downscaled(self, server, tmp_path):
+        """Test an image over the payload budget is recompressed even with preprocessing off."""
+        path = tmp_path / "noise.png"
+        Image.frombytes("RGB", (512, 512), os.urandom(512 * 512 * 3)).save(path)
+        server.max_payload_bytes = path.stat().st_size // 2
+
+        with patch.object(server, "_call_gemini_api", return_value="Result") as mock_api:
+            await server._analyze_image(
+                str(path), "Describe", preprocess=PreprocessOptions(enabled=False)
+            )
+
+        data, mime_type = mock_api.call_args.args[1:3]
+        assert mime_type == "image/webp"
+        assert len(data) <= server.max_payload_bytes
+        with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+            assert image.format == "WEBP"
@@ -0,0 +1,132 @@
+# SPDX-License-Identifier: MIT
+"""Tests for answering several questions about one image in one request."""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from PIL import Image
+
+from gemini_vision.questions import ask_many_prompt, parse_answers
+
+QUESTIONS = ["What color is it?", "What shape is it?", "Is there text?"]
+
+
+class TestPrompt:
+    """Test cases for building the combined prompt and reading its reply."""
+
+    def test_prompt_numbers_questions(self):
+        """Test every question is numbered and the answer count is stated."""
+        prompt = ask_many_prompt(QUESTIONS)
+        assert "Question 1: What color is it?" in prompt
+        assert "Question 3: Is there text?" in prompt
+        assert "exactly 3 strings" in prompt
+
+    @pytest.mark.parametrize(
+        "reply",
+        [
+            '{"answers": ["Red", "Square", "No"]}',
+            '```json\n{"answers": ["Red", "Square", "No"]}\n```',
+            'Here you go:\n["Red", "Square", "No"]',
+            '{"answers": [{"question": "color", "answer": "Red"}, "Square", " No "]}',
+        ],
+    )
+    def test_parses_answers(self, reply):
+        """Test plain, fenced, bare-list and wrapped answers are accepted."""
+        assert parse_answers(reply, 3) == (["Red", "Square", "No"], "")
+
+    def test_keeps_trailing_notes(self):
+        """Test text after the JSON, such as the cache label, is returned separately."""
+        reply = '{"answers": ["Red", "Square"]}\n\n[Served from cache]'
+        assert parse_answers(reply, 2) == (["Red", "Square"], "[Served from cache]")
+
+    @pytest.mark.parametrize(
+        "reply",
+        [
+            "The image shows a red square.",
+            '{"answers": ["Red", "Square"]}',
+            '{"answers": ["Red", "Square", 3]}',
+            '{"answers": ["Red", "Square", "No"',
+        ],
+    )
+    def test_rejects_malformed(self, reply):
+        """Test prose, wrong counts, non-text answers and truncated JSON are rejected."""
+        assert parse_answers(reply, 3) is None
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(
+        reply=json.dumps({"answers": ["Red", "Square", "No"]})
+    ) as fake:
+        yield fake
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGB", (64, 64), color="red").save(path)
+    return path
+
+
+def ask_many(image, questions=QUESTIONS):
+    request = MagicMock()
+    request.params.name = "ask_many"
+    request.params.arguments = {
+        "image_path": str(image),
+        "questions": questions,
+        "temperature": 0,
+    }
+    return request
+
+
+class TestAskMany:
+    """Test the ask_many tool against a local fake OpenRouter."""
+
+    @pytest.mark.asyncio
+    async def test_one_request_for_all_questions(self, server, upstream, image):
+        """Test the image is uploaded once and each question gets its own answer."""
+        result = await server.call_tool(ask_many(image))
+        cached = await server.call_tool(ask_many(image))
+
+        assert not result.isError
+        assert len(upstream.requests) == 1
+        texts = [part.text for part in result.content]
+        assert "3 of 3 questions answered" in texts[0]
+        assert texts[1] == "[1] Question: What color is it?\n\nAnswer:\nRed"
+        assert texts[3].endswith("Answer:\nNo")
+        assert "[Served from cache]" in cached.content[0].text
+        assert cached.content[2].text.endswith("Answer:\nSquare")
+        assert server.stats()["components"]["ask_many"]["combined"] == 2
+
+    @pytest.mark.asyncio
+    async def test_unparseable_reply_falls_back_to_separate_calls(
+        self, server, upstream, image
+    ):
+        """Test a reply without the JSON answers is replaced by one request per question."""
+        upstream.reply = "A red square."
+        result = await server.call_tool(ask_many(image))
+        first_requests = len(upstream.requests)
+        # The unparseable combined reply is not cached; the separate answers are
+        await server.call_tool(ask_many(image))
+
+        assert first_requests == 1 + len(QUESTIONS)
+        assert len(upstream.requests) == first_requests + 1
+        prompts = [
+            request["messages"][0]["content"][0]["text"]
+            for request in upstream.requests[1:first_requests]
+        ]
+        assert sorted(prompts) == sorted(QUESTIONS)
+        assert all(part.text.endswith("A red square.") for part in result.content[1:])
+        assert server.stats()["components"]["ask_many"]["fallbacks"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_bad_questions(self, server, image):
+        """Test an empty or non-text question list is an error."""
+        empty = await server.call_tool(ask_many(image, []))
+        numbers = await server.call_tool(ask_many(image, [1, 2]))
+
+        assert empty.isError and numbers.isError
+        assert "questions parameter" in numbers.content[0].text
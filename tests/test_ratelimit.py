@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the adaptive client-side rate limiter."""
+
+import asyncio
+import time
+
+import pytest
+from fake_openrouter import FakeOpenRouter
+
+from gemini_vision.ratelimit import AdaptiveLimiter, RateLimitConfig
+
+
+class TestAdaptiveLimiter:
+    """Test cases for AdaptiveLimiter."""
+
+    @pytest.mark.asyncio
+    async def test_window_bounds_concurrency_and_queues(self):
+        """Test requests beyond the window wait rather than fail."""
+        limiter = AdaptiveLimiter(RateLimitConfig(initial_window=2, max_window=2))
+        active = 0
+        peak = 0
+
+        async def request():
+            nonlocal active, peak
+            async with limiter.slot() as permit:
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+                permit.success()
+
+        tasks = [asyncio.ensure_future(request()) for _ in range(6)]
+        await asyncio.sleep(0.001)
+        assert limiter.stats()["queue_depth"] == 4
+        await asyncio.gather(*tasks)
+
+        stats = limiter.stats()
+        assert peak == 2
+        assert stats["admitted"] == 6
+        assert stats["queue_depth"] == 0
+        assert stats["in_flight"] == 0
+        assert stats["max_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_additive_increase_multiplicative_decrease(self):
+        """Test the window grows on success and halves on a 429."""
+        limiter = AdaptiveLimiter(RateLimitConfig(initial_window=4, max_window=8))
+
+        for _ in range(4):
+            async with limiter.slot() as permit:
+                permit.success()
+        assert 4.9 < limiter.window < 5.0
+
+        async with limiter.slot() as permit:
+            permit.throttled()
+        assert limiter.window == pytest.approx(limiter.stats()["window"], abs=0.01)
+        assert limiter.window < 2.5
+        assert limiter.stats()["throttled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_window_respects_bounds(self):
+        """Test the window never drops below min_window or exceeds max_window."""
+        limiter = AdaptiveLimiter(
+            RateLimitConfig(initial_window=2, min_window=1, max_window=3)
+        )
+        for _ in range(5):
+            async with limiter.slot() as permit:
+                permit.throttled()
+        assert limiter.window == 1
+
+        for _ in range(50):
+            async with limiter.slot() as permit:
+                permit.success()
+        assert limiter.window == 3
+
+    @pytest.mark.asyncio
+    async def test_latency_spike_shrinks_window(self):
+        """Test a request far slower than the moving average shrinks the window."""
+        limiter = AdaptiveLimiter(RateLimitConfig(initial_window=8, latency_factor=3.0))
+        for _ in range(6):
+            limiter._on_success(0.01)
+        before = limiter.window
+
+        limiter._on_success(0.5)
+
+        assert limiter.window == pytest.approx(before / 2)
+        assert limiter.stats()["latency_decreases"] == 1
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_paces_requests(self):
+        """Test requests past the burst are spaced at the configured rate."""
+        limiter = AdaptiveLimiter(RateLimitConfig(rate=50.0, burst=2))
+        started = time.monotonic()
+
+        for _ in range(6):
+            async with limiter.slot():
+                pass
+
+        # Two from the burst, then four at 50/s
+        assert time.monotonic() - started >= 0.07
+
+    @pytest.mark.asyncio
+    async def test_retry_after_pauses_admission(self):
+        """Test a 429 with Retry-After holds back the next request."""
+        limiter = AdaptiveLimiter()
+        async with limiter.slot() as permit:
+            permit.throttled(0.05)
+
+        started = time.monotonic()
+        async with limiter.slot():
+            pass
+
+        assert time.monotonic() - started >= 0.04
+
+    def test_from_env(self, monkeypatch):
+        """Test the limiter config is read from the environment."""
+        monkeypatch.setenv("GEMINI_VISION_RATE_LIMIT", "2.5")
+        monkeypatch.setenv("GEMINI_VISION_RATE_BURST", "3")
+        monkeypatch.setenv("GEMINI_VISION_WINDOW_INITIAL", "4")
+        monkeypatch.setenv("GEMINI_VISION_WINDOW_MAX", "16")
+
+        config = RateLimitConfig.from_env()
+
+        assert config.rate == 2.5
+        assert config.burst == 3
+        assert config.initial_window == 4
+        assert config.max_window == 16
+
+
+class TestServerRateLimiting:
+    """Test the limiter in front of the upstream call."""
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_response_shrinks_window(self, monkeypatch):
+        """Test a 429 from the upstream shrinks the window and the call still succeeds."""
+        from gemini_vision.server import GeminiVisionServer
+
+        monkeypatch.setenv("OPENROUTER_API_KEY", "test_key")
+        monkeypatch.setenv("GEMINI_VISION_CACHE_PATH", "none")
+        monkeypatch.setenv("GEMINI_VISION_RETRY_BASE_DELAY", "0")
+
+        async with FakeOpenRouter() as upstream:
+            upstream.failures = [429]
+            monkeypatch.setenv("OPENROUTER_BASE_URL", upstream.base_url)
+            server = GeminiVisionServer()
+            try:
+                result = await server._call_gemini_api("Describe", b"aGk=", "image/png")
+            finally:
+                await server.close()
+
+        stats = server.rate_limiter.stats()
+        assert result == upstream.reply
+        assert stats["throttled"] == 1
+        assert stats["admitted"] == 2
+        assert stats["window"] < RateLimitConfig.initial_window
@@ -0,0 +1,239 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the retry engine and circuit breaker."""
+
+import asyncio
+import email.utils
+import time
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+
+from gemini_vision.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryEngine,
+    RetryPolicy,
+    UpstreamError,
+    classify,
+    parse_retry_after,
+)
+
+
+def fast_policy(**overrides):
+    """A policy with tiny delays for tests."""
+    values = {"max_attempts": 4, "base_delay": 0.001, "max_delay": 0.01, "deadline": 5.0}
+    values.update(overrides)
+    return RetryPolicy(**values)
+
+
+class TestClassification:
+    """Test cases for error classification and Retry-After parsing."""
+
+    def test_classify(self):
+        """Test transient errors are retryable and others are fatal."""
+        assert classify(UpstreamError("busy", status=503, retryable=True))
+        assert not classify(UpstreamError("bad key", status=401))
+        assert classify(asyncio.TimeoutError())
+        assert classify(aiohttp.ServerDisconnectedError())
+        assert classify(ConnectionResetError())
+        assert not classify(CircuitOpenError("open", retryable=True))
+        assert not classify(ValueError("bug"))
+
+    def test_parse_retry_after(self):
+        """Test seconds and HTTP-date forms are understood."""
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+        future = email.utils.formatdate(time.time() + 30, usegmt=True)
+        assert 25 < parse_retry_after(future) <= 30
+
+
+class TestRetryEngine:
+    """Test cases for RetryEngine."""
+
+    @pytest.mark.asyncio
+    async def test_retries_until_success(self):
+        """Test transient failures are retried."""
+        engine = RetryEngine(fast_policy())
+        attempts = []
+
+        async def attempt():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise UpstreamError("busy", status=502, retryable=True)
+            return "ok"
+
+        assert await engine.run(attempt) == "ok"
+        assert len(attempts) == 3
+        assert engine.stats()["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_fatal_errors_are_not_retried(self):
+        """Test 4xx errors fail immediately."""
+        engine = RetryEngine(fast_policy())
+        attempts = []
+
+        async def attempt():
+            attempts.append(1)
+            raise UpstreamError("unauthorized", status=401)
+
+        with pytest.raises(UpstreamError, match="unauthorized"):
+            await engine.run(attempt)
+        assert len(attempts) == 1
+
+    @pytest.mark.asyncio
+    async def test_honors_retry_after_and_deadline(self):
+        """Test Retry-After sets the delay and the deadline stops retrying."""
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+
+        engine = RetryEngine(fast_policy(deadline=10.0), sleep=sleep)
+
+        async def attempt():
+            raise UpstreamError("slow down", status=429, retryable=True, retry_after=4.0)
+
+        with pytest.raises(UpstreamError):
+            await engine.run(attempt)
+        # Every wait is at least what the upstream asked for
+        assert delays and all(delay >= 4.0 for delay in delays)
+
+        # A Retry-After beyond the deadline gives up without waiting
+        delays.clear()
+        engine = RetryEngine(fast_policy(deadline=3.0), sleep=sleep)
+        with pytest.raises(UpstreamError):
+            await engine.run(attempt)
+        assert delays == []
+        assert engine.stats()["gave_up"] == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_fails_fast(self):
+        """Test the circuit opens after repeated failures and recovers."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        engine = RetryEngine(fast_policy(max_attempts=1), breaker)
+        healthy = False
+        attempts = []
+
+        async def attempt():
+            attempts.append(1)
+            if not healthy:
+                raise UpstreamError("down", status=503, retryable=True)
+            return "ok"
+
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                await engine.run(attempt)
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            await engine.run(attempt)
+        assert len(attempts) == 2
+
+        await asyncio.sleep(0.06)
+        healthy = True
+        assert await engine.run(attempt) == "ok"
+        assert breaker.state == "closed"
+        assert breaker.stats()["opened"] == 1
+        assert breaker.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_breaker_per_upstream(self):
+        """Test failures of one upstream open only that upstream's circuit."""
+        engine = RetryEngine(fast_policy(max_attempts=1), CircuitBreaker(failure_threshold=1))
+
+        async def failing():
+            raise UpstreamError("down", status=503, retryable=True)
+
+        async def healthy():
+            return "ok"
+
+        with pytest.raises(UpstreamError):
+            await engine.run(failing, upstream="pro")
+        assert not engine.breaker_for("pro").allows_calls()
+        with pytest.raises(CircuitOpenError):
+            await engine.run(healthy, upstream="pro")
+
+        assert engine.breaker_for("flash").allows_calls()
+        assert await engine.run(healthy, upstream="flash") == "ok"
+        circuits = engine.stats()["circuits"]
+        assert (circuits["pro"]["state"], circuits["flash"]["state"]) == ("open", "closed")
+
+    @pytest.mark.asyncio
+    async def test_half_open_failure_reopens(self):
+        """Test a failed trial call opens the circuit again."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+
+        breaker.before_call()
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError, match="trial"):
+            breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="Recovered analysis") as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env():
+    return {
+        "GEMINI_VISION_RETRY_BASE_DELAY": "0.001",
+        "GEMINI_VISION_RETRY_MAX_DELAY": "0.01",
+        "GEMINI_VISION_BREAKER_THRESHOLD": "3",
+    }
+
+
+class TestServerRetries:
+    """Test retries against a local fake OpenRouter server."""
+
+    @pytest.mark.asyncio
+    async def test_recovers_from_transient_errors(self, server, upstream):
+        """Test 429 and 502 responses are retried transparently."""
+        upstream.failures = [429, 502]
+        upstream.retry_after = "0"
+
+        result = await server._call_gemini_api("prompt", "aGVsbG8=", "image/png")
+
+        assert result == "Recovered analysis"
+        assert len(upstream.requests) == 3
+        assert server.retry_engine.stats()["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_streamed_call_is_retried(self, server, upstream):
+        """Test a streamed call failing before any output is retried."""
+        upstream.failures = [503]
+
+        result = await server._call_gemini_api(
+            "prompt", "aGVsbG8=", "image/png", stream=True
+        )
+
+        assert result == "Recovered analysis"
+
+    @pytest.mark.asyncio
+    async def test_auth_errors_are_fatal(self, server, upstream):
+        """Test a 401 is not retried."""
+        upstream.failures = [401]
+
+        with pytest.raises(UpstreamError, match="API request failed: 401"):
+            await server._call_gemini_api("prompt", "aGVsbG8=", "image/png")
+        assert len(upstream.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_connection_errors_open_circuit(self, server):
+        """Test an unreachable upstream trips the breaker and then fails fast."""
+        server.base_url = "http://127.0.0.1:9"
+        server.retry_engine.policy.max_attempts = 3
+
+        with pytest.raises(UpstreamError, match="Network error"):
+            await server._call_gemini_api("prompt", "aGVsbG8=", "image/png")
+        with pytest.raises(CircuitOpenError):
+            await server._call_gemini_api("prompt", "aGVsbG8=", "image/png")
+        assert server.retry_engine.breaker_for(server.model_router.primary).state == "open"
@@ -0,0 +1,254 @@
+# SPDX-License-Identifier: MIT
+"""Tests for hedged, multi-model request routing."""
+
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from PIL import Image
+
+from gemini_vision.retry import UpstreamError
+from gemini_vision.routing import ModelRouter, RoutingConfig, collect_models
+from gemini_vision.server import GeminiVisionServer
+
+
+def router(*models, **settings):
+    settings.setdefault("max_delay", 0.05)
+    return ModelRouter(RoutingConfig(models=models, **settings))
+
+
+def answer(text, delay=0.0, error=None):
+    """A fake model: answers ``text`` after ``delay`` seconds, or raises ``error``."""
+
+    async def call(claim):
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return text
+
+    return call
+
+
+def models(**behaviour):
+    async def call(model, claim):
+        return await behaviour[model](claim)
+
+    return call
+
+
+class TestConfig:
+    """Test cases for routing settings."""
+
+    def test_from_env(self):
+        """Test the model list and hedge settings come from the environment."""
+        env = {
+            "GEMINI_VISION_MODELS": "pro, flash ,",
+            "GEMINI_VISION_HEDGE_QUANTILE": "0.9",
+            "GEMINI_VISION_HEDGE_MIN_DELAY": "0.5",
+        }
+        with patch.dict(os.environ, env):
+            config = RoutingConfig.from_env("default")
+        assert config.models == ("pro", "flash")
+        assert (config.quantile, config.min_delay) == (0.9, 0.5)
+
+        with patch.dict(os.environ, {}, clear=True):
+            assert RoutingConfig.from_env("default").models == ("default",)
+
+    def test_hedge_delay_tracks_latency(self):
+        """Test the delay is max_delay until enough samples, then the clamped quantile."""
+        routing = router("pro", "flash", min_samples=10, min_delay=0.2, max_delay=5.0)
+        assert routing.hedge_delay("pro") == 5.0
+
+        for index in range(100):
+            routing._stats["pro"].latency.observe(0.01 * index)
+        assert routing.hedge_delay("pro") == pytest.approx(0.94)
+
+        routing._stats["flash"].latency.observe(0.01)
+        assert routing.hedge_delay("flash") == 5.0
+        for _ in range(10):
+            routing._stats["flash"].latency.observe(0.01)
+        assert routing.hedge_delay("flash") == 0.2
+
+
+class TestModelRouter:
+    """Test cases for racing models."""
+
+    @pytest.mark.asyncio
+    async def test_hedges_slow_primary(self):
+        """Test a slow primary is hedged, the fallback's answer wins and the primary is cancelled."""
+        routing = router("pro", "flash")
+        started = time.perf_counter()
+        with collect_models() as answered:
+            result = await routing.run(models(pro=answer("pro", 5), flash=answer("flash")))
+
+        assert result == "flash"
+        assert time.perf_counter() - started < 1
+        assert answered == ["flash"]
+        stats = routing.stats()["models"]
+        assert stats["pro"]["hedged"] == 1
+        assert stats["pro"]["cancelled"] == 1
+        assert stats["flash"]["wins"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_not_hedged(self):
+        """Test an answer within the hedge delay sends nothing else."""
+        routing = router("pro", "flash")
+        result = await routing.run(models(pro=answer("pro"), flash=answer("flash")))
+
+        assert result == "pro"
+        assert routing.stats()["models"]["flash"]["requests"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failure_falls_back_and_all_failing_raises_first_error(self):
+        """Test a failed model hands over at once; if all fail the primary's error is raised."""
+        routing = router("pro", "flash", max_delay=10)
+        result = await routing.run(
+            models(pro=answer("", error=UpstreamError("pro down")), flash=answer("flash"))
+        )
+        assert result == "flash"
+
+        with pytest.raises(UpstreamError, match="pro down"):
+            await routing.run(
+                models(
+                    pro=answer("", error=UpstreamError("pro down")),
+                    flash=answer("", error=UpstreamError("flash down")),
+                )
+            )
+
+    @pytest.mark.asyncio
+    async def test_unavailable_models_skipped(self):
+        """Test a model reported unavailable is not asked, unless no model is available."""
+        routing = router("pro", "flash")
+        calls = models(
+            pro=answer("", error=UpstreamError("circuit open")), flash=answer("flash")
+        )
+
+        assert await routing.run(calls, available=lambda model: model != "pro") == "flash"
+        stats = routing.stats()["models"]
+        assert (stats["pro"]["requests"], stats["pro"]["skipped"]) == (0, 1)
+
+        with pytest.raises(UpstreamError, match="circuit open"):
+            await routing.run(calls, available=lambda model: False)
+        assert routing.stats()["models"]["flash"]["requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_hedging_disabled(self):
+        """Test hedge=false only moves on after a failure."""
+        routing = router("pro", "flash", hedge=False)
+        result = await routing.run(models(pro=answer("pro", 0.2), flash=answer("flash")))
+
+        assert result == "pro"
+        assert routing.stats()["hedging"] is False
+
+    @pytest.mark.asyncio
+    async def test_first_stream_owns_output(self):
+        """Test the model that starts emitting first wins; the other is cancelled."""
+        emitted = []
+
+        def streaming(name, first, rest):
+            async def call(claim):
+                await asyncio.sleep(first)
+                if claim():
+                    emitted.append(name)
+                await asyncio.sleep(rest)
+                return name
+
+            return call
+
+        routing = router("pro", "flash", max_delay=0.01)
+        result = await routing.run(
+            models(pro=streaming("pro", 0.05, 0.1), flash=streaming("flash", 0.1, 0))
+        )
+
+        assert result == "pro"
+        assert emitted == ["pro"]
+        assert routing.stats()["models"]["flash"]["cancelled"] == 1
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="Answer from the primary") as fake:
+        fake.model_replies["fallback/flash"] = "Answer from the fallback"
+        yield fake
+
+
+@pytest.fixture
+def server_env():
+    return {"GEMINI_VISION_MODELS": "primary/pro,fallback/flash"}
+
+
+class TestServerRouting:
+    """Test model routing in the server against a local fake OpenRouter."""
+
+    @pytest.mark.asyncio
+    async def test_failing_primary_does_not_block_fallback(
+        self, env, upstream, tmp_path
+    ):
+        """Test a primary returning 503s opens only its own circuit; the fallback answers."""
+        upstream.model_status["primary/pro"] = 503
+        image = tmp_path / "image.png"
+        Image.new("RGB", (64, 64), color="red").save(image)
+        env.update(
+            {
+                "GEMINI_VISION_RETRY_ATTEMPTS": "2",
+                "GEMINI_VISION_RETRY_BASE_DELAY": "0.001",
+                "GEMINI_VISION_BREAKER_THRESHOLD": "2",
+            }
+        )
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+
+        try:
+            results = await asyncio.gather(
+                *(
+                    server._analyze_image(str(image), f"Describe {n}", use_cache=False)
+                    for n in range(4)
+                )
+            )
+            later = await server._analyze_image(str(image), "Describe", use_cache=False)
+        finally:
+            await server.close()
+
+        assert all(result.startswith("Answer from the fallback") for result in results)
+        assert later.startswith("Answer from the fallback")
+        circuits = server.stats()["components"]["retry"]["circuits"]
+        assert circuits["primary/pro"]["state"] == "open"
+        assert circuits["fallback/flash"]["state"] == "closed"
+        # Once the primary's circuit is open it is skipped without a request
+        routing = server.stats()["components"]["routing"]["models"]
+        assert routing["primary/pro"]["skipped"] >= 1
+        assert [request["model"] for request in upstream.requests][-1] == "fallback/flash"
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_answered_by_fallback(self, env, upstream, tmp_path):
+        """Test a slow primary is hedged, and the answer and cache record the fallback."""
+        upstream.model_latency["primary/pro"] = 2.0
+        image = tmp_path / "image.png"
+        Image.new("RGB", (64, 64), color="red").save(image)
+        env["GEMINI_VISION_HEDGE_MAX_DELAY"] = "0.1"
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+
+        try:
+            started = time.perf_counter()
+            result = await server._analyze_image(str(image), "Describe", temperature=0)
+            elapsed = time.perf_counter() - started
+            cached = await server._analyze_image(str(image), "Describe", temperature=0)
+        finally:
+            await server.close()
+
+        assert elapsed < 1.5
+        assert result.startswith("Answer from the fallback")
+        assert "[Answered by fallback model fallback/flash]" in result
+        assert "Served from cache" in cached
+        assert [request["model"] for request in upstream.requests] == [
+            "primary/pro",
+            "fallback/flash",
+        ]
+        routing = server.stats()["components"]["routing"]["models"]
+        assert routing["primary/pro"]["hedged"] == 1
+        assert routing["fallback/flash"]["wins"] == 1
@@ -5,7 +5,9 @@ import asyncio
 import base64
 import json
 import os
+import struct
 import tempfile
+import tracemalloc
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -28,13 +30,6 @@ def temp_image():
     os.unlink(tmp.name)
 
 
-@pytest.fixture
-def server():
-    """Create a test server instance."""
-    with patch.dict(os.environ, {"OPENROUTER_API_KEY": "test_key"}):
-        return GeminiVisionServer()
-
-
 class TestGeminiVisionServer:
     """Test cases for GeminiVisionServer."""
     
@@ -53,10 +48,32 @@ class TestGeminiVisionServer:
     async def test_list_tools(self, server):
         """Test listing available tools."""
         tools = await server.list_tools()
-        assert len(tools) == 1
-        assert tools[0].name == "analyze_image"
+        assert [tool.name for tool in tools] == [
+            "analyze_image",
+            "analyze_images",
+            "compare_images",
+            "ask_many",
+            "analyze_directory",
+            "get_stats",
+        ]
         assert "image_path" in tools[0].inputSchema["properties"]
         assert "prompt" in tools[0].inputSchema["properties"]
+        assert "items" in tools[1].inputSchema["properties"]
+    
+    @pytest.mark.asyncio
+    async def test_handlers_registered(self, server):
+        """Test tools/list and tools/call are registered with the MCP server."""
+        from mcp.server import NotificationOptions
+        from mcp.types import CallToolRequest, ListToolsRequest
+        
+        assert CallToolRequest in server.server.request_handlers
+        result = await server.server.request_handlers[ListToolsRequest](
+            ListToolsRequest(method="tools/list")
+        )
+        assert result.root.tools[0].name == "analyze_image"
+        
+        capabilities = server.server.get_capabilities(NotificationOptions(), {})
+        assert capabilities.tools is not None
     
     def test_validate_image_path_valid(self, server, temp_image):
         """Test image path validation with valid image."""
@@ -81,6 +98,53 @@ class TestGeminiVisionServer:
             finally:
                 os.unlink(tmp.name)
     
+    def test_validate_image_path_too_large(self, server, tmp_path):
+        """Test files over the size limit are rejected before reading."""
+        path = tmp_path / "big.png"
+        path.write_bytes(b"\0" * 2048)
+        server.max_image_bytes = 1024
+        
+        with patch.object(server, "_read_image") as mock_read:
+            with pytest.raises(ValueError, match="Image file too large"):
+                server._validate_image_path(str(path))
+            mock_read.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_analyze_image_peak_memory(self, server, tmp_path):
+        """Test a large image is held in memory at most ~2.7 times over."""
+        from gemini_vision.preprocess import PreprocessOptions
+        
+        size = 8 * 1024 * 1024
+        path = tmp_path / "large.png"
+        # A PNG header the probe accepts, then incompressible data
+        header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", 2048, 2048)
+        path.write_bytes(header + os.urandom(size - len(header)))
+        
+        mock_response = {"choices": [{"message": {"content": "ok"}}]}
+        with patch("aiohttp.ClientSession.post") as mock_post:
+            mock_resp = AsyncMock()
+            mock_resp.status = 200
+            mock_resp.json = AsyncMock(return_value=mock_response)
+            mock_post.return_value.__aenter__.return_value = mock_resp
+            
+            tracemalloc.start()
+            try:
+                result = await server._analyze_image(
+                    str(path), "Test prompt", preprocess=PreprocessOptions(enabled=False)
+                )
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            
+            body = mock_post.call_args.kwargs["data"]
+        
+        assert result == "ok"
+        assert json.loads(body)["messages"][0]["content"][1]["image_url"]["url"].startswith(
+            "data:image/png;base64,"
+        )
+        # Raw bytes are dropped before the request body is built: base64 + body
+        assert peak < 2.8 * size
+    
     def test_encode_image(self, server, temp_image):
         """Test image encoding to base64."""
         path = Path(temp_image)
@@ -129,6 +193,7 @@ class TestGeminiVisionServer:
         with patch("aiohttp.ClientSession.post") as mock_post:
             mock_resp = AsyncMock()
             mock_resp.status = 400
+            mock_resp.headers = {}
             mock_resp.text = AsyncMock(return_value="Bad Request")
             mock_post.return_value.__aenter__.return_value = mock_resp
             
@@ -158,6 +223,225 @@ class TestGeminiVisionServer:
             assert len(result.content) == 1
             assert "Test analysis result" in result.content[0].text
     
+    @pytest.mark.asyncio
+    async def test_call_tool_uses_response_cache(self, server, temp_image):
+        """Test deterministic analyses are served from cache on repeat calls."""
+        with patch.object(server, "_call_gemini_api") as mock_api:
+            mock_api.return_value = "Cached analysis"
+            
+            mock_request = MagicMock()
+            mock_request.params.name = "analyze_image"
+            mock_request.params.arguments = {
+                "image_path": temp_image,
+                "prompt": "Test prompt",
+                "temperature": 0
+            }
+            
+            first = await server.call_tool(mock_request)
+            second = await server.call_tool(mock_request)
+            
+            assert mock_api.call_count == 1
+            assert "Cached analysis" in second.content[0].text
+            assert "Served from cache" in second.content[0].text
+            assert "Served from cache" not in first.content[0].text
+            
+            # Opting out of the cache always calls upstream
+            mock_request.params.arguments["use_cache"] = False
+            await server.call_tool(mock_request)
+            assert mock_api.call_count == 2
+            
+            # Non-zero temperatures are not cached by default
+            mock_request.params.arguments = {
+                "image_path": temp_image,
+                "prompt": "Test prompt"
+            }
+            await server.call_tool(mock_request)
+            await server.call_tool(mock_request)
+            assert mock_api.call_count == 4
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_coalesces_identical_requests(self, server, temp_image):
+        """Test identical concurrent calls share one upstream request."""
+        async def slow_api(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return "Shared analysis"
+        
+        with patch.object(server, "_call_gemini_api", side_effect=slow_api) as mock_api:
+            mock_request = MagicMock()
+            mock_request.params.name = "analyze_image"
+            mock_request.params.arguments = {
+                "image_path": temp_image,
+                "prompt": "Test prompt"
+            }
+            
+            results = await asyncio.gather(
+                *(server.call_tool(mock_request) for _ in range(3))
+            )
+        
+        assert mock_api.call_count == 1
+        assert all("Shared analysis" in r.content[0].text for r in results)
+        assert server.single_flight.stats()["coalesced"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_prepared_image_reused_across_prompts(self, server, temp_image):
+        """Test a file is read and encoded once for several prompts until it changes."""
+        with patch.object(server, "_call_gemini_api") as mock_api, \
+                patch.object(server, "_prepare_upload", wraps=server._prepare_upload) as mock_prepare:
+            mock_api.return_value = "Test analysis result"
+            
+            await server._analyze_image(temp_image, "First question")
+            await server._analyze_image(temp_image, "Second question")
+            assert mock_prepare.call_count == 1
+            
+            stat = os.stat(temp_image)
+            Image.new("RGB", (100, 100), color="green").save(temp_image)
+            os.utime(temp_image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            await server._analyze_image(temp_image, "First question")
+            assert mock_prepare.call_count == 2
+        
+        assert server.prepared_cache.stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_preprocesses_large_images(self, server, tmp_path):
+        """Test large images are downscaled before upload unless disabled."""
+        image_path = tmp_path / "large.png"
+        Image.new("RGB", (4000, 2000), color="blue").save(image_path)
+        
+        with patch.object(server, "_call_gemini_api") as mock_api:
+            mock_api.return_value = "Test analysis result"
+            
+            mock_request = MagicMock()
+            mock_request.params.name = "analyze_image"
+            mock_request.params.arguments = {
+                "image_path": str(image_path),
+                "max_edge": 1000
+            }
+            
+            result = await server.call_tool(mock_request)
+            assert not result.isError
+            _, image_base64, mime_type = mock_api.call_args.args
+            assert mime_type == "image/webp"
+            
+            mock_request.params.arguments["preprocess"] = False
+            await server.call_tool(mock_request)
+            _, original_base64, mime_type = mock_api.call_args.args
+            assert mime_type == "image/png"
+            assert len(image_base64) < len(original_base64)
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_analyze_images(self, server, temp_image):
+        """Test batch analysis runs concurrently and keeps input order."""
+        in_flight = 0
+        peak = 0
+        
+        async def fake_api(prompt, image_base64, mime_type, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return f"answer to {prompt}"
+        
+        with patch.object(server, "_call_gemini_api", side_effect=fake_api):
+            mock_request = MagicMock()
+            mock_request.params.name = "analyze_images"
+            mock_request.params.arguments = {
+                "items": [
+                    {"image_path": temp_image, "prompt": f"question {i}"}
+                    for i in range(6)
+                ] + [{"image_path": "/nonexistent/path.png"}],
+                "max_concurrency": 2
+            }
+            
+            result = await server.call_tool(mock_request)
+        
+        assert not result.isError
+        assert "6 succeeded, 1 failed" in result.content[0].text
+        for i in range(6):
+            assert result.content[i + 1].text.startswith(f"[{i + 1}] Image Analysis")
+            assert f"answer to question {i}" in result.content[i + 1].text
+        assert "Image file not found" in result.content[7].text
+        assert peak == 2
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_analyze_images_all_failed(self, server):
+        """Test batch analysis reports an error when every item fails."""
+        mock_request = MagicMock()
+        mock_request.params.name = "analyze_images"
+        mock_request.params.arguments = {"items": [{"prompt": "no path"}]}
+        
+        result = await server.call_tool(mock_request)
+        
+        assert result.isError
+        assert "image_path parameter is required" in result.content[1].text
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_compare_images(self, server, tmp_path):
+        """Test compare_images sends every image in one labelled request."""
+        paths = []
+        for name, color in (("before.png", "red"), ("after.png", "blue")):
+            paths.append(str(tmp_path / name))
+            Image.new("RGB", (100, 100), color=color).save(paths[-1])
+        
+        with patch.object(server, "_request_completion") as mock_api:
+            mock_api.return_value = "The color changed"
+            
+            mock_request = MagicMock()
+            mock_request.params.name = "compare_images"
+            mock_request.params.arguments = {
+                "image_paths": paths,
+                "prompt": "What changed?"
+            }
+            
+            result = await server.call_tool(mock_request)
+        
+        assert not result.isError
+        assert "Image Comparison for:" in result.content[0].text
+        assert "The color changed" in result.content[0].text
+        assert mock_api.call_count == 1
+        content, images = mock_api.call_args.args[:2]
+        assert [part["type"] for part in content] == [
+            "text", "image_url", "text", "image_url", "text"
+        ]
+        assert content[0]["text"] == "Image 1: before.png"
+        assert content[2]["text"] == "Image 2: after.png"
+        assert content[4]["text"] == "What changed?"
+        assert len(images) == 2
+    
+    @pytest.mark.asyncio
+    async def test_compare_images_fits_payload_budget(self, server, tmp_path):
+        """Test images over the payload budget are downscaled and small ones kept."""
+        large = tmp_path / "large.png"
+        Image.frombytes("RGB", (800, 800), os.urandom(800 * 800 * 3)).save(large)
+        small = tmp_path / "small.png"
+        Image.new("RGB", (50, 50), color="red").save(small)
+        budget = 200_000
+        
+        with patch.object(server, "_request_completion") as mock_api:
+            mock_api.return_value = "Compared"
+            await server._compare_images(
+                [str(large), str(small)], "Compare", max_payload_bytes=budget
+            )
+        
+        images = mock_api.call_args.args[1]
+        assert sum(len(image) for image in images) <= budget
+        small_upload = await server._get_prepared(
+            *server._inspect_image(str(small)), server.preprocess_options
+        )
+        assert bytes(images[1]) == bytes(small_upload.data)
+    
+    @pytest.mark.asyncio
+    async def test_compare_images_over_budget(self, server, temp_image):
+        """Test an impossible budget is reported instead of sent."""
+        with patch.object(server, "_request_completion") as mock_api:
+            with pytest.raises(ValueError, match="payload budget"):
+                await server._compare_images(
+                    [temp_image, temp_image], "Compare", max_payload_bytes=10
+                )
+            with pytest.raises(ValueError, match="between 2 and"):
+                await server._compare_images([temp_image], "Compare")
+        mock_api.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_call_tool_missing_image_path(self, server):
         """Test analyze_image tool call with missing image_path."""
@@ -196,10 +480,14 @@ async def test_main_function():
             with patch.object(GeminiVisionServer, "__init__", return_value=None):
                 mock_server = MagicMock()
                 mock_server.server.run = AsyncMock()
+                mock_server.start = AsyncMock()
+                mock_server.close = AsyncMock()
                 mock_server.server.get_capabilities = MagicMock(return_value={})
                 
                 with patch("gemini_vision.server.GeminiVisionServer", return_value=mock_server):
                     from gemini_vision.server import main
                     
                     # This should not raise an exception
-                    await asyncio.wait_for(main(), timeout=1.0)
\ No newline at end of file
+                    await asyncio.wait_for(main(), timeout=1.0)
+                    mock_server.start.assert_awaited_once()
+                    mock_server.close.assert_awaited_once()
\ No newline at end of file
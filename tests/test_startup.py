@@ -0,0 +1,56 @@
+# SPDX-License-Identifier: MIT
+"""Tests for cold start: deferred imports, deferred warm-up and the startup budget."""
+
+import importlib.util
+import os
+import statistics
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from gemini_vision.server import GeminiVisionServer
+
+HARNESS = Path(__file__).resolve().parent.parent / "benchmarks" / "startup.py"
+
+
+def load_harness():
+    spec = importlib.util.spec_from_file_location("benchmarks_startup", HARNESS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_heavy_modules_not_imported_at_startup():
+    """Test importing the server leaves aiohttp, Pillow and the process pool unloaded."""
+    assert load_harness().deferred_modules_loaded() == []
+
+
+def test_time_to_initialize_within_budget():
+    """Test a spawned stdio server answers initialize within the startup budget."""
+    harness = load_harness()
+    samples = [harness.time_to_initialize() for _ in range(3)]
+    assert statistics.median(samples) < harness.STARTUP_BUDGET_S
+
+
+@pytest.mark.asyncio
+async def test_warm_up_deferred_until_first_tools_request():
+    """Test start(warm_up=False) waits for tools/list before warming up, and only once."""
+    env = {"OPENROUTER_API_KEY": "test_key", "GEMINI_VISION_CACHE_PATH": "none"}
+    with patch.dict(os.environ, env):
+        server = GeminiVisionServer()
+
+    try:
+        with patch.object(server, "_warm_up") as warm_up:
+            await server.start(warm_up=False)
+            assert server._warm_up_task is None
+
+            await server._handle_list_tools(MagicMock())
+            task = server._warm_up_task
+            assert task is not None
+            await server._handle_list_tools(MagicMock())
+            assert server._warm_up_task is task
+            await task
+        warm_up.assert_called_once()
+    finally:
+        await server.close()
@@ -0,0 +1,178 @@
+# SPDX-License-Identifier: MIT
+"""Tests for streamed upstream responses and progress reporting."""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from gemini_vision.streaming import ProgressReporter, StreamError, read_sse_completion
+
+
+def sse(*events):
+    """Encode chunks as SSE lines."""
+    lines = []
+    for event in events:
+        if isinstance(event, dict):
+            event = "data: " + json.dumps(event)
+        lines.append(event.encode("utf-8") + b"\n")
+        lines.append(b"\n")
+    return lines
+
+
+def delta(text, finish_reason=None):
+    """Build an OpenAI-style streaming chunk."""
+    return {"choices": [{"delta": {"content": text}, "finish_reason": finish_reason}]}
+
+
+async def iterate(lines):
+    for line in lines:
+        yield line
+
+
+class TestReadSseCompletion:
+    """Test cases for read_sse_completion."""
+
+    @pytest.mark.asyncio
+    async def test_accumulates_deltas(self):
+        """Test text is accumulated and forwarded chunk by chunk."""
+        received = []
+
+        async def on_delta(text):
+            received.append(text)
+
+        lines = sse(
+            ": OPENROUTER PROCESSING",
+            delta("Hello"),
+            delta(", world", finish_reason="stop"),
+            "data: [DONE]",
+        )
+        result = await read_sse_completion(iterate(lines), on_delta)
+
+        assert result == "Hello, world"
+        assert received == ["Hello", ", world"]
+
+    @pytest.mark.asyncio
+    async def test_error_chunk(self):
+        """Test mid-stream error chunks raise StreamError."""
+        lines = sse(delta("partial"), {"error": {"message": "Provider overloaded"}})
+        with pytest.raises(StreamError, match="Provider overloaded"):
+            await read_sse_completion(iterate(lines))
+
+    @pytest.mark.asyncio
+    async def test_truncated_stream(self):
+        """Test a stream that closes without finishing raises StreamError."""
+        with pytest.raises(StreamError, match="ended before"):
+            await read_sse_completion(iterate(sse(delta("partial"))))
+
+
+class TestProgressReporter:
+    """Test cases for ProgressReporter."""
+
+    @pytest.mark.asyncio
+    async def test_throttles_and_flushes(self):
+        """Test text is batched between notifications and flushed at the end."""
+        session = MagicMock()
+        session.send_progress_notification = AsyncMock()
+        reporter = ProgressReporter(session, "token", request_id=7, interval=60)
+
+        await reporter.on_delta("abc")
+        await reporter.on_delta("de")
+        await reporter.flush()
+
+        calls = session.send_progress_notification.await_args_list
+        assert [call.kwargs["message"] for call in calls] == ["abc", "de"]
+        assert calls[-1].args == ("token", 5)
+        assert calls[-1].kwargs["related_request_id"] == 7
+
+    @pytest.mark.asyncio
+    async def test_notification_failures_are_ignored(self):
+        """Test a failing notification does not raise."""
+        session = MagicMock()
+        session.send_progress_notification = AsyncMock(side_effect=RuntimeError("closed"))
+        reporter = ProgressReporter(session, 1, interval=0)
+        await reporter.on_delta("abc")
+
+
+@pytest_asyncio.fixture
+async def fake_upstream():
+    """Local stand-in for the streaming chat completions endpoint."""
+    state = {"delay": 0.0, "cancelled": False}
+
+    async def handle(request):
+        body = await request.json()
+        assert body["stream"] is True
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        try:
+            for line in sse(delta("Streamed "), delta("answer", "stop"), "data: [DONE]"):
+                await asyncio.sleep(state["delay"])
+                await response.write(line)
+        except (ConnectionResetError, asyncio.CancelledError):
+            state["cancelled"] = True
+            raise
+        return response
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    state["base_url"] = f"http://127.0.0.1:{port}"
+    yield state
+    await runner.cleanup()
+
+
+class TestStreamingServer:
+    """Test cases for streaming through GeminiVisionServer."""
+
+    @pytest.mark.asyncio
+    async def test_streamed_call(self, server, fake_upstream):
+        """Test a streamed completion is accumulated and forwarded."""
+        received = []
+
+        async def on_delta(text):
+            received.append(text)
+
+        server.base_url = fake_upstream["base_url"]
+        result = await server._call_gemini_api(
+            "prompt", "aGVsbG8=", "image/png", stream=True, on_delta=on_delta
+        )
+
+        assert result == "Streamed answer"
+        assert received == ["Streamed ", "answer"]
+
+    @pytest.mark.asyncio
+    async def test_cancellation_propagates(self, server, fake_upstream):
+        """Test cancelling a streamed call stops it and releases the connection."""
+        fake_upstream["delay"] = 0.2
+        server.base_url = fake_upstream["base_url"]
+        task = asyncio.create_task(
+            server._call_gemini_api("prompt", "aGVsbG8=", "image/png", stream=True)
+        )
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.3)
+        assert fake_upstream["cancelled"]
+
+    @pytest.mark.asyncio
+    async def test_progress_reporter_from_request_context(self, server):
+        """Test call_tool builds a reporter from the request's progress token."""
+        request = MagicMock()
+        request.params.meta.progressToken = "abc"
+        context = MagicMock(request_id=3)
+        with patch.object(type(server.server), "request_context", context):
+            reporter = server._progress_reporter(request)
+        assert reporter.progress_token == "abc"
+        assert reporter.session is context.session
+
+        request.params.meta = None
+        assert server._progress_reporter(request) is None
@@ -0,0 +1,257 @@
+# SPDX-License-Identifier: MIT
+"""Tests for tiled analysis of very large images."""
+
+import io
+import os
+import struct
+import zlib
+from unittest.mock import MagicMock, patch
+
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from PIL import Image
+
+from gemini_vision.preprocess import PreprocessOptions
+from gemini_vision.tiling import (
+    TileOptions,
+    grid_overlap,
+    plan_tiles,
+    reduce_prompt,
+    split_image,
+    tile_prompt,
+)
+
+
+def png_header(path, width, height):
+    """A PNG that declares ``width`` x ``height`` in its header but holds no pixels."""
+    ihdr = b"IHDR" + struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack(">I", 13) + ihdr + struct.pack(">I", zlib.crc32(ihdr))
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + chunk)
+    return path
+
+
+def covered(tiles, width, height):
+    """Whether the tiles cover every pixel of a width x height image."""
+    xs = {x for tile in tiles for x in range(tile.box[0], tile.box[2])}
+    ys = {y for tile in tiles for y in range(tile.box[1], tile.box[3])}
+    return xs == set(range(width)) and ys == set(range(height))
+
+
+class TestPlanTiles:
+    """Test cases for the tile grid."""
+
+    def test_small_image_is_one_tile(self):
+        """Test an image within the tile size is not split."""
+        tiles = plan_tiles(800, 600, TileOptions(tile_size=1024))
+        assert [tile.box for tile in tiles] == [(0, 0, 800, 600)]
+
+    def test_grid_overlaps_and_covers(self):
+        """Test tiles are in reading order, overlap by at least the overlap and cover the image."""
+        options = TileOptions(tile_size=1000, overlap=100, max_tiles=16)
+        tiles = plan_tiles(2500, 1200, options)
+
+        assert [(tile.row, tile.column) for tile in tiles] == [
+            (0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)
+        ]
+        assert all(
+            tile.box[2] - tile.box[0] == 1000 and tile.box[3] - tile.box[1] == 1000
+            for tile in tiles
+        )
+        assert tiles[0].box[2] - tiles[1].box[0] >= 100
+        assert tiles[-1].box[2:] == (2500, 1200)
+        assert covered(tiles, 2500, 1200)
+
+    def test_max_tiles_grows_tiles(self):
+        """Test a grid over max_tiles is replaced by fewer, larger tiles."""
+        tiles = plan_tiles(8000, 8000, TileOptions(tile_size=512, overlap=64, max_tiles=9))
+        assert len(tiles) <= 9
+        assert tiles[0].box[2] > 512
+        assert covered(tiles, 8000, 8000)
+
+    def test_applied_overlap(self):
+        """Test the overlap reported is the one the even spread actually applied."""
+        tiles = plan_tiles(1200, 500, TileOptions(tile_size=512, overlap=64))
+        assert grid_overlap(tiles) == (168, 0)
+        assert tiles[0].box[2] - tiles[1].box[0] == 168
+
+        text = tile_prompt("Read", tiles[1], 2, len(tiles), (1200, 500), (168, 0))
+        assert "overlap by 168 pixels across and 0 pixels down" in text
+
+    def test_options(self):
+        """Test tool arguments override the defaults and bad values are rejected."""
+        options = TileOptions().with_overrides({"tile_size": 512, "tile_overlap": 32})
+        assert (options.tile_size, options.overlap, options.max_tiles) == (512, 32, 16)
+        with pytest.raises(ValueError, match="tile_overlap"):
+            TileOptions().with_overrides({"tile_size": 200, "tile_overlap": 100})
+        with pytest.raises(ValueError, match="max_tiles"):
+            TileOptions().with_overrides({"max_tiles": 0})
+
+    def test_env(self):
+        """Test defaults come from the environment."""
+        with patch.dict(os.environ, {"GEMINI_VISION_TILE_SIZE": "768", "GEMINI_VISION_MAX_TILES": "4"}):
+            options = TileOptions.from_env()
+        assert (options.tile_size, options.max_tiles) == (768, 4)
+
+
+class TestSplitImage:
+    """Test cases for cutting and encoding tiles."""
+
+    def test_split(self, tmp_path):
+        """Test each tile is encoded in the configured format at its own size, with an overview."""
+        path = tmp_path / "large.png"
+        Image.new("RGB", (1500, 700), color="white").save(path)
+
+        size, tiles, overview = split_image(
+            path,
+            TileOptions(tile_size=800, overlap=50),
+            PreprocessOptions(output_format="jpeg", max_edge=1000),
+        )
+
+        assert size == (1500, 700)
+        assert len(tiles) == 2
+        for tile, data in tiles:
+            with Image.open(io.BytesIO(data)) as image:
+                assert image.format == "JPEG"
+                assert image.size == (tile.box[2] - tile.box[0], tile.box[3] - tile.box[1])
+        with Image.open(io.BytesIO(overview)) as image:
+            assert image.format == "JPEG"
+            assert max(image.size) == 1000
+
+    def test_past_decompression_bomb_limit(self, tmp_path):
+        """Test an image over Pillow's limit is split when the caller allows its size."""
+        path = tmp_path / "huge.png"
+        Image.new("RGB", (1500, 700)).save(path)
+
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 100_000):
+            size, tiles, _ = split_image(
+                path, TileOptions(800, 50), PreprocessOptions(), 1500 * 700
+            )
+            assert Image.MAX_IMAGE_PIXELS == 100_000
+            with pytest.raises(Image.DecompressionBombError):
+                split_image(path, TileOptions(800, 50), PreprocessOptions())
+
+        assert size == (1500, 700) and len(tiles) == 2
+        # max_pixels is a hard cap, even below Pillow's own limit
+        with pytest.raises(Image.DecompressionBombError, match="for tiling"):
+            split_image(path, TileOptions(800, 50), PreprocessOptions(), 1_000_000)
+
+    def test_single_tile_is_not_decoded(self, tmp_path):
+        """Test an image that fits in one tile yields no tiles."""
+        path = tmp_path / "small.png"
+        Image.new("RGB", (300, 200)).save(path)
+        assert split_image(path, TileOptions(), PreprocessOptions()) == ((300, 200), [], None)
+
+    def test_reduce_prompt(self):
+        """Test the reduce prompt labels each tile's notes."""
+        tiles = plan_tiles(2000, 900, TileOptions(tile_size=1024))
+        text = reduce_prompt("Read the sign", tiles, ["STOP", "nothing"], (2000, 900))
+        assert "Tile 1 (row 1, column 1) ---\nSTOP" in text
+        assert "Tile 2 (row 1, column 2) ---\nnothing" in text
+        assert "Question: Read the sign" in text
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="Tile notes") as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env(tmp_path):
+    return {
+        "GEMINI_VISION_CACHE_PATH": str(tmp_path / "cache"),
+        "GEMINI_VISION_RETRY_ATTEMPTS": "1",
+        "GEMINI_VISION_TILE_SIZE": "512",
+        "GEMINI_VISION_TILE_OVERLAP": "64",
+    }
+
+
+class TestTiledAnalysis:
+    """Test tiled analysis against a local fake OpenRouter."""
+
+    @pytest.mark.asyncio
+    async def test_map_reduce(self, server, upstream, tmp_path):
+        """Test one request per tile, then a reduce request with the notes and an overview."""
+        path = tmp_path / "poster.png"
+        Image.new("RGB", (1200, 500), color="white").save(path)
+
+        analysis = await server._analyze_tiled(str(path), "Read the text", temperature=0.0)
+
+        assert analysis == "Tile notes"
+        assert len(upstream.requests) == 4
+        tile_text = upstream.requests[0]["messages"][0]["content"][0]["text"]
+        assert "tile 1 of 3" in tile_text
+        assert "overlap by 168 pixels across and 0 pixels down" in tile_text
+        assert "Question: Read the text" in tile_text
+        reduce_content = upstream.requests[-1]["messages"][0]["content"]
+        assert reduce_content[0]["text"].count("Tile notes") == 3
+        assert reduce_content[1]["type"] == "image_url"
+
+        # The merged answer is cached as a whole
+        cached = await server._analyze_tiled(str(path), "Read the text", temperature=0.0)
+        assert "[Served from cache" in cached
+        assert len(upstream.requests) == 4
+
+    @pytest.mark.asyncio
+    async def test_size_caps_apply_per_tile(self, server, upstream, tmp_path):
+        """Test an image over the whole-image caps is accepted when each tile is within them."""
+        path = tmp_path / "poster.png"
+        Image.new("RGB", (1200, 500), color="white").save(path)
+        server.max_image_pixels = 300_000
+        server.max_image_bytes = path.stat().st_size // 2
+
+        with pytest.raises(ValueError, match="too large"):
+            server._inspect_image(str(path))
+        analysis = await server._analyze_tiled(str(path), "Read", use_cache=False)
+        assert analysis == "Tile notes"
+
+        server.max_image_bytes = path.stat().st_size // 4
+        with pytest.raises(ValueError, match="per tile, 3 tiles"):
+            server._inspect_image(str(path), server.tile_options)
+        server.max_image_bytes = path.stat().st_size
+        with pytest.raises(ValueError, match="raise max_tiles"):
+            server._inspect_image(str(path), TileOptions(tile_size=512, max_tiles=1))
+
+    @pytest.mark.asyncio
+    async def test_huge_declared_size_rejected(self, server, upstream, tmp_path):
+        """Test a small file declaring a huge image is refused before any decoding."""
+        path = png_header(tmp_path / "bomb.png", 40000, 40000)
+
+        with pytest.raises(ValueError, match="too large to tile"):
+            server._inspect_image(str(path), TileOptions(max_tiles=10000))
+        with pytest.raises(ValueError, match="1600.0 MP, max 300.0 MP"):
+            await server._analyze_tiled(str(path), "Read", use_cache=False)
+        assert upstream.requests == []
+
+    @pytest.mark.asyncio
+    async def test_small_image_analyzed_normally(self, server, upstream, tmp_path):
+        """Test an image that fits in one tile makes a single ordinary request."""
+        path = tmp_path / "small.png"
+        Image.new("RGB", (300, 300)).save(path)
+
+        await server._analyze_tiled(str(path), "Describe", use_cache=False)
+
+        assert len(upstream.requests) == 1
+        assert upstream.requests[0]["messages"][0]["content"][0]["text"] == "Describe"
+
+    @pytest.mark.asyncio
+    async def test_tool_arguments(self, server, upstream, tmp_path):
+        """Test the analyze_image tool's tiled mode and per-call grid overrides."""
+        path = tmp_path / "wide.png"
+        Image.new("RGB", (2000, 400)).save(path)
+        request = MagicMock()
+        request.params.name = "analyze_image"
+        request.params.arguments = {
+            "image_path": str(path),
+            "tiled": True,
+            "tile_size": 1024,
+            "tile_overlap": 0,
+            "use_cache": False,
+        }
+
+        result = await server.call_tool(request)
+
+        assert not result.isError
+        assert "Tile notes" in result.content[0].text
+        assert len(upstream.requests) == 3
@@ -0,0 +1,237 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the streamable HTTP transport."""
+
+import asyncio
+import contextlib
+import json
+import os
+import socket
+from unittest.mock import AsyncMock, patch
+
+import aiohttp
+import httpx
+import pytest
+import pytest_asyncio
+from fake_openrouter import FakeOpenRouter
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+from PIL import Image
+
+from gemini_vision.server import GeminiVisionServer, cli
+from gemini_vision.transport import HttpConfig, create_http_server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    async with FakeOpenRouter(reply="A red square", latency=0.05) as fake:
+        yield fake
+
+
+@pytest.fixture
+def server_env():
+    return {"GEMINI_VISION_RETRY_ATTEMPTS": "1"}
+
+
+@contextlib.asynccontextmanager
+async def serving(env, **settings):
+    """Run a vision server behind uvicorn; yields (vision server, base URL)."""
+    with patch.dict(os.environ, env):
+        vision_server = GeminiVisionServer()
+    config = HttpConfig(port=free_port(), shutdown_timeout=5, **settings)
+    server = create_http_server(vision_server, config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        assert not task.done(), "HTTP server failed to start"
+        await asyncio.sleep(0.01)
+    try:
+        yield vision_server, f"http://127.0.0.1:{config.port}"
+    finally:
+        server.should_exit = True
+        await asyncio.wait_for(task, 10)
+
+
+@pytest_asyncio.fixture
+async def http_server(env):
+    """A vision server behind a running uvicorn server; yields (vision server, base URL)."""
+    async with serving(env) as running:
+        yield running
+
+
+async def call(url, name, arguments, headers=None):
+    async with httpx.AsyncClient(headers=headers) as client:
+        async with streamable_http_client(f"{url}/mcp", http_client=client) as (
+            read,
+            write,
+            _,
+        ):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                return await session.call_tool(name, arguments)
+
+
+INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "test", "version": "1"},
+    },
+}
+MCP_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+
+
+class TestHttpTransport:
+    """Test serving several MCP clients from one process."""
+
+    def test_config_from_env(self):
+        """Test the bind address and path come from the environment."""
+        env = {
+            "GEMINI_VISION_HTTP_HOST": "0.0.0.0",
+            "GEMINI_VISION_HTTP_PORT": "9000",
+            "GEMINI_VISION_HTTP_PATH": "vision",
+        }
+        with patch.dict(os.environ, env):
+            config = HttpConfig.from_env()
+        assert (config.host, config.port, config.path) == ("0.0.0.0", 9000, "/vision")
+        assert config.token is None
+
+    def test_access_settings_from_env(self):
+        """Test the token and allowed hosts/origins come from the environment."""
+        env = {
+            "GEMINI_VISION_HTTP_TOKEN": "secret",
+            "GEMINI_VISION_HTTP_ALLOWED_HOSTS": "vision.internal:*, 10.0.0.5:8000",
+            "GEMINI_VISION_HTTP_ALLOWED_ORIGINS": "https://app.example.com",
+        }
+        with patch.dict(os.environ, env):
+            config = HttpConfig.from_env()
+        settings = config.security_settings()
+
+        assert config.token == "secret"
+        assert settings.allowed_hosts == ["vision.internal:*", "10.0.0.5:8000"]
+        assert settings.allowed_origins == ["https://app.example.com"]
+
+    def test_default_security_settings(self):
+        """Test DNS-rebinding protection defaults to loopback names and the bind host."""
+        settings = HttpConfig().security_settings()
+        assert settings.enable_dns_rebinding_protection
+        assert "127.0.0.1:*" in settings.allowed_hosts
+        assert "http://localhost:*" in settings.allowed_origins
+        assert not any("evil" in host for host in settings.allowed_hosts)
+
+        named = HttpConfig(host="vision.internal").security_settings()
+        assert "vision.internal:*" in named.allowed_hosts
+        # A wildcard bind address is no host name; remote names must be listed
+        assert not any(
+            host.startswith("0.0.0.0")
+            for host in HttpConfig(host="0.0.0.0").security_settings().allowed_hosts
+        )
+
+    def test_transport_name_normalized(self):
+        """Test GEMINI_VISION_TRANSPORT is matched case-insensitively by the CLI."""
+        with (
+            patch.dict(os.environ, {"GEMINI_VISION_TRANSPORT": "HTTP"}),
+            patch("gemini_vision.server.main", new=AsyncMock()) as main,
+        ):
+            cli(["--port", "9001"])
+        transport, http_config = main.call_args.args
+        assert transport == "http"
+        assert http_config.port == 9001
+
+    @pytest.mark.asyncio
+    async def test_concurrent_clients_share_state(self, http_server, upstream, tmp_path):
+        """Test concurrent sessions are served by one server, sharing its cache and coalescing."""
+        vision_server, url = http_server
+        image = tmp_path / "image.png"
+        Image.new("RGB", (64, 64), color="red").save(image)
+        arguments = {"image_path": str(image), "prompt": "Describe", "temperature": 0}
+
+        results = await asyncio.gather(
+            *(call(url, "analyze_image", arguments) for _ in range(3))
+        )
+        later = await call(url, "analyze_image", arguments)
+
+        assert all("A red square" in result.content[0].text for result in results)
+        assert "Served from cache" in later.content[0].text
+        # Three concurrent clients shared one upstream call, the fourth hit the cache
+        assert len(upstream.requests) == 1
+        assert vision_server.metrics.snapshot()["tools"]["analyze_image"]["count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_health_and_tools(self, http_server):
+        """Test the health endpoint and tool listing over HTTP."""
+        _, url = http_server
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{url}/healthz") as response:
+                assert response.status == 200
+                assert (await response.json())["status"] == "ok"
+
+        stats = await call(url, "get_stats", {})
+        assert "rate_limiter" in json.loads(stats.content[0].text)["components"]
+
+    @pytest.mark.asyncio
+    async def test_foreign_host_rejected(self, http_server):
+        """Test requests naming a non-loopback Host or Origin are refused."""
+        _, url = http_server
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{url}/mcp",
+                json=INITIALIZE,
+                headers={**MCP_HEADERS, "Host": "evil.example.com"},
+            ) as response:
+                assert response.status == 421
+            async with session.post(
+                f"{url}/mcp",
+                json=INITIALIZE,
+                headers={**MCP_HEADERS, "Origin": "http://evil.example.com"},
+            ) as response:
+                assert response.status == 403
+
+    @pytest.mark.asyncio
+    async def test_bearer_token_required(self, env):
+        """Test a configured token is required on the MCP endpoint but not /healthz."""
+        async with serving(env, token="secret") as (_, url):
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{url}/mcp", json=INITIALIZE, headers=MCP_HEADERS
+                ) as response:
+                    assert response.status == 401
+                async with session.post(
+                    f"{url}/mcp",
+                    json=INITIALIZE,
+                    headers={**MCP_HEADERS, "Authorization": "Bearer wrong"},
+                ) as response:
+                    assert response.status == 401
+                async with session.get(f"{url}/healthz") as response:
+                    assert response.status == 200
+
+            stats = await call(
+                url, "get_stats", {}, headers={"Authorization": "Bearer secret"}
+            )
+            assert not stats.isError
+
+    @pytest.mark.asyncio
+    async def test_graceful_shutdown_closes_server(self, env):
+        """Test stopping the HTTP server closes the vision server's upstream session."""
+        with patch.dict(os.environ, env):
+            vision_server = GeminiVisionServer()
+        server = create_http_server(vision_server, HttpConfig(port=free_port()))
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        session = await vision_server.connection_pool.get_session()
+
+        server.should_exit = True
+        await asyncio.wait_for(task, 10)
+
+        assert session.closed
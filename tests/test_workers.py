@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: MIT
+"""Tests for CPU-bound image work in worker processes."""
+
+import asyncio
+import base64
+import io
+import multiprocessing
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from gemini_vision.metrics import Metrics
+from gemini_vision.preprocess import PreprocessOptions
+from gemini_vision.server import GeminiVisionServer
+from gemini_vision.workers import (
+    CpuPool,
+    CpuPoolConfig,
+    available_cpus,
+    prepare_upload,
+)
+
+
+def worker_pid() -> int:
+    return os.getpid()
+
+
+def die_in_worker() -> str:
+    """Kill the worker process; succeed when run in the main process."""
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return "ran on a thread"
+
+
+def slow_pid() -> int:
+    time.sleep(0.5)
+    return os.getpid()
+
+
+async def run_in_thread(func, *args):
+    return func(*args)
+
+
+@pytest.fixture
+def large_image(tmp_path):
+    path = tmp_path / "large.png"
+    Image.new("RGB", (3000, 1500), color="blue").save(path)
+    return path
+
+
+class TestConfig:
+    """Test cases for the pool size."""
+
+    def test_defaults_to_available_cores(self):
+        """Test the pool is sized to the machine unless configured."""
+        with patch.dict(os.environ, {}, clear=True):
+            assert CpuPoolConfig.from_env().workers == available_cpus()
+        with patch.dict(os.environ, {"GEMINI_VISION_CPU_WORKERS": "0"}):
+            assert CpuPoolConfig.from_env().workers == 0
+
+
+class TestPrepareUpload:
+    """Test cases for the preprocessing job."""
+
+    def test_downscales_and_encodes(self, large_image):
+        """Test the job returns the base64 of a downscaled image and its sizes."""
+        upload = prepare_upload(str(large_image), "image/png", PreprocessOptions(max_edge=512))
+
+        assert upload.mime_type == "image/webp"
+        assert upload.dimensions == (512, 256)
+        assert upload.original_size == large_image.stat().st_size
+        with Image.open(io.BytesIO(base64.b64decode(upload.data))) as image:
+            assert image.size == (512, 256)
+        assert upload.prepared_size == len(base64.b64decode(upload.data))
+
+    def test_undecodable_image_sends_original(self, tmp_path):
+        """Test a file Pillow cannot read is sent unchanged with the reason."""
+        path = tmp_path / "broken.png"
+        path.write_bytes(b"not an image")
+
+        upload = prepare_upload(str(path), "image/png", PreprocessOptions())
+
+        assert base64.b64decode(upload.data) == b"not an image"
+        assert upload.mime_type == "image/png"
+        assert upload.error is not None
+
+
+class TestCpuPool:
+    """Test cases for running jobs in worker processes."""
+
+    @pytest.mark.asyncio
+    async def test_runs_in_other_process_and_records_stages(self, large_image):
+        """Test jobs run outside this process and their stage timings reach the metrics."""
+        metrics = Metrics()
+        pool = CpuPool(CpuPoolConfig(workers=2), run_in_thread, metrics)
+        try:
+            await pool.warm_up()
+            assert pool.stats()["running"]
+            assert await pool.run(worker_pid) != os.getpid()
+            upload = await pool.run(
+                prepare_upload, str(large_image), "image/png", PreprocessOptions(max_edge=512)
+            )
+        finally:
+            pool.close()
+
+        assert upload.dimensions == (512, 256)
+        stages = metrics.snapshot()["stages"]
+        assert {"read", "preprocess", "encode"} <= set(stages)
+        assert pool.stats()["jobs"] == 2
+
+    @pytest.mark.asyncio
+    async def test_disabled_runs_on_threads(self):
+        """Test workers=0 keeps jobs in this process."""
+        pool = CpuPool(CpuPoolConfig(workers=0), run_in_thread)
+
+        assert await pool.run(worker_pid) == os.getpid()
+        assert pool.stats() == {
+            "workers": 0,
+            "running": False,
+            "jobs": 0,
+            "thread_fallbacks": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_dead_worker_falls_back_and_restarts(self):
+        """Test a crashed worker's job is rerun on a thread and the pool is replaced."""
+        pool = CpuPool(CpuPoolConfig(workers=1), run_in_thread)
+        try:
+            assert await pool.run(die_in_worker) == "ran on a thread"
+            assert pool.stats()["thread_fallbacks"] == 1
+            assert await pool.run(worker_pid) != os.getpid()
+        finally:
+            pool.close()
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_queued_jobs(self):
+        """Test jobs still waiting for a worker are cancelled when the pool closes."""
+        pool = CpuPool(CpuPoolConfig(workers=1), run_in_thread)
+        await pool.warm_up()
+        jobs = [asyncio.ensure_future(pool.run(slow_pid)) for _ in range(6)]
+        await asyncio.sleep(0.1)
+
+        pool.close()
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+
+        assert isinstance(results[-1], asyncio.CancelledError)
+        assert not pool.stats()["running"]
+
+
+class TestServerPool:
+    """Test the server sends preprocessing to its process pool."""
+
+    @pytest.mark.asyncio
+    async def test_analyze_image_preprocesses_in_pool(self, large_image):
+        """Test a large image is downscaled in a worker process before upload."""
+        env = {
+            "OPENROUTER_API_KEY": "test_key",
+            "GEMINI_VISION_CACHE_PATH": "none",
+            "GEMINI_VISION_CPU_WORKERS": "2",
+        }
+        with patch.dict(os.environ, env):
+            server = GeminiVisionServer()
+
+        request = MagicMock()
+        request.params.name = "analyze_image"
+        request.params.arguments = {"image_path": str(large_image), "prompt": "Describe", "max_edge": 256}
+        try:
+            with patch.object(server, "_call_gemini_api", return_value="Result") as mock_api:
+                result = await server.call_tool(request)
+            stats = server.stats()
+        finally:
+            await server.close()
+
+        assert "Result" in result.content[0].text
+        data, mime_type = mock_api.call_args.args[1:3]
+        assert mime_type == "image/webp"
+        with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+            assert image.size == (256, 128)
+        assert stats["components"]["cpu_pool"]["jobs"] == 1
+        assert stats["metrics"]["stages"]["preprocess"]["count"] == 1